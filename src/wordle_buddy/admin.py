@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+
+import argparse
+import logging
+import os
+
+
+def _open(args):
+    from wordle_buddy.run import open_database
+    return open_database(
+        args.engine, args.results_directory, background=False
+    )
+
+
+def reindex(args):
+    from wordle_buddy.puzzle_index import PuzzleIndex
+    from wordle_buddy.run import index_directory
+    db = _open(args)
+    index = PuzzleIndex(
+        db, args.index_directory or index_directory(args.results_directory)
+    )
+    for guild in args.guild or db.guilds():
+        count = index.rebuild(guild)
+        print(f'Guild {guild}: indexed {count} results')
+
+
+def backfill_ranks(args):
+    from wordle_buddy.aggregates import ScoreAggregates
+    from wordle_buddy.rank_history import RankHistory
+    from wordle_buddy.run import index_directory
+    db = _open(args)
+    aggregates = ScoreAggregates(db)
+    history = RankHistory(
+        args.index_directory or index_directory(args.results_directory)
+    )
+    for guild in args.guild or db.guilds():
+        count = history.rebuild(guild, aggregates)
+        print(f'Guild {guild}: recorded {count} days of ranks')
+
+
+def _storage_lines(report):
+    return [
+        f'Loose results:    {report["hot_files"]} files, {report["hot_bytes"]} bytes',
+        f'Archived results: {report["archived_results"]} in {report["archives"]} archives, '
+        f'{report["archive_bytes"]} bytes',
+        f'Inodes saved:     {report["inodes_saved"]}',
+        f'Bytes saved:      {report["bytes_saved"]}',
+    ]
+
+
+def tier(args):
+    db = _open(args)
+    if not hasattr(db, 'tier'):
+        print(f'The {args.engine} engine compacts itself, nothing to tier')
+        return
+    print(f'Sealed {db.tier()} results from closed months')
+    print('\n'.join(_storage_lines(db.storage_report())))
+    db.close()
+
+
+def storage(args):
+    db = _open(args)
+    if not hasattr(db, 'storage_report'):
+        print(f'The {args.engine} engine has no storage report')
+        return
+    print('\n'.join(_storage_lines(db.storage_report())))
+    db.close()
+
+
+def drop_shared(args):
+    from wordle_buddy.shared_aggregates import SharedAggregates
+    db = _open(args)
+    shared = SharedAggregates(args.results_directory)
+    dropped = sum(shared.drop(guild) for guild in args.guild or db.guilds())
+    print(f'Removed {dropped} shared aggregates segments')
+
+
+def run_admin(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        prog='wordle-buddy-admin',
+        description='Maintenance tools for a wordle buddy results directory.'
+    )
+    parser.add_argument('--results-directory',
+                        default=os.getenv('RESULTS_DIRECTORY'))
+    parser.add_argument('--engine', choices=['json', 'log'],
+                        default=os.getenv('STORAGE_ENGINE', 'json'))
+    subparsers = parser.add_subparsers(required=True)
+
+    reindex_parser = subparsers.add_parser(
+        'reindex', help='rebuild the per-puzzle index from stored results'
+    )
+    reindex_parser.add_argument('--index-directory')
+    reindex_parser.add_argument('--guild', type=int, action='append')
+    reindex_parser.set_defaults(func=reindex)
+
+    backfill_parser = subparsers.add_parser(
+        'backfill-ranks', help='rebuild leaderboard rank history from stored results'
+    )
+    backfill_parser.add_argument('--index-directory')
+    backfill_parser.add_argument('--guild', type=int, action='append')
+    backfill_parser.set_defaults(func=backfill_ranks)
+
+    tier_parser = subparsers.add_parser(
+        'tier', help='seal results from closed months into archives'
+    )
+    tier_parser.set_defaults(func=tier)
+
+    storage_parser = subparsers.add_parser(
+        'storage', help='report space and inodes saved by archiving'
+    )
+    storage_parser.set_defaults(func=storage)
+
+    drop_shared_parser = subparsers.add_parser(
+        'drop-shared',
+        help='remove the shared aggregates segments once no bot is running'
+    )
+    drop_shared_parser.add_argument('--guild', type=int, action='append')
+    drop_shared_parser.set_defaults(func=drop_shared)
+
+    args = parser.parse_args(argv)
+    if not args.results_directory:
+        parser.error('set RESULTS_DIRECTORY or pass --results-directory')
+    logging.basicConfig(level=logging.ERROR)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    run_admin()
@@ -0,0 +1,402 @@
+import bisect
+import heapq
+import math
+import threading
+
+from wordle_buddy import utils
+from wordle_buddy.result import WORDLE
+
+
+def _window_total(days, start, end):
+    '''
+    Total score over [start, end) the way _total_score counts it, with missed
+    days scored as failures, or None if nothing was played in the window.
+    '''
+    played = [score for day, score in days.items() if start <= day < end]
+    if not played:
+        return None
+    return sum(played) + utils.FAILURE_SCORE * (end - start - len(played))
+
+
+def _histogram_value(histogram, rank):
+    seen = 0
+    for score, count in enumerate(histogram, start=1):
+        seen += count
+        if rank < seen:
+            return score
+    raise IndexError(f'Rank {rank} out of range')
+
+
+def histogram_percentile(histogram, percentile):
+    '''
+    Percentile of the scores counted in histogram, interpolating linearly
+    between the two nearest ranks. Runs in time proportional to the number
+    of possible scores, however many games were played.
+    '''
+    played = sum(histogram)
+    if not played:
+        return None
+    position = percentile / 100 * (played - 1)
+    lower = _histogram_value(histogram, math.floor(position))
+    upper = _histogram_value(histogram, math.ceil(position))
+    return lower + (upper - lower) * (position - math.floor(position))
+
+
+def histogram_trimmed_mean(histogram, trim):
+    played = sum(histogram)
+    cut = math.floor(played * trim)
+    kept = played - 2 * cut
+    if kept <= 0:
+        return None
+    total = 0
+    seen = 0
+    for score, count in enumerate(histogram, start=1):
+        low = max(seen, cut)
+        high = min(seen + count, played - cut)
+        if high > low:
+            total += score * (high - low)
+        seen += count
+    return total / kept
+
+
+def intersect_sorted(first, second):
+    '''
+    Values present in both sorted lists. Walks the shorter list and bisects
+    forward through the longer one, so the cost grows with the shorter
+    history rather than the sum of both.
+    '''
+    if len(first) > len(second):
+        first, second = second, first
+    shared = []
+    lo = 0
+    for value in first:
+        lo = bisect.bisect_left(second, value, lo)
+        if lo == len(second):
+            break
+        if second[lo] == value:
+            shared.append(value)
+    return shared
+
+
+class HeadToHead:
+    '''
+    Running record of one player against another over the days both
+    played. Margin is the opponent's score minus the player's, so it is
+    positive when the player needed fewer guesses.
+    '''
+
+    __slots__ = ('wins', 'draws', 'losses', 'margin')
+
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.margin = 0
+
+    def add(self, own, other, count=1):
+        if own < other:
+            self.wins += count
+        elif own > other:
+            self.losses += count
+        else:
+            self.draws += count
+        self.margin += (other - own) * count
+
+    @property
+    def played(self):
+        return self.wins + self.draws + self.losses
+
+    @property
+    def average_margin(self):
+        return self.margin / self.played if self.played else 0
+
+
+class ScoreAggregates:
+    '''
+    In-memory per-guild scores kept up to date by listening to database
+    saves and deletes. Each guild is read from the database once, on first
+    use, and rankings for a window are kept sorted and patched in place.
+    Every user also has an all-time histogram of how often they got each
+    score, and a sorted list of the days they played.
+
+    With shared set, scores, histograms and days played are read straight
+    from the guild's shared memory segment instead of the database. Only
+    rankings and head to head records are kept here, and the segment's
+    change log says which of them a save, from this process or another,
+    has made stale.
+    '''
+
+    def __init__(self, db, shared=None):
+        self._db = db
+        self._shared = shared
+        self._positions = {}
+        self._scores = {}
+        self._histograms = {}
+        self._days = {}
+        self._names = {}
+        self._rankings = {}
+        self._head_to_head = {}
+        # Saves arrive on ingest worker threads while commands read on the
+        # event loop.
+        self._lock = threading.RLock()
+        db.add_listener(self)
+
+    def on_save(self, guild, name, result, display_name=''):
+        with self._lock:
+            if display_name:
+                self._names[name] = display_name
+            if result.game != WORDLE:
+                return
+            if self._shared is not None:
+                self._shared.record(guild, name, result)
+                if guild in self._positions:
+                    self._catch_up(guild)
+                    return
+            self._apply(guild, name, result.week_number, result.score)
+
+    def on_delete(self, guild, name, result):
+        with self._lock:
+            if result.game != WORDLE:
+                return
+            if self._shared is not None:
+                self._shared.retract(guild, name, result.week_number)
+                if guild in self._positions:
+                    self._catch_up(guild)
+                    return
+            self._apply(guild, name, result.week_number, None)
+
+    def _catch_up(self, guild):
+        position = self._positions[guild]
+        if self._shared.position(guild) == position:
+            return
+        changes = self._shared.changes(guild, position)
+        if changes is None:
+            self._forget(guild)
+            return
+        self._positions[guild], entries = changes
+        for name, day, _ in entries:
+            self._refresh(guild, name, day)
+
+    def _refresh(self, guild, name, day):
+        '''
+        Bring the cached rankings and head to head records up to date with
+        a change to name's score on day that the segment already holds.
+        '''
+        days = self._scores[guild].get(name, {})
+        for (ranking_guild, start, end), ranking in self._rankings.items():
+            if ranking_guild != guild or not start <= day < end:
+                continue
+            for i, (_, entry) in enumerate(ranking):
+                if entry == name:
+                    del ranking[i]
+                    break
+            total = _window_total(days, start, end)
+            if total is not None:
+                bisect.insort(ranking, (total, name))
+        for key in [k for k in self._head_to_head if k[0] == guild and name in k[1:]]:
+            del self._head_to_head[key]
+
+    def _apply(self, guild, name, day, score):
+        '''Patch the cached guild for name's score on day, None to remove it.'''
+        scores = self._scores.get(guild)
+        if scores is None:
+            return
+        if score is None and day not in scores.get(name, {}):
+            return
+        days = scores.setdefault(name, {})
+        old = days.get(day)
+        affected = [
+            (ranking, start, end, _window_total(days, start, end))
+            for (ranking_guild, start, end), ranking in self._rankings.items()
+            if ranking_guild == guild and start <= day < end
+        ]
+        histogram = self._histograms[guild].setdefault(
+            name, [0] * utils.FAILURE_SCORE
+        )
+        self._patch_head_to_head(guild, name, day, old, score)
+        played = self._days[guild].setdefault(name, [])
+        if old is not None:
+            histogram[old - 1] -= 1
+        if score is None:
+            del days[day]
+            del played[bisect.bisect_left(played, day)]
+        else:
+            if old is None:
+                bisect.insort(played, day)
+            histogram[score - 1] += 1
+            days[day] = score
+        for ranking, start, end, old_total in affected:
+            if old_total is not None:
+                del ranking[bisect.bisect_left(ranking, (old_total, name))]
+            total = _window_total(days, start, end)
+            if total is not None:
+                bisect.insort(ranking, (total, name))
+
+    def _patch_head_to_head(self, guild, name, day, old, new):
+        scores = self._scores[guild]
+        for (h2h_guild, player, opponent), record in self._head_to_head.items():
+            if h2h_guild != guild or player == opponent:
+                continue
+            if name == player:
+                other = scores.get(opponent, {}).get(day)
+                if other is not None:
+                    if old is not None:
+                        record.add(old, other, -1)
+                    if new is not None:
+                        record.add(new, other)
+            elif name == opponent:
+                other = scores.get(player, {}).get(day)
+                if other is not None:
+                    if old is not None:
+                        record.add(other, old, -1)
+                    if new is not None:
+                        record.add(other, new)
+
+    def scores(self, guild):
+        with self._lock:
+            if guild in self._positions:
+                self._catch_up(guild)
+            try:
+                return self._scores[guild]
+            except KeyError:
+                pass
+            if self._shared is not None and self._load_shared(guild):
+                return self._scores[guild]
+            scores = {}
+            for name, result in self._db.iter_results(guild):
+                scores.setdefault(name, {})[result.week_number] = result.score
+            histograms = {}
+            for name, days in scores.items():
+                histogram = histograms[name] = [0] * utils.FAILURE_SCORE
+                for score in days.values():
+                    histogram[score - 1] += 1
+            self._scores[guild] = scores
+            self._histograms[guild] = histograms
+            self._days[guild] = {name: sorted(days) for name, days in scores.items()}
+            return scores
+
+    def _load_shared(self, guild):
+        if not self._shared.populate(guild, self._db):
+            return False
+        position, scores, histograms, days = self._shared.view(guild)
+        self._scores[guild] = scores
+        self._histograms[guild] = histograms
+        self._days[guild] = days
+        self._positions[guild] = position
+        return True
+
+    def _forget(self, guild):
+        for cache in (self._scores, self._histograms, self._days, self._positions):
+            cache.pop(guild, None)
+        for cache in (self._rankings, self._head_to_head):
+            for key in [k for k in cache if k[0] == guild]:
+                del cache[key]
+
+    def head_to_head(self, guild, player, opponent):
+        '''
+        HeadToHead record for player against opponent. The first request for
+        a pair intersects their sorted day lists; after that the record is
+        patched on save, or dropped and worked out again when the save came
+        through the shared segment.
+        '''
+        with self._lock:
+            scores = self.scores(guild)
+            key = (guild, player, opponent)
+            try:
+                return self._head_to_head[key]
+            except KeyError:
+                pass
+            days = self._days[guild]
+            record = HeadToHead()
+            if player != opponent:
+                for day in intersect_sorted(days.get(player, []),
+                                            days.get(opponent, [])):
+                    record.add(scores[player][day], scores[opponent][day])
+            self._head_to_head[key] = record
+            return record
+
+    def histograms(self, guild, start, end):
+        '''
+        Score histograms over [start, end) for every user who played in it.
+        Windows that reach back to the first day start from the all-time
+        histograms and only take off the days after end.
+        '''
+        with self._lock:
+            scores = self.scores(guild)
+            histograms = {}
+            if start <= 0:
+                later = range(end, utils.current_day() + 1)
+                for name, all_time in self._histograms[guild].items():
+                    histogram = list(all_time)
+                    days = scores[name]
+                    for day in later:
+                        if day in days:
+                            histogram[days[day] - 1] -= 1
+                    if any(histogram):
+                        histograms[name] = histogram
+                return histograms
+            for name, days in scores.items():
+                histogram = [0] * utils.FAILURE_SCORE
+                for day in range(start, end):
+                    if day in days:
+                        histogram[days[day] - 1] += 1
+                if any(histogram):
+                    histograms[name] = histogram
+            return histograms
+
+    def ranking(self, guild, start, end):
+        '''
+        Sorted [(total, name)] over [start, end). Returns a copy, since the
+        cached ranking is patched by saves on other threads.
+        '''
+        with self._lock:
+            return list(self._ranking(guild, start, end))
+
+    def _ranking(self, guild, start, end):
+        '''Cached ranking for the window. Caller holds the lock.'''
+        scores = self.scores(guild)
+        key = (guild, start, end)
+        try:
+            return self._rankings[key]
+        except KeyError:
+            pass
+        for stale in [k for k in self._rankings if k[0] == guild and k[2] != end]:
+            del self._rankings[stale]
+        ranking = []
+        for name, days in scores.items():
+            total = _window_total(days, start, end)
+            if total is not None:
+                ranking.append((total, name))
+        ranking.sort()
+        self._rankings[key] = ranking
+        return ranking
+
+    def global_ranking(self, start, end):
+        '''
+        Merge the sorted per-guild rankings, keeping each user's best total
+        when they play in more than one guild.
+        '''
+        seen = set()
+        merged = []
+        with self._lock:
+            for total, name in heapq.merge(
+                *(self._ranking(guild, start, end) for guild in self._db.guilds())
+            ):
+                if name not in seen:
+                    seen.add(name)
+                    merged.append((name, total))
+        return merged
+
+    def display_name(self, name):
+        try:
+            return self._names[name]
+        except KeyError:
+            pass
+        for guild in self._db.guilds():
+            display_name = self._db.display_name(guild, name)
+            if display_name:
+                break
+        else:
+            display_name = str(name)
+        self._names[name] = display_name
+        return display_name
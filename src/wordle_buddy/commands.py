@@ -1,6 +1,14 @@
+import asyncio
 import datetime
+import math
+import threading
 from enum import Enum
 from wordle_buddy import utils
+from wordle_buddy.aggregates import histogram_percentile, histogram_trimmed_mean
+from wordle_buddy.message import GAMES
+from wordle_buddy.rank_history import week_start
+from wordle_buddy.result import WORDLE
+from wordle_buddy.throttle import SingleFlight
 
 HELP_TEXT = '''
 *Hello it's me, the Wordle Buddy!*
@@ -18,39 +26,80 @@ Available commands:
 > help
 Get this help message sent to your DMs
 
-> leaderboard [option]
-Get a leaderboard sent to the wordle chat channel. Option defines the type of leaderboard, valid options 'week' (default), 'month', or a number of days. 'week' totals scores from the start of the week, 'month' from the start of the month and a number totals scores for the specified number of days (not including the current day).
+> leaderboard [global] [game] [option]
+Get a leaderboard sent to the wordle chat channel. Option defines the type of leaderboard, valid options 'week' (default), 'month', 'all', or a number of days. 'week' totals scores from the start of the week, 'month' from the start of the month and a number totals scores for the specified number of days (not including the current day). Add 'global' to rank players across every server I'm in. Game can be 'wordle' (default), 'nerdle', 'worldle' or 'quordle'.
+
+> average [game] [option]
+Get a leaderboard ranked by average score over the days played. Option is 'all' (default), 'week', 'month' or a number of days.
   
+> median [option]
+Get a leaderboard ranked by each player's median score. Option is the same as for average, 'all' (default), 'week', 'month' or a number of days.
+
+> percentile <number> [option]
+Get a leaderboard ranked by the given percentile (0-100) of each player's scores, e.g. 'percentile 90' ranks by how well players do on their worse days.
+
+> trimmed [option]
+Get a leaderboard ranked by each player's mean score with their best and worst 10% of games left out, so one bad day doesn't ruin the average.
+
+> puzzle <number>
+Get the score breakdown for one wordle puzzle: how many played, the average, the fail rate and who got each score.
+
+> today
+Get the score breakdown for today's puzzle.
+
+> trend [@user] [weeks]
+Get how a player's week leaderboard position changed over the last few weeks (4 by default). Leave out the user to see your own.
+
+> vs @user
+Compare yourself with another player over the days you both played: wins, draws, losses and how many guesses you win or lose by on average.
+
+> profile on|off|dump
+Admins only. Turn sampled profiling of message handling on or off, or write the current profiles and allocation report to disk.
+
 **Results:**
 
 Results are accepted if they are directly copied and pasted from wordle. You can use light or dark mode, it doesn't matter. You have to submit results on the correct day or they will be rejected! If your results have been read and saved by me I will react with a green tick.
 '''
 
 
-async def _ldb_from_results(guild, results):
+async def _display_name(guild, user_id, names=None):
+    if names is not None:
+        try:
+            return names[(guild.id, user_id)]
+        except KeyError:
+            pass
+    member = await guild.fetch_member(user_id)
+    display_name = member.display_name if member else None
+    if names is not None:
+        names[(guild.id, user_id)] = display_name
+    return display_name
+
+
+async def _ldb_from_results(guild, results, names=None,
+                            failure_score=utils.FAILURE_SCORE):
     ldb = {}
     for k, v in results.items():
-        member = await guild.fetch_member(k)
-        if member:
-            ldb[member.display_name] = _total_score(v)
+        display_name = await _display_name(guild, k, names)
+        if display_name:
+            ldb[display_name] = _total_score(v, failure_score)
     sort_ldb = dict(sorted(ldb.items(), key=lambda pair: pair[1]))
     return sort_ldb
 
 
-async def _ave_ldb_from_results(guild, results):
+async def _ave_ldb_from_results(guild, results, names=None):
     ldb = {}
     for k, v in results.items():
-        member = await guild.fetch_member(k)
-        if member:
-            ldb[member.display_name] = _ave_score(v)
+        display_name = await _display_name(guild, k, names)
+        if display_name:
+            ldb[display_name] = _ave_score(v)
     sort_ldb = dict(sorted(ldb.items(), key=lambda pair: pair[1][0]))
     return sort_ldb
 
 
-def _ldb_message(days, ldb):
+def _ldb_message(days, ldb, title='Wordle Leaderboard'):
     start = datetime.datetime.today() - datetime.timedelta(days=days)
     end = datetime.datetime.today() - datetime.timedelta(days=1)
-    ldb_str = f'''```Wordle Leaderboard: {start:%d/%m/%Y} - {end:%d/%m/%Y}
+    ldb_str = f'''```{title}: {start:%d/%m/%Y} - {end:%d/%m/%Y}
 ===========================================
 POS NAME           SCORE
 -------------------------------------------'''
@@ -60,10 +109,10 @@ POS NAME           SCORE
     return ldb_str
 
 
-def _ave_ldb_message(days, ldb):
+def _ave_ldb_message(days, ldb, title='Wordle Average Leaderboard'):
     start = datetime.datetime.today() - datetime.timedelta(days=days)
     end = datetime.datetime.today() - datetime.timedelta(days=1)
-    ldb_str = f'''```Wordle Average Leaderboard: {start:%d/%m/%Y} - {end:%d/%m/%Y}
+    ldb_str = f'''```{title}: {start:%d/%m/%Y} - {end:%d/%m/%Y}
 ===========================================
 POS NAME           SCORE  TOTAL GAMES
 -------------------------------------------'''
@@ -73,13 +122,82 @@ POS NAME           SCORE  TOTAL GAMES
     return ldb_str
 
 
-def _total_score(user_results):
+def _digest_message(day, ldb):
+    scores = list(ldb.values())
+    best = min(scores)
+    digest_str = f'''```Wordle {day} Daily Digest
+===========================================
+Players: {len(scores)}
+Average: {sum(scores) / len(scores):.3f}
+Best:    {'X' if best == utils.FAILURE_SCORE else best}/6 - {', '.join(name for name, score in ldb.items() if score == best)}
+-------------------------------------------'''
+    for score in range(1, utils.FAILURE_SCORE + 1):
+        label = 'X' if score == utils.FAILURE_SCORE else str(score)
+        digest_str += f'\n{label:<4}{scores.count(score)}'
+    digest_str += '```'
+    return digest_str
+
+
+def _puzzle_message(puzzle, entry, names):
+    puzzle_str = f'''```Wordle {puzzle}
+===========================================
+Players: {entry.players}
+Average: {entry.average:.3f}
+Failed:  {entry.failures} ({entry.failures / entry.players:.1%})
+-------------------------------------------'''
+    for score, count in enumerate(entry.histogram, start=1):
+        label = 'X' if score == utils.FAILURE_SCORE else str(score)
+        solvers = ', '.join(
+            names[name] for name, s in entry.solvers.items()
+            if s == score and names[name]
+        )
+        puzzle_str += f'\n{label:<4}{count:<4}{solvers}'.rstrip()
+    puzzle_str += '```'
+    return puzzle_str
+
+
+def _vs_message(player, opponent, record):
+    vs_str = f'''```Wordle Head to Head: {player} vs {opponent}
+===========================================
+Shared games: {record.played}
+-------------------------------------------
+Wins:   {record.wins}
+Draws:  {record.draws}
+Losses: {record.losses}
+Average margin: {record.average_margin:+.3f}```'''
+    return vs_str
+
+
+def _trend_message(name, weeks, trend):
+    trend_str = f'''```Wordle Trend: {name}, last {weeks} weeks
+===========================================
+WEEK OF     POS    SCORE  CHANGE
+-------------------------------------------'''
+    previous = None
+    for start, position, players, total in trend:
+        change = f'{previous - position:+d}' if previous is not None else ''
+        trend_str += f'\n{utils.day_date(start):%d/%m/%Y}  {f"{position}/{players}":<7}{total:<7}{change}'.rstrip()
+        previous = position
+    trend_str += '```'
+    return trend_str
+
+
+def _ordinal(number):
+    text = f'{number:g}'
+    if number != int(number):
+        return f'{text}th'
+    if int(number) % 100 in (11, 12, 13):
+        return f'{text}th'
+    return text + {1: 'st', 2: 'nd', 3: 'rd'}.get(int(number) % 10, 'th')
+
+
+def _total_score(user_results, failure_score=utils.FAILURE_SCORE):
     score = 0
     for result in user_results:
         if result:
-            score += result['score']
+            score += result.score
         else:
-            score += utils.FAILURE_SCORE
+            score += failure_score
     return score
 
 
@@ -88,7 +206,7 @@ def _ave_score(user_results):
     num_scores = 0
     for result in user_results:
         if result:
-            score += result['score']
+            score += result.score
             num_scores += 1
     try:
         return score / num_scores, num_scores
@@ -102,6 +220,40 @@ class WordleCommandHandler:
     COMMAND_LEADERBOARD = 'leaderboard'
     COMMAND_SCRAPE = 'scrape'
     COMMAND_AVERAGE_LDB = 'average'
+    COMMAND_PROFILE = 'profile'
+    COMMAND_PUZZLE = 'puzzle'
+    COMMAND_MEDIAN_LDB = 'median'
+    COMMAND_PERCENTILE_LDB = 'percentile'
+    COMMAND_TRIMMED_LDB = 'trimmed'
+    COMMAND_TODAY = 'today'
+    COMMAND_VS = 'vs'
+    COMMAND_TREND = 'trend'
+    TRIM_FRACTION = 0.1
+    TREND_WEEKS = 4
+
+    COMMAND_WEIGHTS = {
+        COMMAND_HELP: 1,
+        COMMAND_LEADERBOARD: 2,
+        COMMAND_SCRAPE: 5,
+        COMMAND_AVERAGE_LDB: 3,
+        COMMAND_MEDIAN_LDB: 3,
+        COMMAND_PERCENTILE_LDB: 3,
+        COMMAND_TRIMMED_LDB: 3,
+        COMMAND_PUZZLE: 1,
+        COMMAND_TODAY: 1,
+        COMMAND_VS: 1,
+        COMMAND_TREND: 1,
+        COMMAND_PROFILE: 0,
+    }
+    SHARED_COMMANDS = {
+        COMMAND_LEADERBOARD,
+        COMMAND_AVERAGE_LDB,
+        COMMAND_MEDIAN_LDB,
+        COMMAND_PERCENTILE_LDB,
+        COMMAND_TRIMMED_LDB,
+        COMMAND_PUZZLE,
+        COMMAND_TODAY,
+    }
 
     class Response(Enum):
         NONE = 0
@@ -109,14 +261,49 @@ class WordleCommandHandler:
         MSG_CHANNEL = 2
         SCRAPE = 3
 
-    def __init__(self, db):
+    def __init__(self, db, aggregates=None, profiler=None, puzzle_index=None,
+                 throttle=None, rank_history=None):
         self._database = db
+        self._aggregates = aggregates
+        self._profiler = profiler
+        self._puzzle_index = puzzle_index
+        self._throttle = throttle
+        self._rank_history = rank_history
+        self._single_flight = SingleFlight()
+        self._cache = {}
+        # Bumped on every invalidation, so a board computed from results
+        # read before a save isn't cached after it.
+        self._generations = {}
+        self._cache_lock = threading.Lock()
+        self._member_names = {}
+        if db is not None:
+            db.add_listener(self)
 
     async def handle_command(self, guild, message):
         if not message.content.startswith(self.COMMAND_PREFIX):
             return self.Response.NONE, None
+        prefix, *command_list = message.content.split()
+        # Only known commands are throttled, so '+wow' or a typo never
+        # costs anyone tokens.
+        if prefix != self.COMMAND_PREFIX or not command_list or \
+                command_list[0] not in self.COMMAND_WEIGHTS:
+            return self.Response.NONE, None
+        if self._throttle is not None:
+            wait = self._throttle.check(
+                guild.id, message.author.id,
+                self.COMMAND_WEIGHTS[command_list[0]]
+            )
+            if wait:
+                return self.Response.MSG_PRIVATE, f'Slow down! Try again in {math.ceil(wait)} s.'
+        if command_list[0] in self.SHARED_COMMANDS:
+            return await self._single_flight.run(
+                (guild.id, tuple(command_list)),
+                lambda: self._dispatch(guild, message, command_list)
+            )
+        return await self._dispatch(guild, message, command_list)
+
+    async def _dispatch(self, guild, message, command_list):
         try:
-            command_list = message.content.split()[1:]
             if command_list[0] == self.COMMAND_HELP:
                 return self._help()
             elif command_list[0] == self.COMMAND_LEADERBOARD:
@@ -127,44 +314,311 @@ class WordleCommandHandler:
             elif command_list[0] == self.COMMAND_AVERAGE_LDB:
                 command_list.pop(0)
                 return await self._average_ldb(guild, command_list)
+            elif command_list[0] == self.COMMAND_MEDIAN_LDB:
+                command_list.pop(0)
+                return await self._order_ldb(guild, 'Median', 50, command_list)
+            elif command_list[0] == self.COMMAND_PERCENTILE_LDB:
+                command_list.pop(0)
+                return await self._percentile_ldb(guild, command_list)
+            elif command_list[0] == self.COMMAND_TRIMMED_LDB:
+                command_list.pop(0)
+                return await self._order_ldb(guild, 'Trimmed Mean', None, command_list)
+            elif command_list[0] == self.COMMAND_PUZZLE:
+                command_list.pop(0)
+                return await self._puzzle(guild, command_list)
+            elif command_list[0] == self.COMMAND_TODAY:
+                return await self._puzzle(guild, [str(utils.current_day())])
+            elif command_list[0] == self.COMMAND_VS:
+                return await self._vs(guild, message)
+            elif command_list[0] == self.COMMAND_TREND:
+                command_list.pop(0)
+                return await self._trend(guild, message, command_list)
+            elif command_list[0] == self.COMMAND_PROFILE:
+                command_list.pop(0)
+                return self._profile(message.author, command_list)
         except KeyError:
-            return self.Response.NONE, None
+            pass
+        return self.Response.NONE, None
 
     def _help(self):
         return self.Response.MSG_PRIVATE, HELP_TEXT
 
+    async def _percentile_ldb(self, guild, additional):
+        try:
+            percentile = float(additional[0])
+        except (IndexError, ValueError):
+            return self.Response.NONE, None
+        if not 0 <= percentile <= 100:
+            return self.Response.NONE, None
+        return await self._order_ldb(
+            guild, f'{_ordinal(percentile)} Percentile', percentile, additional[1:]
+        )
+
+    async def _order_ldb(self, guild, title, percentile, additional):
+        if self._aggregates is None:
+            return self.Response.NONE, None
+        days = self._window_days(additional[0] if additional else 'all')
+        if days is None:
+            return self.Response.NONE, None
+        if percentile is None:
+            return await self._histogram_ldb(
+                guild, title, days, histogram_trimmed_mean, self.TRIM_FRACTION
+            )
+        return await self._histogram_ldb(
+            guild, title, days, histogram_percentile, percentile
+        )
+
+    async def _histogram_ldb(self, guild, title, days, measure, argument):
+        histograms = self._aggregates.histograms(
+            guild.id, utils.current_day() - days, utils.current_day()
+        )
+        ldb = {}
+        for name, histogram in histograms.items():
+            value = measure(histogram, argument)
+            display_name = await _display_name(guild, name, self._member_names)
+            if display_name and value is not None:
+                ldb[display_name] = value, sum(histogram)
+        sort_ldb = dict(sorted(ldb.items(), key=lambda pair: pair[1][0]))
+        return self.Response.MSG_CHANNEL, _ave_ldb_message(
+            days, sort_ldb, f'Wordle {title} Leaderboard'
+        )
+
+    async def _puzzle(self, guild, additional):
+        if self._puzzle_index is None or not additional:
+            return self.Response.NONE, None
+        try:
+            puzzle = int(additional[0].lstrip('#'))
+        except ValueError:
+            return self.Response.NONE, None
+        entry = await asyncio.to_thread(self._puzzle_index.get, guild.id, puzzle)
+        if entry is None or not entry.players:
+            return self.Response.MSG_CHANNEL, f'Nobody has played Wordle {puzzle} yet.'
+        names = {
+            name: await _display_name(guild, name, self._member_names)
+            for name in entry.solvers
+        }
+        return self.Response.MSG_CHANNEL, _puzzle_message(puzzle, entry, names)
+
+    async def _vs(self, guild, message):
+        if self._aggregates is None or not message.mentions:
+            return self.Response.NONE, None
+        player = message.author.id
+        opponent = message.mentions[0].id
+        if player == opponent:
+            return self.Response.NONE, None
+        record = self._aggregates.head_to_head(guild.id, player, opponent)
+        if not record.played:
+            return self.Response.MSG_CHANNEL, 'You have not played on any of the same days yet.'
+        return self.Response.MSG_CHANNEL, _vs_message(
+            await _display_name(guild, player, self._member_names),
+            await _display_name(guild, opponent, self._member_names),
+            record
+        )
+
+    async def _trend(self, guild, message, additional):
+        if self._rank_history is None:
+            return self.Response.NONE, None
+        player = message.mentions[0].id if message.mentions else message.author.id
+        options = [option for option in additional if not option.startswith('<@')]
+        try:
+            weeks = int(options[0]) if options else self.TREND_WEEKS
+        except ValueError:
+            return self.Response.NONE, None
+        if weeks < 1:
+            return self.Response.NONE, None
+        name = await _display_name(guild, player, self._member_names)
+        trend = self._rank_history.weekly(guild.id, player, weeks)
+        if not trend:
+            return self.Response.MSG_CHANNEL, f'No leaderboard history for {name} yet.'
+        return self.Response.MSG_CHANNEL, _trend_message(name, weeks, trend)
+
+    def _profile(self, author, additional):
+        permissions = getattr(author, 'guild_permissions', None)
+        if not (permissions and permissions.administrator):
+            return self.Response.NONE, None
+        if self._profiler is None or not self._profiler.configured:
+            return self.Response.MSG_PRIVATE, 'Profiling is not configured, set PROFILE_DIR to use it.'
+        option = additional[0] if additional else ''
+        if option == 'on':
+            self._profiler.enable()
+            return self.Response.MSG_PRIVATE, 'Profiling enabled.'
+        elif option == 'off':
+            self._profiler.disable()
+            return self.Response.MSG_PRIVATE, 'Profiling disabled, profiles written.'
+        elif option == 'dump':
+            if not self._profiler.enabled:
+                return self.Response.MSG_PRIVATE, 'Profiling is off.'
+            written = self._profiler.dump()
+            return self.Response.MSG_PRIVATE, 'Wrote:\n' + '\n'.join(written)
+        return self.Response.NONE, None
+
+    async def warm(self, guild):
+        '''
+        Build the day's week, month and all-time boards, and the puzzle
+        index, ahead of the first request. Wordle boards come from the aggregates when there are
+        some, so the all-time windows never read the whole history from
+        disk.
+        '''
+        day = utils.current_day()
+        with self._cache_lock:
+            self._cache = {k: v for k, v in self._cache.items() if k[-1] == day}
+        self._member_names = {
+            k: v for k, v in self._member_names.items() if k[0] != guild.id
+        }
+        for option in ('week', 'month', 'all'):
+            await self._leaderboard(guild, [option])
+            await self._average_ldb(guild, [option])
+        if self._aggregates is not None:
+            self._aggregates.global_ranking(
+                day - self._window_days('week'), day
+            )
+        if self._puzzle_index is not None:
+            # Builds the guild's index on first use, away from commands.
+            await asyncio.to_thread(self._puzzle_index.get, guild.id, day)
+
+    def record_ranks(self, guild):
+        if self._aggregates is None or self._rank_history is None:
+            return
+        day = utils.current_day()
+        self._rank_history.record(
+            guild.id, day,
+            self._aggregates.ranking(guild.id, week_start(day), day)
+        )
+
+    def on_save(self, guild, name, result, display_name=''):
+        self._changed(guild, result)
+
+    def on_delete(self, guild, name, result):
+        self._changed(guild, result)
+
+    def _changed(self, guild, result):
+        # Every board window ends before today, so today's results can't
+        # change a cached board.
+        if result.week_number < utils.current_day():
+            self.invalidate(guild)
+
+    def invalidate(self, guild_id):
+        # Called from ingest worker threads as well as the event loop.
+        with self._cache_lock:
+            self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+            self._cache = {
+                k: v for k, v in self._cache.items() if k[1] != guild_id
+            }
+
+    def _store(self, key, generation, response):
+        '''Cache response unless the guild was invalidated since generation.'''
+        with self._cache_lock:
+            if self._generations.get(key[1], 0) == generation:
+                self._cache[key] = response
+        return response
+
+    async def digest(self, guild, day):
+        results = self._database.load(guild.id, weeks=[day])
+        ldb = await _ldb_from_results(guild, results, self._member_names)
+        if not ldb:
+            return self.Response.NONE, None
+        return self.Response.MSG_CHANNEL, _digest_message(day, ldb)
+
+    def _window_days(self, option):
+        if option == 'week':
+            return datetime.datetime.today().isoweekday()
+        elif option == 'month':
+            return datetime.datetime.today().day
+        elif option == 'all':
+            return utils.current_day()
+        try:
+            return int(option)
+        except ValueError:
+            return None
+
     async def _leaderboard(self, guild, additional=None):
         if additional is None or len(additional) == 0:
             additional = ['week']
-        if additional[0] == 'week':
-            days = datetime.datetime.today().isoweekday()
-        elif additional[0] == 'month':
-            days = datetime.datetime.today().day
-        else:
-            try:
-                days = int(additional[0])
-            except ValueError:
-                return self.Response.NONE, None
+        if additional[0] == 'global':
+            return self._global_leaderboard(additional[1:])
+        game, additional = self._game_option(additional, 'week')
+        days = self._window_days(additional[0])
+        if days is None:
+            return self.Response.NONE, None
+        if game.game == WORDLE and self._aggregates is not None:
+            # A snapshot, since results saved on ingest threads can move
+            # players while the names are fetched.
+            ranking = self._aggregates.ranking(
+                guild.id, utils.current_day() - days, utils.current_day()
+            )
+            ldb = {}
+            for total, name in ranking:
+                display_name = await _display_name(
+                    guild, name, self._member_names
+                )
+                if display_name:
+                    ldb[display_name] = total
+            return self.Response.MSG_CHANNEL, _ldb_message(
+                days, ldb, 'Wordle Leaderboard'
+            )
+        key = ('leaderboard', guild.id, game.game, days, utils.current_day())
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        generation = self._generations.get(guild.id, 0)
         results = self._database.load(guild.id,
-                                      weeks=range(utils.current_day() - days, utils.current_day()))
-        ldb = await _ldb_from_results(guild, results)
-        return self.Response.MSG_CHANNEL, _ldb_message(days, ldb)
+                                      weeks=range(utils.current_day() - days, utils.current_day()),
+                                      game=game.game)
+        ldb = await _ldb_from_results(
+            guild, results, self._member_names, game.failure_score
+        )
+        return self._store(key, generation, (
+            self.Response.MSG_CHANNEL,
+            _ldb_message(days, ldb, f'{game.game.capitalize()} Leaderboard')
+        ))
+
+    def _game_option(self, additional, default):
+        game = GAMES[WORDLE]
+        if additional and additional[0] in GAMES:
+            game = GAMES[additional[0]]
+            additional = additional[1:]
+        return game, additional or [default]
+
+    def _global_leaderboard(self, additional):
+        if self._aggregates is None:
+            return self.Response.NONE, None
+        days = self._window_days(additional[0] if additional else 'week')
+        if days is None:
+            return self.Response.NONE, None
+        ranking = self._aggregates.global_ranking(
+            utils.current_day() - days, utils.current_day()
+        )
+        ldb = {
+            self._aggregates.display_name(name): total
+            for name, total in ranking
+        }
+        return self.Response.MSG_CHANNEL, _ldb_message(
+            days, ldb, 'Wordle Global Leaderboard'
+        )
 
     async def _average_ldb(self, guild, additional=None):
-        if additional is None or len(additional) == 0:
-            additional = ['all']
-        if additional[0] == 'week':
-            days = datetime.datetime.today().isoweekday()
-        elif additional[0] == 'month':
-            days = datetime.datetime.today().day
-        elif additional[0] == 'all':
-            days = utils.current_day()
-        else:
-            try:
-                days = int(additional[0])
-            except ValueError:
-                return self.Response.NONE, None
+        game, additional = self._game_option(additional, 'all')
+        days = self._window_days(additional[0])
+        if days is None:
+            return self.Response.NONE, None
+        if game.game == WORDLE and self._aggregates is not None:
+            return await self._histogram_ldb(
+                guild, 'Average', days, histogram_trimmed_mean, 0
+            )
+        key = ('average', guild.id, game.game, days, utils.current_day())
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        generation = self._generations.get(guild.id, 0)
         results = self._database.load(guild.id,
-                                      weeks=range(utils.current_day() - days, utils.current_day()))
-        ldb = await _ave_ldb_from_results(guild, results)
-        return self.Response.MSG_CHANNEL, _ave_ldb_message(days, ldb)
+                                      weeks=range(utils.current_day() - days, utils.current_day()),
+                                      game=game.game)
+        ldb = await _ave_ldb_from_results(guild, results, self._member_names)
+        return self._store(key, generation, (
+            self.Response.MSG_CHANNEL,
+            _ave_ldb_message(
+                days, ldb, f'{game.game.capitalize()} Average Leaderboard'
+            )
+        ))
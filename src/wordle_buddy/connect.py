@@ -1,40 +1,118 @@
+import asyncio
+import logging
+
 import discord
 
+from wordle_buddy import utils
+from wordle_buddy.ingest import IngestQueue
+from wordle_buddy.message import is_candidate
+
 
 check = "\U00002705"
 
 
 class WordleClient(discord.Client):
-    def __init__(self, watch_channel, message_manager, command_handler):
+    ROLLOVER_DELAY = 5
+
+    def __init__(self, router, message_manager, command_handler,
+                 daily_digest=False, profiler=None, ingest_workers=0,
+                 ingest_queue_size=1000, ingest_policy='block', watchdog=None):
         discord.Client.__init__(
             self, intents=discord.Intents.all()
         )
-        self._watch_channel = watch_channel
+        self._router = router
         self._message_manager = message_manager
         self._command_handler = command_handler
+        self._daily_digest = daily_digest
+        self._profiler = profiler
+        self._ingest_queue = None
+        if ingest_workers > 0:
+            self._ingest_queue = IngestQueue(
+                self.ingest, ingest_workers, ingest_queue_size, ingest_policy
+            )
+        self._watchdog = watchdog
+        self._rollover_task = None
+
+    async def setup_hook(self):
+        self._rollover_task = asyncio.create_task(self._rollover_loop())
+        if self._watchdog is not None:
+            self._watchdog.start()
+        if self._ingest_queue is not None:
+            self._ingest_queue.start()
+
+    @property
+    def ingest_queue(self):
+        return self._ingest_queue
 
     async def on_ready(self):
         print(f"{self.user} has connected to discord!")
 
+    async def _rollover_loop(self):
+        await self.wait_until_ready()
+        while not self.is_closed():
+            await asyncio.sleep(
+                utils.seconds_until_next_day() + self.ROLLOVER_DELAY
+            )
+            await self.rollover()
+
+    async def rollover(self):
+        day = utils.current_day()
+        logging.info(f'Rolling over to day {day}')
+        for guild in self.guilds:
+            try:
+                await self._command_handler.warm(guild)
+                self._command_handler.record_ranks(guild)
+                if self._daily_digest:
+                    await self._post_digest(guild, day - 1)
+            except Exception:
+                logging.exception(f'Day rollover failed for guild {guild.id}')
+
+    async def _post_digest(self, guild, day):
+        response_type, response = await self._command_handler.digest(
+            guild, day
+        )
+        if response_type != self._command_handler.Response.MSG_CHANNEL:
+            return
+        for channel in guild.text_channels:
+            route = self._router.route(channel)
+            if route is not None and route.accepts_commands:
+                await channel.send(response)
+                return
+
     async def on_message(self, message):
+        if self._profiler is None:
+            return await self._on_message(message)
+        return await self._profiler.profile(
+            'on_message', self._on_message(message)
+        )
+
+    async def _handle_command(self, message):
+        if self._profiler is None:
+            return await self._command_handler.handle_command(
+                message.guild, message
+            )
+        return await self._profiler.profile(
+            'handle_command',
+            self._command_handler.handle_command(message.guild, message)
+        )
+
+    async def _on_message(self, message):
         if message.author == self.user:
             return
-        if self._watch_channel not in message.channel.name:
+        route = self._router.route(message.channel)
+        if route is None:
             return
 
-        response_type, response = await self._command_handler.handle_command(
-            message.guild, message
-        )
+        response_type, response = self._command_handler.Response.NONE, None
+        if route.accepts_commands:
+            response_type, response = await self._handle_command(message)
         if response_type == self._command_handler.Response.NONE:
-            ok = self._message_manager.handle(
-                message.guild.id,
-                message.author.id,
-                message.content,
-                message.created_at,
-                message.author.name,
-            )
-            if ok:
-                await message.add_reaction(check)
+            if not route.accepts_results or not is_candidate(message.content):
+                return
+            if self._ingest_queue is None:
+                await self.ingest(message)
+            else:
+                await self._ingest_queue.submit(message.guild.id, message)
         elif response_type == self._command_handler.Response.SCRAPE:
             await self.scrape(message.channel)
         elif response_type == self._command_handler.Response.MSG_CHANNEL:
@@ -42,14 +120,93 @@ class WordleClient(discord.Client):
         elif response_type == self._command_handler.Response.MSG_PRIVATE:
             await message.author.send(response)
 
+    async def ingest(self, message):
+        # Parsing and saving touch the disk, so they run off the event loop.
+        ok = await asyncio.to_thread(
+            self._message_manager.handle,
+            message.guild.id,
+            message.author.id,
+            message.content,
+            message.created_at,
+            message.author.name,
+            message_id=message.id,
+        )
+        if ok:
+            await message.add_reaction(check)
+
+    async def on_message_edit(self, before, after):
+        if before.content == after.content or after.guild is None:
+            return
+        await self._on_edit(
+            after.guild.id, after.channel, after.id, after.author.id,
+            after.author.name, after.content, after.created_at, after
+        )
+
+    async def on_raw_message_edit(self, payload):
+        # Cached messages go through on_message_edit, and updates without
+        # content are embeds being filled in.
+        if payload.cached_message is not None or payload.guild_id is None \
+                or 'content' not in payload.data \
+                or 'author' not in payload.data:
+            return
+        author = payload.data['author']
+        await self._on_edit(
+            payload.guild_id,
+            self.get_channel(payload.channel_id),
+            payload.message_id,
+            int(author['id']),
+            author.get('username', ''),
+            payload.data['content'],
+            discord.utils.snowflake_time(payload.message_id),
+        )
+
+    async def _on_edit(self, guild_id, channel, message_id, author_id,
+                       display_name, content, created_at, message=None):
+        if channel is None or (self.user and author_id == self.user.id):
+            return
+        route = self._router.route(channel)
+        if route is None or not route.accepts_results:
+            return
+        retracted, saved = await asyncio.to_thread(
+            self._message_manager.edit,
+            guild_id, author_id, message_id, content, created_at, display_name
+        )
+        if not (retracted or saved) or message is None:
+            return
+        reacted = check in [str(r) for r in message.reactions]
+        if saved and not reacted:
+            await message.add_reaction(check)
+        elif not saved and reacted:
+            await message.remove_reaction(check, self.user)
+
+    async def on_message_delete(self, message):
+        if message.guild is not None:
+            await self._retract(message.guild.id, message.id)
+
+    async def on_raw_message_delete(self, payload):
+        if payload.cached_message is None and payload.guild_id is not None:
+            await self._retract(payload.guild_id, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        if payload.guild_id is not None:
+            for message_id in payload.message_ids:
+                await self._retract(payload.guild_id, message_id)
+
+    async def _retract(self, guild_id, message_id):
+        await asyncio.to_thread(
+            self._message_manager.retract, guild_id, message_id
+        )
+
     async def scrape(self, channel):
         async for message in channel.history(limit=500):
             if check not in [str(r) for r in message.reactions]:
-                ok = self._message_manager.handle(
+                ok = await asyncio.to_thread(
+                    self._message_manager.handle,
                     message.guild.id,
                     message.author.id,
                     message.content,
                     message.created_at,
+                    message_id=message.id,
                 )
                 if ok:
                     await message.add_reaction(check)
@@ -0,0 +1,313 @@
+import asyncio
+import copy
+import datetime
+import random
+import time
+
+import discord
+
+from wordle_buddy import utils
+
+
+RESULT_ROWS = [
+    utils.WHITE_SQUARE_CHAR * 5,
+    utils.YELLOW_SQUARE_CHAR + utils.WHITE_SQUARE_CHAR * 2
+    + utils.GREEN_SQUARE_CHAR + utils.WHITE_SQUARE_CHAR,
+    utils.GREEN_SQUARE_CHAR * 2 + utils.YELLOW_SQUARE_CHAR
+    + utils.GREEN_SQUARE_CHAR + utils.WHITE_SQUARE_CHAR,
+]
+SOLVED_ROW = utils.GREEN_SQUARE_CHAR * 5
+CHATTER = [
+    'morning all',
+    'that one was hard',
+    'anyone else get it in two?',
+]
+
+
+NERDLE_ROWS = [
+    '\U0001f7ea\u2b1b\U0001f7ea\U0001f7ea\u2b1b\U0001f7ea\U0001f7e9\U0001f7ea',
+    '\U0001f7e9\U0001f7e9\U0001f7e9\U0001f7ea\U0001f7ea\U0001f7ea\U0001f7e9\U0001f7e9',
+]
+WORLDLE_ROWS = [
+    utils.GREEN_SQUARE_CHAR * 2 + utils.YELLOW_SQUARE_CHAR
+    + utils.WHITE_SQUARE_CHAR * 2 + '\u2b05\ufe0f',
+    utils.GREEN_SQUARE_CHAR * 4 + utils.YELLOW_SQUARE_CHAR + '\u2196\ufe0f',
+]
+
+
+def _grid(rows, solved_row, score, failure_score=utils.FAILURE_SCORE):
+    guesses = 6 if score == failure_score else score - 1
+    grid = [rows[i % len(rows)] for i in range(guesses)]
+    if score != failure_score:
+        grid.append(solved_row)
+    return grid
+
+
+def game_content(game, puzzle, score):
+    '''
+    Shared result text for game, the way each game's share button formats
+    it. Quordle takes a list of four word scores, 10 for a missed word.
+    '''
+    if game == 'wordle':
+        return result_content(puzzle, score)
+    label = 'X' if score == utils.FAILURE_SCORE else score
+    if game == 'nerdle':
+        return '\n'.join(
+            [f'nerdlegame {puzzle} {label}/6', '']
+            + _grid(NERDLE_ROWS, utils.GREEN_SQUARE_CHAR * 8, score)
+            + ['', 'https://nerdlegame.com']
+        )
+    if game == 'worldle':
+        return '\n'.join(
+            [f'#Worldle #{puzzle} {label}/6 (100%)']
+            + _grid(WORLDLE_ROWS, utils.GREEN_SQUARE_CHAR * 5 + '\U0001f389', score)
+            + ['https://worldle.teuteuf.fr']
+        )
+    if game == 'quordle':
+        words = [
+            '\U0001f7e5' if word == 10 else f'{word}\ufe0f\u20e3' for word in score
+        ]
+        return '\n'.join([
+            f'Daily Quordle {puzzle}', words[0] + words[1], words[2] + words[3],
+            'm-w.com/games/quordle/',
+        ])
+    raise ValueError(f'Unknown game {game}')
+
+
+def result_content(day, score):
+    if score == utils.FAILURE_SCORE:
+        rows = [RESULT_ROWS[i % len(RESULT_ROWS)] for i in range(6)]
+        header = f'Wordle {day} X/6'
+    else:
+        rows = [RESULT_ROWS[i % len(RESULT_ROWS)] for i in range(score - 1)]
+        rows.append(SOLVED_ROW)
+        header = f'Wordle {day} {score}/6'
+    return '\n'.join([header, ''] + rows)
+
+
+class RateLimiter:
+    '''
+    Spaces calls at least interval seconds apart, sleeping the caller the
+    way discord.py sleeps out a 429 before retrying.
+    '''
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._next = 0.0
+        self.waited = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self._interval
+        if start > now:
+            self.waited += start - now
+            await asyncio.sleep(start - now)
+
+
+class FakePermissions:
+
+    def __init__(self, administrator=False):
+        self.administrator = administrator
+
+
+class FakeUser:
+
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.sent = []
+        self.guild_permissions = FakePermissions()
+
+    async def send(self, content):
+        self.sent.append(content)
+
+
+class FakeGuild:
+
+    def __init__(self, guild_id, members, fetch_latency=0.0):
+        self.id = guild_id
+        self._members = {member.id: member for member in members}
+        self._fetch_latency = fetch_latency
+        self.fetches = 0
+        self.text_channels = []
+
+    async def fetch_member(self, member_id):
+        self.fetches += 1
+        if self._fetch_latency:
+            await asyncio.sleep(self._fetch_latency)
+        return self._members.get(member_id)
+
+
+class FakeMessage:
+
+    def __init__(self, message_id, channel, author, content, created_at):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        await self.channel.reaction_limiter.acquire()
+        self.reactions.append(emoji)
+
+    async def remove_reaction(self, emoji, member):
+        self.reactions.remove(emoji)
+
+
+class FakeRawEvent:
+    '''The fields of discord.py's raw edit and delete payloads the client reads.'''
+
+    def __init__(self, message, cached_message=None, data=None):
+        self.message_id = message.id
+        self.message_ids = {message.id}
+        self.channel_id = message.channel.id
+        self.guild_id = message.guild.id
+        self.cached_message = cached_message
+        self.data = data
+
+
+class FakeChannel:
+
+    def __init__(self, channel_id, name, guild, reaction_interval=0.0,
+                 page_size=100, page_latency=0.0):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.reaction_limiter = RateLimiter(reaction_interval)
+        self.messages = []
+        self.sent = []
+        self._page_size = page_size
+        self._page_latency = page_latency
+
+    async def send(self, content):
+        self.sent.append(content)
+
+    async def history(self, limit=100):
+        newest_first = self.messages[::-1][:limit]
+        for start in range(0, len(newest_first), self._page_size):
+            if self._page_latency:
+                await asyncio.sleep(self._page_latency)
+            for message in newest_first[start:start + self._page_size]:
+                yield message
+
+
+class FakeGateway:
+    '''
+    Stand-in for the Discord gateway and REST API. Messages are dispatched
+    to client.on_message in their own task, as discord.py does, and the
+    time from dispatch to the handler returning is recorded per message.
+    '''
+
+    def __init__(self, client, guilds=1, channel_name='wordle', users=100,
+                 fetch_latency=0.0, reaction_interval=0.0, page_size=100,
+                 page_latency=0.0, seed=0):
+        self._client = client
+        self._random = random.Random(seed)
+        self._next_id = 1
+        self.latencies = []
+        self.errors = 0
+        self._pending = set()
+        self.users = [FakeUser(1000 + i, f'user{i}') for i in range(users)]
+        self.channels = []
+        for guild_index in range(guilds):
+            guild = FakeGuild(
+                guild_index + 1, self.users, fetch_latency=fetch_latency
+            )
+            channel = FakeChannel(
+                (guild_index + 1) * 100, channel_name, guild,
+                reaction_interval=reaction_interval, page_size=page_size,
+                page_latency=page_latency,
+            )
+            guild.text_channels.append(channel)
+            self.channels.append(channel)
+
+    def make_message(self, content, channel=None, author=None):
+        channel = channel or self._random.choice(self.channels)
+        author = author or self._random.choice(self.users)
+        created_at = datetime.datetime.now(datetime.timezone.utc)
+        # Real snowflakes, so the posting time can be read back from the ID.
+        message = FakeMessage(
+            discord.utils.time_snowflake(created_at) + self._next_id % (1 << 22),
+            channel, author, content, created_at
+        )
+        self._next_id += 1
+        channel.messages.append(message)
+        return message
+
+    def get_channel(self, channel_id):
+        for channel in self.channels:
+            if channel.id == channel_id:
+                return channel
+        return None
+
+    async def edit(self, message, content, cached=True):
+        '''
+        Edit message and tell the client the way discord.py does: the raw
+        event always, on_message_edit only when the message is cached.
+        '''
+        before = copy.copy(message)
+        message.content = content
+        data = {
+            'id': str(message.id),
+            'content': content,
+            'author': {'id': str(message.author.id), 'username': message.author.name},
+        }
+        await self._client.on_raw_message_edit(
+            FakeRawEvent(message, before if cached else None, data)
+        )
+        if cached:
+            await self._client.on_message_edit(before, message)
+
+    async def delete(self, message, cached=True):
+        message.channel.messages.remove(message)
+        await self._client.on_raw_message_delete(
+            FakeRawEvent(message, message if cached else None)
+        )
+        if cached:
+            await self._client.on_message_delete(message)
+
+    def synthetic_message(self, result_share=0.8, command_share=0.01):
+        roll = self._random.random()
+        if roll < result_share:
+            content = result_content(
+                utils.current_day(),
+                self._random.randint(1, utils.FAILURE_SCORE)
+            )
+        elif roll < result_share + command_share:
+            content = '+w leaderboard'
+        else:
+            content = self._random.choice(CHATTER)
+        return self.make_message(content)
+
+    def dispatch(self, message):
+        task = asyncio.get_running_loop().create_task(
+            self._handle(message, time.perf_counter())
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def drain(self):
+        while self._pending:
+            await asyncio.gather(*list(self._pending))
+
+    async def feed(self, count, rate, **mix):
+        start = time.perf_counter()
+        for i in range(count):
+            delay = start + i / rate - time.perf_counter()
+            await asyncio.sleep(delay if delay > 0.001 else 0)
+            self.dispatch(self.synthetic_message(**mix))
+        await self.drain()
+        return time.perf_counter() - start
+
+    async def _handle(self, message, dispatched):
+        try:
+            await self._client.on_message(message)
+        except Exception:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - dispatched)
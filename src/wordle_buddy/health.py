@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LoopWatchdog:
+    '''
+    Measures event loop lag with a heartbeat task. A thread watches the
+    heartbeat and, when the loop has not come back for longer than
+    threshold seconds, logs the stack the loop thread is stuck in. Until
+    start() runs on the loop nothing is measured and the loop counts as
+    keeping up.
+    '''
+
+    def __init__(self, threshold=0.5, interval=0.1):
+        self._threshold = threshold
+        self._interval = interval
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name='wordle-watchdog', daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._thread:
+            self._thread.join()
+
+    @property
+    def started(self):
+        return self._task is not None
+
+    @property
+    def stalled(self):
+        '''Seconds the loop is currently overdue, 0 when it is keeping up.'''
+        if not self.started:
+            return 0.0
+        return max(0.0, time.monotonic() - self._beat - self._interval)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - self._beat - self._interval)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._beat = now
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self._interval / 2):
+            beat = self._beat
+            if beat == reported or self.stalled <= self._threshold:
+                continue
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            logging.warning(
+                f'Event loop blocked for over {self._threshold}s in:\n{stack}'
+            )
+
+
+class _HealthRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        health = self.server.health
+        if self.path == '/health':
+            ok = health.alive()
+        elif self.path == '/ready':
+            ok = health.ready()
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(health.status()).encode()
+        self.send_response(200 if ok else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HealthServer:
+    '''
+    Serves /health and /ready as JSON from its own thread, so it keeps
+    answering while the event loop is wedged. /health fails once the loop
+    has been stuck for stall_limit seconds, /ready also fails while the
+    client is not connected or the loop is lagging. While the client is
+    still logging in, before the watchdog has started, /health passes and
+    reports starting.
+    '''
+
+    def __init__(self, client, watchdog, db, host='127.0.0.1', port=8080,
+                 stall_limit=30.0, ready_lag=1.0):
+        self._client = client
+        self._watchdog = watchdog
+        self._address = (host, port)
+        self._stall_limit = stall_limit
+        self._ready_lag = ready_lag
+        self._server = None
+        self._thread = None
+        self.last_save = None
+        db.add_listener(self)
+
+    def on_save(self, guild, name, result, display_name=''):
+        self.last_save = time.time()
+
+    def on_delete(self, guild, name, result):
+        pass
+
+    @property
+    def address(self):
+        return self._server.server_address if self._server else self._address
+
+    def alive(self):
+        return self._watchdog.stalled < self._stall_limit
+
+    def ready(self):
+        return (
+            self.alive()
+            and self._client.is_ready()
+            and max(self._watchdog.lag, self._watchdog.stalled) < self._ready_lag
+        )
+
+    def status(self):
+        latency = self._client.latency
+        queue = self._client.ingest_queue
+        return {
+            'starting': not self._watchdog.started,
+            'ready': self._client.is_ready(),
+            'lag': self._watchdog.lag,
+            'max_lag': self._watchdog.max_lag,
+            'stalled': self._watchdog.stalled,
+            'stalls': self._watchdog.stalls,
+            'latency': latency if math.isfinite(latency) else None,
+            'ingest': queue.metrics() if queue is not None else None,
+            'last_save': self.last_save,
+            'since_last_save': (
+                time.time() - self.last_save if self.last_save else None
+            ),
+        }
+
+    def start(self):
+        self._server = ThreadingHTTPServer(self._address, _HealthRequestHandler)
+        self._server.daemon_threads = True
+        self._server.health = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='wordle-health', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+
+
+class IngestQueue:
+    '''
+    Bounded queue between on_message and result processing. Items are
+    sharded by guild onto one queue per worker, so results from a guild are
+    processed in the order they arrived. When a shard is full, submit either
+    waits for room ('block') or drops the item ('shed').
+    '''
+
+    POLICIES = ('block', 'shed')
+
+    def __init__(self, process, workers=4, maxsize=1000, policy='block'):
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown ingest policy {policy}')
+        self._process = process
+        self._workers = workers
+        self._shard_size = max(1, maxsize // workers)
+        self._policy = policy
+        self._queues = []
+        self._tasks = []
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        self._queues = [
+            asyncio.Queue(self._shard_size) for _ in range(self._workers)
+        ]
+        self._tasks = [
+            asyncio.create_task(self._consume(queue)) for queue in self._queues
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, guild_id, item):
+        queue = self._queues[hash(guild_id) % self._workers]
+        entry = (time.monotonic(), item)
+        if self._policy == 'block':
+            await queue.put(entry)
+            return True
+        try:
+            queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logging.warning(
+                    f'Ingest queue full, {self.dropped} results dropped so far'
+                )
+            return False
+
+    async def join(self):
+        for queue in self._queues:
+            await queue.join()
+
+    def metrics(self):
+        depths = [queue.qsize() for queue in self._queues]
+        return {
+            'depth': sum(depths),
+            'shard_depths': depths,
+            'capacity': self._shard_size * self._workers,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+        }
+
+    async def _consume(self, queue):
+        while True:
+            enqueued, item = await queue.get()
+            self.last_lag = time.monotonic() - enqueued
+            self.max_lag = max(self.max_lag, self.last_lag)
+            try:
+                await self._process(item)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logging.exception('Failed to process ingested message')
+            finally:
+                queue.task_done()
@@ -1,30 +1,144 @@
+import fcntl
 import json
 import logging
 import os
+import threading
+import zipfile
+from contextlib import contextmanager
+from datetime import date
 
 from wordle_buddy import utils
+from wordle_buddy.result import WORDLE, WordleResult
+
+
+ARCHIVE_DIR = 'archive'
+LOCK_FILE = '.lock'
+CHANGES_FILE = '.changes'
+
+
+def _month(day):
+    return f'{utils.day_date(day):%Y-%m}'
+
+
+def _closed(month):
+    return month < f'{date.today():%Y-%m}'
+
+
+def _round_up(size, block):
+    return -(-size // block) * block
+
+
+def _tmp_path(path):
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+
+def _write_atomic(path, data):
+    '''Replace path with data so readers see the old or new file, never part.'''
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w') as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _create_exclusive(path, data):
+    '''Create path holding data unless it exists. Returns whether it did.'''
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w') as tmp_file:
+        tmp_file.write(data)
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+def _identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
 
 
 class JsonWordleDB:
+    '''
+    Storage engine keeping one JSON file per result under
+    <root>/<guild>/<user>/, with games other than Wordle in a subdirectory
+    named after the game. Wordle results from closed months can be sealed into
+    one zip archive per guild and month under <root>/<guild>/archive/, and
+    reads fall back to the archives when there is no loose file.
+
+    Several processes can share one root. Files are written aside and
+    renamed into place, saves hold a shared lock on <root>/<guild>/.lock
+    and sealing and deletes hold it exclusively, so neither removes a
+    loose file another process is rewriting.
+    '''
 
-    def __init__(self, root_dir):
+    TIER_INTERVAL = 6 * 60 * 60.0
+    MAX_OPEN_ARCHIVES = 64
+
+    def __init__(self, root_dir, background_tiering=False):
         self._root_dir = root_dir
+        self._listeners = []
+        self._archives = {}
+        self._archive_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._tierer = None
+        if background_tiering:
+            self._tierer = threading.Thread(
+                target=self._tier_loop, name='wordle-tierer', daemon=True
+            )
+            self._tierer.start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
 
     def save(self, guild, name, result, display_name=''):
         save_dir = os.path.join(self._root_dir, str(guild), str(name))
-        os.makedirs(save_dir, exist_ok=True)
-        with open(
-            os.path.join(save_dir, f'{result["week_number"]}.json'), 'w'
-        ) as result_file:
-            result_file.write(json.dumps(result))
-        if (
-            (not os.path.exists(os.path.join(save_dir, 'name.txt')))
-            and display_name
-        ):
-            with open(os.path.join(save_dir, 'name.txt'), 'w') as name_file:
-                name_file.write(display_name)
-
-    def load(self, guild, names=None, weeks=None):
+        result_path = self._result_path(
+            guild, name, result.week_number, result.game
+        )
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+        with self._guild_lock(guild, fcntl.LOCK_SH):
+            _write_atomic(result_path, json.dumps(result.to_dict()))
+            if result.game == WORDLE:
+                utils.count_change(self._changes_path(guild))
+        name_path = os.path.join(save_dir, 'name.txt')
+        if display_name and not os.path.exists(name_path):
+            _create_exclusive(name_path, display_name)
+        for listener in self._listeners:
+            listener.on_save(guild, name, result, display_name)
+
+    def delete(self, guild, name, week, game=WORDLE):
+        '''
+        Remove a stored result, loose or archived. Returns the removed
+        result, or None if there was nothing to remove.
+        '''
+        with self._guild_lock(guild, fcntl.LOCK_EX):
+            result = self._load_one(guild, name, week, game)
+            if result is None:
+                return None
+            try:
+                os.remove(self._result_path(guild, name, week, game))
+            except FileNotFoundError:
+                pass
+            if game == WORDLE:
+                # An older copy may also be sealed, and would show through.
+                month = _month(week)
+                entries = {
+                    (entry_name, entry_week): data for entry_name, entry_week, data
+                    in self._read_archive(guild, month)
+                }
+                if entries.pop((name, week), None) is not None:
+                    self._write_archive(guild, month, entries)
+                utils.count_change(self._changes_path(guild))
+        for listener in self._listeners:
+            listener.on_delete(guild, name, result)
+        return result
+
+    def load(self, guild, names=None, weeks=None, game=WORDLE):
         if not names:
             names = self._get_all_names(guild)
         if not weeks:
@@ -33,32 +147,300 @@ class JsonWordleDB:
         for name in names:
             result[name] = []
             for week in weeks:
-                result[name] += [self._load_one(guild, name, week)]
+                result[name] += [self._load_one(guild, name, week, game)]
             if all(item is None for item in result[name]):
                 result.pop(name)
         return result
 
-    def _load_one(self, guild, name, week):
+    def guilds(self):
+        try:
+            return [
+                int(i) for i in os.listdir(self._root_dir) if i.isdigit()
+            ]
+        except FileNotFoundError:
+            return []
+
+    def watermark(self, guild):
+        '''
+        Number of Wordle saves and deletes in guild so far, from any
+        process. Cheap to read, and moves whenever the guild's results do.
+        '''
+        return utils.change_count(self._changes_path(guild))
+
+    def iter_results(self, guild, game=WORDLE):
+        hot = set(self._hot_files(guild, game))
+        if game == WORDLE:
+            for month in self._archived_months(guild):
+                for name, week, data in self._read_archive(guild, month):
+                    if (name, week) not in hot:
+                        yield name, WordleResult.from_dict(json.loads(data))
+        for name, week in hot:
+            result = self._load_one(guild, name, week, game)
+            if result:
+                yield name, result
+
+    def display_name(self, guild, name):
         try:
             with open(
-                os.path.join(
-                    self._root_dir, str(guild), str(name), f'{week}.json'
-                ),
+                os.path.join(self._root_dir, str(guild), str(name), 'name.txt'),
                 'r'
+            ) as name_file:
+                return name_file.read()
+        except FileNotFoundError:
+            return ''
+
+    def tier(self):
+        '''
+        Seal every closed month that still has loose result files into its
+        archive. Returns the number of results moved.
+
+        The guild lock is taken for one month at a time, so saves only wait
+        for that month's archive to be written, even on a tree with years
+        of loose files.
+        '''
+        moved = 0
+        for guild in self.guilds():
+            months = {}
+            for name, week in self._hot_files(guild):
+                month = _month(week)
+                if _closed(month):
+                    months.setdefault(month, []).append((name, week))
+            for month, files in sorted(months.items()):
+                if self._stop.is_set():
+                    return moved
+                with self._guild_lock(guild, fcntl.LOCK_EX):
+                    # Another process may have sealed or deleted some of
+                    # them since they were listed.
+                    files = [
+                        (name, week) for name, week in files
+                        if os.path.exists(self._result_path(guild, name, week))
+                    ]
+                    if files:
+                        moved += self._seal(guild, month, files)
+        return moved
+
+    def storage_report(self):
+        '''
+        Counts and sizes of loose and archived results. Savings compare the
+        archives with what their contents would take as loose files, each
+        rounded up to a whole filesystem block.
+        '''
+        try:
+            block = os.statvfs(self._root_dir).f_frsize
+        except (AttributeError, OSError):
+            block = 4096
+        report = {
+            'hot_files': 0,
+            'hot_bytes': 0,
+            'archives': 0,
+            'archive_bytes': 0,
+            'archived_results': 0,
+            'archived_loose_bytes': 0,
+        }
+        for guild in self.guilds():
+            for name, week in self._hot_files(guild):
+                report['hot_files'] += 1
+                report['hot_bytes'] += os.path.getsize(
+                    self._result_path(guild, name, week)
+                )
+            for month in self._archived_months(guild):
+                report['archives'] += 1
+                report['archive_bytes'] += os.path.getsize(
+                    self._archive_path(guild, month)
+                )
+                with zipfile.ZipFile(self._archive_path(guild, month)) as archive:
+                    for info in archive.infolist():
+                        report['archived_results'] += 1
+                        report['archived_loose_bytes'] += _round_up(
+                            info.file_size, block
+                        )
+        report['inodes_saved'] = report['archived_results'] - report['archives']
+        report['bytes_saved'] = (
+            report['archived_loose_bytes'] - report['archive_bytes']
+        )
+        return report
+
+    def close(self):
+        self._stop.set()
+        if self._tierer:
+            self._tierer.join()
+        with self._archive_lock:
+            for archive, _ in self._archives.values():
+                if archive is not None:
+                    archive.close()
+            self._archives.clear()
+
+    def _seal(self, guild, month, files):
+        '''Caller holds the guild lock exclusively.'''
+        loose = {}
+        for name, week in files:
+            with open(self._result_path(guild, name, week), 'rb') as result_file:
+                loose[(name, week)] = result_file.read()
+        entries = {
+            (name, week): data
+            for name, week, data in self._read_archive(guild, month)
+        }
+        entries.update(loose)
+        self._write_archive(guild, month, entries)
+        for name, week in loose:
+            os.remove(self._result_path(guild, name, week))
+        logging.info(f'Sealed {len(loose)} results for guild {guild} into {month}')
+        return len(loose)
+
+    def _write_archive(self, guild, month, entries):
+        '''
+        Replace the month's archive with entries, {(name, week): data},
+        removing it when there are none. Caller holds the guild lock
+        exclusively.
+        '''
+        path = self._archive_path(guild, month)
+        if entries:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for (name, week), data in sorted(entries.items()):
+                    archive.writestr(f'{name}/{week}.json', data)
+            with open(tmp_path, 'rb') as archive_file:
+                os.fsync(archive_file.fileno())
+            os.replace(tmp_path, path)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._archive_lock:
+            archive, _ = self._archives.pop(path, (None, None))
+            if archive is not None:
+                archive.close()
+
+    def _tier_loop(self):
+        while not self._stop.wait(self.TIER_INTERVAL):
+            try:
+                self.tier()
+            except OSError:
+                logging.exception('Tiering failed')
+
+    def _changes_path(self, guild):
+        return os.path.join(self._root_dir, str(guild), CHANGES_FILE)
+
+    @contextmanager
+    def _guild_lock(self, guild, operation):
+        guild_dir = os.path.join(self._root_dir, str(guild))
+        os.makedirs(guild_dir, exist_ok=True)
+        with open(os.path.join(guild_dir, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _result_path(self, guild, name, week, game=WORDLE):
+        if game != WORDLE:
+            return os.path.join(
+                self._root_dir, str(guild), str(name), game, f'{week}.json'
+            )
+        return os.path.join(
+            self._root_dir, str(guild), str(name), f'{week}.json'
+        )
+
+    def _archive_path(self, guild, month):
+        return os.path.join(
+            self._root_dir, str(guild), ARCHIVE_DIR, f'{month}.zip'
+        )
+
+    def _archived_months(self, guild):
+        try:
+            entries = os.listdir(
+                os.path.join(self._root_dir, str(guild), ARCHIVE_DIR)
+            )
+        except FileNotFoundError:
+            return []
+        return sorted(
+            month for month, ext in map(os.path.splitext, entries)
+            if ext == '.zip'
+        )
+
+    def _read_archive(self, guild, month):
+        try:
+            archive = zipfile.ZipFile(self._archive_path(guild, month))
+        except FileNotFoundError:
+            return
+        with archive:
+            for info in archive.infolist():
+                name, entry = info.filename.split('/')
+                yield int(name), int(os.path.splitext(entry)[0]), archive.read(info)
+
+    def _hot_files(self, guild, game=WORDLE):
+        for name in self._get_all_names(guild):
+            user_dir = os.path.join(self._root_dir, str(guild), str(name))
+            if game != WORDLE:
+                user_dir = os.path.join(user_dir, game)
+            try:
+                entries = os.listdir(user_dir)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                week, ext = os.path.splitext(entry)
+                if ext == '.json' and week.isdigit():
+                    yield name, int(week)
+
+    def _open_archive(self, path):
+        # Another process may have resealed the month since the archive was
+        # opened, so a cached handle is only reused while the file is the same.
+        identity = _identity(path)
+        cached = self._archives.pop(path, None)
+        if cached is not None and cached[1] == identity:
+            archive = cached[0]
+        else:
+            if cached is not None and cached[0] is not None:
+                cached[0].close()
+            try:
+                archive = zipfile.ZipFile(path)
+            except FileNotFoundError:
+                archive = None
+            if len(self._archives) >= self.MAX_OPEN_ARCHIVES:
+                oldest = next(iter(self._archives))
+                if self._archives[oldest][0] is not None:
+                    self._archives[oldest][0].close()
+                del self._archives[oldest]
+        self._archives[path] = archive, identity
+        return archive
+
+    def _load_archived(self, guild, name, week):
+        with self._archive_lock:
+            archive = self._open_archive(self._archive_path(guild, _month(week)))
+            if archive is None:
+                return None
+            try:
+                data = archive.read(f'{name}/{week}.json')
+            except KeyError:
+                return None
+        return WordleResult.from_dict(json.loads(data))
+
+    def _load_one(self, guild, name, week, game=WORDLE):
+        try:
+            with open(
+                self._result_path(guild, name, week, game), 'r'
             ) as result_file:
-                return json.load(result_file)
+                return WordleResult.from_dict(json.load(result_file))
         except FileNotFoundError:
+            pass
+        result = None
+        if game == WORDLE:
+            result = self._load_archived(guild, name, week)
+        if result is None:
             logging.warning(
                 f'Couldn\'t find result for week {week}, name {name} and'
                 f' guild {guild} in database'
             )
-            return None
+        return result
 
     def _get_all_names(self, guild):
         try:
             return [
                 int(i) for i
                 in os.listdir(os.path.join(self._root_dir, str(guild)))
+                if i.isdigit()
             ]
         except FileNotFoundError:
             logging.warning(f'No guild {guild} found in database')
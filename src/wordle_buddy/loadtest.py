@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import statistics
+import tempfile
+import time
+
+from wordle_buddy.commands import WordleCommandHandler
+from wordle_buddy.connect import WordleClient
+from wordle_buddy.fake_gateway import FakeGateway
+from wordle_buddy.message import WordleMessageManager
+from wordle_buddy.routing import ChannelRouter
+from wordle_buddy.run import open_database
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_load(config, count, rate):
+    with tempfile.TemporaryDirectory() as root_dir:
+        db = open_database(
+            config['engine'], root_dir, background=False
+        )
+        client = WordleClient(
+            ChannelRouter(None, 'wordle'),
+            WordleMessageManager(db),
+            WordleCommandHandler(db),
+            ingest_workers=config.get('ingest_workers', 0),
+        )
+        if client.ingest_queue is not None:
+            client.ingest_queue.start()
+        start = time.perf_counter()
+        gateway = FakeGateway(
+            client,
+            guilds=config['guilds'],
+            users=config['users'],
+            fetch_latency=config['fetch_latency'],
+            reaction_interval=config['reaction_interval'],
+        )
+        elapsed = await gateway.feed(count, rate)
+        max_lag = 0.0
+        if client.ingest_queue is not None:
+            await client.ingest_queue.join()
+            elapsed = time.perf_counter() - start
+            max_lag = client.ingest_queue.metrics()['max_lag']
+            await client.ingest_queue.stop()
+        if hasattr(db, 'close'):
+            db.close()
+    latencies = sorted(gateway.latencies)
+    return {
+        'offered': rate,
+        'achieved': count / elapsed,
+        'p50': _percentile(latencies, 0.5),
+        'p95': _percentile(latencies, 0.95),
+        'p99': _percentile(latencies, 0.99),
+        'mean': statistics.fmean(latencies),
+        'errors': gateway.errors,
+        'max_lag': max_lag,
+    }
+
+
+def _sustained(report, slo):
+    return (
+        report['p99'] <= slo
+        and report['achieved'] >= 0.9 * report['offered']
+        and not report['errors']
+    )
+
+
+async def find_ceiling(config, duration, slo, start_rate=250, max_rate=64000):
+    '''
+    Double the offered rate until the p99 latency misses slo or throughput
+    falls behind, then bisect between the last good and first bad rates.
+    '''
+    good, bad = None, None
+    good_report = None
+    rate = start_rate
+    while rate <= max_rate:
+        report = await run_load(config, max(1, int(rate * duration)), rate)
+        if not _sustained(report, slo):
+            bad = rate
+            break
+        good, good_report = rate, report
+        rate *= 2
+    if good is None or bad is None:
+        return good, good_report
+    for _ in range(4):
+        rate = (good + bad) // 2
+        report = await run_load(config, max(1, int(rate * duration)), rate)
+        if _sustained(report, slo):
+            good, good_report = rate, report
+        else:
+            bad = rate
+    return good, good_report
+
+
+def _report_table(results):
+    lines = [
+        'ENGINE  WORKERS  FETCH(ms)  REACT(ms)  CEILING(msg/s)  P50(ms)  P99(ms)  MAX LAG(ms)',
+        '---------------------------------------------------------------------------------',
+    ]
+    for config, ceiling, report in results:
+        line = (
+            f'{config["engine"]:<8}{config["ingest_workers"]:<9}'
+            f'{config["fetch_latency"] * 1000:<11.1f}'
+            f'{config["reaction_interval"] * 1000:<11.1f}'
+        )
+        if report is None:
+            line += '-'
+        else:
+            line += (
+                f'{ceiling:<16}'
+                f'{report["p50"] * 1000:<9.2f}{report["p99"] * 1000:<9.2f}'
+                f'{report["max_lag"] * 1000:.2f}'
+            )
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+async def _main(args):
+    results = []
+    for engine, workers, fetch, react in itertools.product(
+        args.engine, args.ingest_workers, args.fetch_latency,
+        args.reaction_interval
+    ):
+        config = {
+            'engine': engine,
+            'ingest_workers': workers,
+            'guilds': args.guilds,
+            'users': args.users,
+            'fetch_latency': fetch / 1000,
+            'reaction_interval': react / 1000,
+        }
+        ceiling, report = await find_ceiling(
+            config, args.duration, args.slo / 1000
+        )
+        results.append((config, ceiling, report))
+    print(_report_table(results))
+
+
+def run_loadtest(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='wordle-buddy-loadtest',
+        description='Find the message ingestion ceiling of WordleClient '
+                    'against a fake Discord gateway.'
+    )
+    parser.add_argument('--engine', nargs='+', default=['json'],
+                        choices=['json', 'log'])
+    parser.add_argument('--ingest-workers', nargs='+', type=int, default=[0],
+                        help='ingest queue consumers, 0 to process inline')
+    parser.add_argument('--fetch-latency', nargs='+', type=float, default=[0.0],
+                        help='simulated fetch_member latency in ms')
+    parser.add_argument('--reaction-interval', nargs='+', type=float,
+                        default=[0.0],
+                        help='minimum ms between reactions per channel')
+    parser.add_argument('--guilds', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=2.0,
+                        help='seconds of traffic per step')
+    parser.add_argument('--slo', type=float, default=100.0,
+                        help='p99 handling latency target in ms')
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    run_loadtest()
@@ -0,0 +1,412 @@
+import json
+import logging
+import os
+import threading
+
+from wordle_buddy import utils
+from wordle_buddy.result import WORDLE, WordleResult
+
+
+LOG_SUFFIX = '.wal'
+COMPACTING_SUFFIX = '.wal.compacting'
+SEGMENT_SUFFIX = '.seg'
+CHANGES_SUFFIX = '.changes'
+TRAILER_LENGTH = 20
+
+
+def _read_segment(path):
+    '''
+    Return ({name: {day: (offset, length)}}, {name: display_name}) for the
+    segment at path. A segment is a run of JSON lines, one per result and
+    sorted by (name, day), followed by a JSON index line and a fixed width
+    trailer holding the index offset.
+    '''
+    try:
+        with open(path, 'rb') as segment:
+            segment.seek(0, os.SEEK_END)
+            size = segment.tell()
+            if size < TRAILER_LENGTH:
+                raise ValueError(f'Segment {path} is too short')
+            segment.seek(size - TRAILER_LENGTH)
+            index_offset = int(segment.read(TRAILER_LENGTH))
+            segment.seek(index_offset)
+            raw = json.loads(segment.read(size - TRAILER_LENGTH - index_offset))
+    except FileNotFoundError:
+        return {}, {}
+    index = {
+        int(name): {int(day): tuple(entry) for day, entry in days.items()}
+        for name, days in raw['index'].items()
+    }
+    display_names = {int(name): n for name, n in raw['names'].items()}
+    return index, display_names
+
+
+def _write_segment(path, records, display_names):
+    tmp_path = f'{path}.tmp'
+    index = {}
+    with open(tmp_path, 'wb') as segment:
+        for name in sorted(records):
+            days = index.setdefault(str(name), {})
+            for day in sorted(records[name]):
+                line = json.dumps(records[name][day].to_dict()).encode() + b'\n'
+                days[str(day)] = (segment.tell(), len(line))
+                segment.write(line)
+        index_offset = segment.tell()
+        segment.write(json.dumps({
+            'index': index,
+            'names': {str(k): v for k, v in display_names.items()},
+        }).encode())
+        segment.write(f'{index_offset:0{TRAILER_LENGTH}d}'.encode())
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(tmp_path, path)
+
+
+def _replay(path):
+    '''
+    Yield the records in the log at path, truncating a torn final record
+    left behind by a crash mid-append.
+    '''
+    try:
+        log = open(path, 'rb+')
+    except FileNotFoundError:
+        return
+    with log:
+        good_end = 0
+        for line in log:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            yield record
+        if good_end != log.seek(0, os.SEEK_END):
+            logging.warning(
+                f'Truncating torn record at offset {good_end} of {path}'
+            )
+            log.truncate(good_end)
+
+
+class _GuildLog:
+
+    def __init__(self, root_dir, stem):
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        self.sync_cond = threading.Condition()
+        self.log_path = os.path.join(root_dir, f'{stem}{LOG_SUFFIX}')
+        self.compacting_path = os.path.join(
+            root_dir, f'{stem}{COMPACTING_SUFFIX}'
+        )
+        self.segment_path = os.path.join(root_dir, f'{stem}{SEGMENT_SUFFIX}')
+        self.memtable = {}
+        self.frozen = {}
+        self.written = 0
+        self.synced = 0
+        self.syncing = False
+        self.segment_index, self.display_names = _read_segment(
+            self.segment_path
+        )
+        if os.path.exists(self.compacting_path):
+            self._recover_compacting()
+        for record in _replay(self.log_path):
+            if record.get('deleted'):
+                self.remove(record['name'], record['day'])
+                continue
+            self.apply(
+                record['name'],
+                WordleResult.from_dict(record['result']),
+                record.get('display_name'),
+            )
+        self.fd = os.open(
+            self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        self.log_size = os.fstat(self.fd).st_size
+        self.segment_fd = self._open_segment()
+
+    def _recover_compacting(self):
+        '''
+        Put the records of a compaction that never finished back in front
+        of the live log, so the next rotation can't overwrite them.
+        '''
+        logging.warning(f'Recovering unfinished compaction {self.compacting_path}')
+        tmp_path = f'{self.log_path}.tmp'
+        with open(tmp_path, 'wb') as log:
+            for path in (self.compacting_path, self.log_path):
+                for record in _replay(path):
+                    log.write(json.dumps(record).encode() + b'\n')
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(tmp_path, self.log_path)
+        os.remove(self.compacting_path)
+
+    def _open_segment(self):
+        try:
+            return os.open(self.segment_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+
+    def apply(self, name, result, display_name=''):
+        self.memtable.setdefault(name, {})[result.week_number] = result
+        if display_name and name not in self.display_names:
+            self.display_names[name] = display_name
+
+    def remove(self, name, day):
+        # None masks the day in older tables until compaction drops it.
+        self.memtable.setdefault(name, {})[day] = None
+
+    def get(self, name, day):
+        for table in (self.memtable, self.frozen):
+            try:
+                return table[name][day]
+            except KeyError:
+                pass
+        try:
+            offset, length = self.segment_index[name][day]
+        except KeyError:
+            return None
+        return WordleResult.from_dict(
+            json.loads(os.pread(self.segment_fd, length, offset))
+        )
+
+    def names(self):
+        return set(self.memtable) | set(self.frozen) | set(self.segment_index)
+
+    def close(self):
+        os.close(self.fd)
+        if self.segment_fd is not None:
+            os.close(self.segment_fd)
+
+
+class LogWordleDB:
+    '''
+    Storage engine that appends every save to a per-guild write-ahead log,
+    with a separate log for each game other than Wordle. Deletes append a
+    tombstone record.
+
+    Concurrent saves share fsync calls: the first writer to need a sync
+    flushes everything appended so far and the others wait on it. A
+    background thread folds logs larger than COMPACT_THRESHOLD bytes into
+    an indexed segment file, and opening the database replays whatever is
+    left in the logs on top of the segments.
+    '''
+
+    COMPACT_THRESHOLD = 64 * 1024
+    COMPACT_INTERVAL = 60.0
+
+    def __init__(self, root_dir, background_compaction=True):
+        self._root_dir = root_dir
+        self._guilds = {}
+        self._guilds_lock = threading.Lock()
+        self._listeners = []
+        self._stop = threading.Event()
+        os.makedirs(root_dir, exist_ok=True)
+        for guild in self._get_all_guilds():
+            self._guild(guild)
+        self._compactor = None
+        if background_compaction:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, name='wordle-compactor', daemon=True
+            )
+            self._compactor.start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def save(self, guild, name, result, display_name=''):
+        log = self._guild(guild, result.game)
+        record = {'name': name, 'result': result.to_dict()}
+        if display_name:
+            record['display_name'] = display_name
+        with log.lock:
+            seq = self._append(log, record)
+            log.apply(name, result, display_name)
+        self._sync(log, seq)
+        if result.game == WORDLE:
+            utils.count_change(self._changes_path(guild))
+        for listener in self._listeners:
+            listener.on_save(guild, name, result, display_name)
+
+    def delete(self, guild, name, week, game=WORDLE):
+        '''
+        Remove a stored result. Returns the removed result, or None if there
+        was nothing to remove.
+        '''
+        log = self._guild(guild, game)
+        with log.lock:
+            result = log.get(name, week)
+            if result is None:
+                return None
+            seq = self._append(log, {'name': name, 'day': week, 'deleted': True})
+            log.remove(name, week)
+        self._sync(log, seq)
+        if game == WORDLE:
+            utils.count_change(self._changes_path(guild))
+        for listener in self._listeners:
+            listener.on_delete(guild, name, result)
+        return result
+
+    def load(self, guild, names=None, weeks=None, game=WORDLE):
+        log = self._guild(guild, game)
+        if not names:
+            names = sorted(log.names())
+        if not weeks:
+            weeks = [utils.current_day()]
+        result = {}
+        with log.lock:
+            for name in names:
+                result[name] = [log.get(name, week) for week in weeks]
+                if all(item is None for item in result[name]):
+                    result.pop(name)
+        return result
+
+    def guilds(self):
+        with self._guilds_lock:
+            return sorted({guild for guild, _ in self._guilds})
+
+    def watermark(self, guild):
+        '''
+        Number of Wordle saves and deletes in guild so far. Cheap to read,
+        and moves whenever the guild's results do.
+        '''
+        return utils.change_count(self._changes_path(guild))
+
+    def iter_results(self, guild, game=WORDLE):
+        log = self._guild(guild, game)
+        with log.lock:
+            keys = [
+                (name, day)
+                for table in (log.segment_index, log.frozen, log.memtable)
+                for name, days in table.items()
+                for day in days
+            ]
+            results = {key: log.get(*key) for key in keys}
+        for (name, _), result in results.items():
+            if result is not None:
+                yield name, result
+
+    def display_name(self, guild, name):
+        return self._guild(guild).display_names.get(name, '')
+
+    def compact(self, guild, game=WORDLE):
+        log = self._guild(guild, game)
+        with log.compact_lock:
+            self._compact(guild, log)
+
+    def _compact(self, guild, log):
+        with log.sync_cond:
+            while log.syncing:
+                log.sync_cond.wait()
+            with log.lock:
+                # After a failed attempt the frozen records are still only in
+                # the compacting file, so retry them rather than rotate over it.
+                if not log.frozen:
+                    if not log.memtable:
+                        return
+                    os.fsync(log.fd)
+                    log.synced = log.written
+                    os.close(log.fd)
+                    os.replace(log.log_path, log.compacting_path)
+                    log.fd = os.open(
+                        log.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                        0o644
+                    )
+                    log.log_size = 0
+                    log.frozen = log.memtable
+                    log.memtable = {}
+                segment_index = log.segment_index
+                segment_fd = log.segment_fd
+                display_names = dict(log.display_names)
+        records = {}
+        for name, days in segment_index.items():
+            for day, (offset, length) in days.items():
+                records.setdefault(name, {})[day] = WordleResult.from_dict(
+                    json.loads(os.pread(segment_fd, length, offset))
+                )
+        for name, days in log.frozen.items():
+            records.setdefault(name, {}).update(days)
+        records = {
+            name: {day: result for day, result in days.items() if result is not None}
+            for name, days in records.items()
+        }
+        _write_segment(log.segment_path, records, display_names)
+        new_index, _ = _read_segment(log.segment_path)
+        with log.lock:
+            log.segment_index = new_index
+            log.segment_fd = log._open_segment()
+            log.frozen = {}
+            os.remove(log.compacting_path)
+        if segment_fd is not None:
+            os.close(segment_fd)
+        logging.info(f'Compacted log for guild {guild}')
+
+    def close(self):
+        self._stop.set()
+        if self._compactor:
+            self._compactor.join()
+        with self._guilds_lock:
+            for log in self._guilds.values():
+                log.close()
+            self._guilds.clear()
+
+    def _append(self, log, record):
+        '''Write record to the log and return its sequence number. Caller holds log.lock.'''
+        line = json.dumps(record).encode() + b'\n'
+        os.write(log.fd, line)
+        log.log_size += len(line)
+        log.written += 1
+        return log.written
+
+    def _sync(self, log, seq):
+        with log.sync_cond:
+            while log.synced < seq:
+                if log.syncing:
+                    log.sync_cond.wait()
+                    continue
+                log.syncing = True
+                with log.lock:
+                    target = log.written
+                    fd = log.fd
+                log.sync_cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    log.sync_cond.acquire()
+                    log.syncing = False
+                log.synced = max(log.synced, target)
+                log.sync_cond.notify_all()
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.COMPACT_INTERVAL):
+            with self._guilds_lock:
+                guilds = list(self._guilds.items())
+            for (guild, game), log in guilds:
+                if log.log_size >= self.COMPACT_THRESHOLD:
+                    try:
+                        self.compact(guild, game)
+                    except OSError:
+                        logging.exception(f'Compaction failed for guild {guild}')
+
+    def _guild(self, guild, game=WORDLE):
+        key = int(guild), game
+        try:
+            return self._guilds[key]
+        except KeyError:
+            pass
+        with self._guilds_lock:
+            if key not in self._guilds:
+                stem = guild if game == WORDLE else f'{guild}-{game}'
+                self._guilds[key] = _GuildLog(self._root_dir, stem)
+            return self._guilds[key]
+
+    def _changes_path(self, guild):
+        return os.path.join(self._root_dir, f'{guild}{CHANGES_SUFFIX}')
+
+    def _get_all_guilds(self):
+        guilds = set()
+        for entry in os.listdir(self._root_dir):
+            stem = entry.split('.', 1)[0]
+            if stem.isdigit():
+                guilds.add(int(stem))
+        return sorted(guilds)
@@ -1,10 +1,25 @@
 import re
 from wordle_buddy import utils
+from wordle_buddy.result import (
+    NERDLE, QUORDLE, ROW_WIDTHS, WORDLE, WORLDLE, WordleResult
+)
 from datetime import datetime
 from time import time
 
 
 WORDLE_HEADER_RE = re.compile(r'Wordle (\d+) ([123456X])/6[*]?')
+NERDLE_HEADER_RE = re.compile(r'nerdlegame (\d+) ([123456X])/6')
+WORLDLE_HEADER_RE = re.compile(r'#Worldle #(\d+) ([123456X])/6')
+QUORDLE_HEADER_RE = re.compile(r'Daily Quordle #?(\d+)')
+QUORDLE_SCORE_RE = re.compile('([1-9])\ufe0f?\u20e3|\U0001f7e5')
+
+PURPLE_SQUARE_CHAR = '\U0001f7ea'
+QUORDLE_FAILURE = 10
+
+# Leading token of a shared result -> the one parser that handles it.
+PARSERS = {}
+# Game name -> parser.
+GAMES = {}
 
 
 class MessageException(Exception):
@@ -13,6 +28,24 @@ class MessageException(Exception):
         self.reason = reason
 
 
+def register(parser_class):
+    parser = parser_class()
+    PARSERS[parser.token] = parser
+    GAMES[parser.game] = parser
+    return parser_class
+
+
+def parser_for(content):
+    token = content.lstrip().split(None, 1)
+    return PARSERS.get(token[0]) if token else None
+
+
+def is_candidate(content):
+    parser = parser_for(content)
+    return parser is not None and \
+        parser.header_re.match(content.lstrip()) is not None
+
+
 def get_matrix(result_lines):
     matrix = []
     for line in result_lines:
@@ -39,6 +72,39 @@ def process_header(header):
     raise MessageException('No header for message')
 
 
+def decode_grid(lines, width, squares, exact=True):
+    '''
+    Matrix from the first run of grid lines, skipping blank lines before it
+    and stopping at the first line after it that isn't part of the grid.
+    '''
+    matrix = []
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] not in squares:
+            if matrix:
+                break
+            if line:
+                raise MessageException('No result grid')
+            continue
+        if len(line) < width or (exact and len(line) != width):
+            raise MessageException('Wrong number of characters in results line')
+        matrix.append([squares[square] for square in line[:width]])
+    return matrix
+
+
+def validate_grid(result, failure_score=utils.FAILURE_SCORE):
+    solved = all(square == utils.ResultSquare.GREEN.value for square in result.last_row())
+    if result.score != failure_score:
+        if result.guesses != result.score:
+            raise MessageException('Score and matrix length were different')
+        if not solved:
+            raise MessageException('Result didn\'t end in a success')
+    elif solved:
+        raise MessageException(
+            'Result did end in a success, but was reported as a failure'
+        )
+
+
 def datetime_from_utc(utc_time):
     stamp = time()
     offset = datetime.fromtimestamp(stamp) - datetime.utcfromtimestamp(stamp)
@@ -46,46 +112,186 @@ def datetime_from_utc(utc_time):
 
 
 def validate(result, date):
-    if utils.that_day(datetime_from_utc(date)) != result['week_number']:
+    if utils.that_day(datetime_from_utc(date)) != result.week_number:
         raise MessageException('Bad week number (don\'t be late)!')
-    if result['score'] != utils.FAILURE_SCORE:
-        if len(result['matrix']) != result['score']:
-            raise MessageException('Score and matrix length were different')
-        if sum(result['matrix'][-1]) != 10:
-            raise MessageException('Result didn\'t end in a success')
-    elif sum(result['matrix'][-1]) == 10:
-        raise MessageException(
-            'Result did end in a success, but was reported as a failure'
+    validate_grid(result)
+
+
+class ResultParser:
+    '''
+    Parser for one game's shared results. token is the first word of the
+    shared text and picks the parser, header_re matches the header line and
+    the grid row width comes from ROW_WIDTHS. Games other than Wordle
+    number their puzzles from their own start dates, so their results are
+    stored against the day they were posted.
+    '''
+
+    game = None
+    token = None
+    header_re = None
+    squares = utils.EMOJI_TO_RESULT
+    exact_width = True
+    failure_score = utils.FAILURE_SCORE
+
+    @property
+    def width(self):
+        return ROW_WIDTHS[self.game]
+
+    def parse(self, lines, date):
+        header_match = self.header_re.match(lines[0].strip())
+        if not header_match:
+            raise MessageException('No header for message')
+        score = header_match.group(2)
+        result = WordleResult.from_matrix(
+            utils.that_day(datetime_from_utc(date)),
+            self.failure_score if score == 'X' else int(score),
+            decode_grid(lines[1:], self.width, self.squares, self.exact_width),
+            self.game
         )
+        validate_grid(result, self.failure_score)
+        return result
 
 
-class WordleMessageManager:
+@register
+class WordleParser(ResultParser):
 
+    game = WORDLE
+    token = 'Wordle'
+    header_re = WORDLE_HEADER_RE
     HEADER_LINES = 2
 
-    def __init__(self, db):
+    def parse(self, lines, date):
+        if len(lines) <= self.HEADER_LINES:
+            raise MessageException('No result grid')
+        week_number, score = process_header(lines[0])
+        result = WordleResult.from_matrix(
+            week_number,
+            score,
+            get_matrix(
+                [line for line in lines[self.HEADER_LINES:] if line.strip()]
+            )
+        )
+        validate(result, date)
+        return result
+
+
+@register
+class NerdleParser(ResultParser):
+
+    game = NERDLE
+    token = 'nerdlegame'
+    header_re = NERDLE_HEADER_RE
+    squares = {
+        utils.GREEN_SQUARE_CHAR: utils.ResultSquare.GREEN.value,
+        PURPLE_SQUARE_CHAR: utils.ResultSquare.YELLOW.value,
+        utils.BLACK_SQUARE_CHAR: utils.ResultSquare.GREY.value,
+        utils.WHITE_SQUARE_CHAR: utils.ResultSquare.GREY.value,
+    }
+
+
+@register
+class WorldleParser(ResultParser):
+    '''
+    Worldle rows are five proximity squares followed by a direction arrow,
+    or a party popper on the winning row.
+    '''
+
+    game = WORLDLE
+    token = '#Worldle'
+    header_re = WORLDLE_HEADER_RE
+    exact_width = False
+
+
+@register
+class QuordleParser(ResultParser):
+    '''
+    Quordle shares the guesses taken on each of its four words as keycap
+    digits, or a red square for a word that wasn't found. The score is the
+    total over the four words with a missed word counting as
+    QUORDLE_FAILURE, and the matrix holds the four word scores.
+    '''
+
+    game = QUORDLE
+    token = 'Daily'
+    header_re = QUORDLE_HEADER_RE
+    failure_score = 4 * QUORDLE_FAILURE
+
+    def parse(self, lines, date):
+        if not self.header_re.match(lines[0].strip()):
+            raise MessageException('No header for message')
+        score_lines = [line for line in lines[1:] if line.strip()][:2]
+        words = [
+            QUORDLE_FAILURE if match.group(1) is None else int(match.group(1))
+            for line in score_lines
+            for match in QUORDLE_SCORE_RE.finditer(line)
+        ]
+        if len(words) != 4:
+            raise MessageException('Quordle result didn\'t have four scores')
+        return WordleResult.from_matrix(
+            utils.that_day(datetime_from_utc(date)), sum(words), [words],
+            self.game
+        )
+
+
+class WordleMessageManager:
+
+    def __init__(self, db, message_index=None):
         self._database = db
+        self._message_index = message_index
+
+    def handle(self, guild, name, message, date, display_name='',
+               message_id=None):
+        result = self._parse(message, date)
+        if result is None:
+            return False
+        self._database.save(guild, name, result, display_name)
+        if message_id is not None and self._message_index is not None:
+            self._message_index.record(guild, message_id, name, result)
+        return True
+
+    def edit(self, guild, name, message_id, message, date, display_name=''):
+        '''
+        Re-parse an edited message, retracting the result it saved before if
+        it no longer holds that result. Returns (retracted, saved).
+        '''
+        result = self._parse(message, date)
+        retracted = False
+        entry = None
+        if self._message_index is not None:
+            entry = self._message_index.get(guild, message_id)
+        if entry is not None and (
+            result is None
+            or entry != (name, result.week_number, result.game)
+        ):
+            retracted = self.retract(guild, message_id)
+        if result is None:
+            return retracted, False
+        self._database.save(guild, name, result, display_name)
+        if self._message_index is not None:
+            self._message_index.record(guild, message_id, name, result)
+        return retracted, True
+
+    def retract(self, guild, message_id):
+        '''
+        Delete the result saved from a message, if the message is still the
+        last one to have saved it. Returns whether a result was deleted.
+        '''
+        if self._message_index is None:
+            return False
+        entry, owned = self._message_index.forget(guild, message_id)
+        if not owned:
+            return False
+        name, day, game = entry
+        return self._database.delete(guild, name, day, game) is not None
 
-    def handle(self, guild, name, message, date, display_name=''):
-        lines = message.split('\n')
-        if len(lines) > self.HEADER_LINES:
-            try:
-                week_number, score = process_header(lines[0])
-                result = {
-                    'week_number': week_number,
-                    'score': score,
-                    'matrix': get_matrix(
-                        [
-                            line for line in lines[self.HEADER_LINES:]
-                            if line.strip()
-                        ]
-                    )
-                }
-                validate(result, date)
-                self._database.save(guild, name, result, display_name)
-                return True
-            except MessageException as me:
-                print(f'Message exception: {me.reason}')
-            except KeyError:
-                print('Key error: bad character in result matrix')
-        return False
+    def _parse(self, message, date):
+        parser = parser_for(message)
+        if parser is None:
+            return None
+        try:
+            return parser.parse(message.split('\n'), date)
+        except MessageException as me:
+            print(f'Message exception: {me.reason}')
+        except KeyError:
+            print('Key error: bad character in result matrix')
+        return None
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+
+
+INDEX_SUFFIX = '.messages'
+
+
+class MessageIndex:
+    '''
+    Maps result messages to the (name, day, game) result they saved, so an
+    edited or deleted message can be traced back to its result. Each
+    guild's index is an append-only journal under index_dir of
+    [message, name, day, game] lines, and [message] lines for messages
+    that no longer hold a result, replayed on first use.
+
+    Several messages can save over the same result; only the last of them
+    owns it.
+    '''
+
+    def __init__(self, index_dir):
+        self._index_dir = index_dir
+        self._guilds = {}
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def record(self, guild, message_id, name, result):
+        with self._lock:
+            entry = (name, result.week_number, result.game)
+            self._append(guild, [message_id, *entry])
+            messages, owners = self._entries(guild)
+            messages[message_id] = entry
+            owners[entry] = message_id
+
+    def get(self, guild, message_id):
+        with self._lock:
+            return self._entries(guild)[0].get(message_id)
+
+    def forget(self, guild, message_id):
+        '''
+        Drop message_id. Returns its (name, day, game) entry, or None if it
+        had none, and whether it owned that result.
+        '''
+        with self._lock:
+            messages, owners = self._entries(guild)
+            entry = messages.pop(message_id, None)
+            if entry is None:
+                return None, False
+            self._append(guild, [message_id])
+            owned = owners.get(entry) == message_id
+            if owned:
+                del owners[entry]
+            return entry, owned
+
+    def _entries(self, guild):
+        try:
+            return self._guilds[guild]
+        except KeyError:
+            pass
+        messages = {}
+        owners = {}
+        try:
+            with open(self._path(guild), 'r') as journal:
+                for line in journal:
+                    try:
+                        message_id, *entry = json.loads(line)
+                    except (ValueError, TypeError):
+                        logging.warning(
+                            f'Skipping bad message index line for guild {guild}'
+                        )
+                        continue
+                    if entry:
+                        entry = tuple(entry)
+                        messages[message_id] = entry
+                        owners[entry] = message_id
+                        continue
+                    entry = messages.pop(message_id, None)
+                    if entry is not None and owners.get(entry) == message_id:
+                        del owners[entry]
+        except FileNotFoundError:
+            pass
+        self._guilds[guild] = messages, owners
+        return messages, owners
+
+    def _append(self, guild, line):
+        with open(self._path(guild), 'a') as journal:
+            journal.write(json.dumps(line) + '\n')
+
+    def _path(self, guild):
+        return os.path.join(self._index_dir, f'{guild}{INDEX_SUFFIX}')
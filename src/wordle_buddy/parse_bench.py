@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+
+import argparse
+import datetime
+import random
+import time
+
+from wordle_buddy import message as wm, utils
+from wordle_buddy.fake_gateway import CHATTER, game_content
+
+
+def corpus(count, chatter=0.5, seed=0):
+    '''
+    count (content, date) pairs, a chatter fraction of them ordinary
+    messages and the rest results spread evenly over the registered games.
+    '''
+    rng = random.Random(seed)
+    date = datetime.datetime.utcnow()
+    day = utils.that_day(wm.datetime_from_utc(date))
+    games = list(wm.GAMES)
+    messages = []
+    for _ in range(count):
+        if rng.random() < chatter:
+            messages.append((rng.choice(CHATTER), date))
+            continue
+        game = rng.choice(games)
+        if game == 'quordle':
+            score = [rng.choice([3, 5, 7, 9, 10]) for _ in range(4)]
+        else:
+            score = rng.randint(1, utils.FAILURE_SCORE)
+        messages.append((game_content(game, day, score), date))
+    return messages
+
+
+def _dispatch(parsers):
+    by_token = {parser.token: parser for parser in parsers}
+
+    def parse(content, date):
+        token = content.lstrip().split(None, 1)
+        parser = by_token.get(token[0]) if token else None
+        if parser is None or not parser.header_re.match(content.lstrip()):
+            return None
+        return parser.parse(content.split('\n'), date)
+    return parse
+
+
+def _naive(parsers):
+    def parse(content, date):
+        stripped = content.lstrip()
+        for parser in parsers:
+            if parser.header_re.match(stripped):
+                return parser.parse(content.split('\n'), date)
+        return None
+    return parse
+
+
+def _rate(parse, messages):
+    parsed = 0
+    start = time.perf_counter()
+    for content, date in messages:
+        try:
+            if parse(content, date) is not None:
+                parsed += 1
+        except (wm.MessageException, KeyError):
+            pass
+    return len(messages) / (time.perf_counter() - start), parsed
+
+
+def run_parse_bench(count=20000, chatter=0.5, seed=0):
+    '''
+    Messages per second through the token registry and through trying
+    every game's header in turn, with 1, 2, ... of the registered games
+    enabled. Returns rows of (games, registry rate, naive rate, parsed).
+    '''
+    messages = corpus(count, chatter, seed)
+    parsers = list(wm.GAMES.values())
+    rows = []
+    for enabled in range(1, len(parsers) + 1):
+        registry, parsed = _rate(_dispatch(parsers[:enabled]), messages)
+        naive, naive_parsed = _rate(_naive(parsers[:enabled]), messages)
+        if parsed != naive_parsed:
+            raise AssertionError('Registry and naive parsing disagree')
+        rows.append((enabled, registry, naive, parsed))
+    return rows
+
+
+def run_parse_benchmark(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='wordle-buddy-parse-bench',
+        description='Measure result parsing throughput as games are added.'
+    )
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--chatter', type=float, default=0.5,
+                        help='fraction of messages that are not results')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rows = run_parse_bench(args.count, args.chatter, args.seed)
+    names = list(wm.GAMES)
+    print('GAMES  REGISTRY(msg/s)  NAIVE(msg/s)  PARSED  ENABLED')
+    print('----------------------------------------------------------')
+    for enabled, registry, naive, parsed in rows:
+        print(
+            f'{enabled:<7}{registry:<17.0f}{naive:<14.0f}{parsed:<8}'
+            f'{", ".join(names[:enabled])}'
+        )
+
+
+if __name__ == '__main__':
+    run_parse_benchmark()
@@ -0,0 +1,115 @@
+import cProfile
+import datetime
+import logging
+import os
+import pstats
+import random
+import tracemalloc
+
+
+class SamplingProfiler:
+    '''
+    Profiles a random sample of handler invocations with cProfile while
+    tracemalloc tracks allocations. The profiler stays enabled across the
+    awaits inside a sampled handler, so other tasks that run in the meantime
+    show up in its profile as well.
+    '''
+
+    TRACE_FRAMES = 10
+    TOP_ALLOCATIONS = 25
+
+    def __init__(self, directory, sample_rate=0.01, keep=20, dump_every=100):
+        self._directory = directory
+        self._sample_rate = sample_rate
+        self._keep = keep
+        self._dump_every = dump_every
+        self._random = random.Random()
+        self._stats = {}
+        self._samples = 0
+        self._active = False
+        self.enabled = False
+
+    @property
+    def configured(self):
+        return bool(self._directory)
+
+    def enable(self):
+        if not self.configured or self.enabled:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACE_FRAMES)
+        self.enabled = True
+        logging.info(f'Profiling {self._sample_rate:.1%} of handler calls')
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.dump()
+        self.enabled = False
+        tracemalloc.stop()
+        logging.info('Profiling disabled')
+
+    async def profile(self, name, coro):
+        if (
+            not self.enabled
+            or self._active
+            or self._random.random() >= self._sample_rate
+        ):
+            return await coro
+        self._active = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return await coro
+        finally:
+            profiler.disable()
+            self._active = False
+            self._record(name, profiler)
+
+    def dump(self):
+        if not self.enabled:
+            return []
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        written = []
+        for name, stats in self._stats.items():
+            path = os.path.join(self._directory, f'{name}-{stamp}.pstats')
+            stats.dump_stats(path)
+            written.append(path)
+            self._rotate(f'{name}-', '.pstats')
+        self._stats = {}
+        self._samples = 0
+        path = os.path.join(self._directory, f'alloc-{stamp}.txt')
+        with open(path, 'w') as report:
+            report.write(self.allocation_report())
+        written.append(path)
+        self._rotate('alloc-', '.txt')
+        return written
+
+    def allocation_report(self):
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f'Traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)']
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        for stat in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        return '\n'.join(lines) + '\n'
+
+    def _record(self, name, profiler):
+        try:
+            self._stats[name].add(profiler)
+        except KeyError:
+            self._stats[name] = pstats.Stats(profiler)
+        self._samples += 1
+        if self._samples >= self._dump_every:
+            self.dump()
+
+    def _rotate(self, prefix, suffix):
+        dumps = sorted(
+            entry for entry in os.listdir(self._directory)
+            if entry.startswith(prefix) and entry.endswith(suffix)
+        )
+        for entry in dumps[:-self._keep]:
+            os.remove(os.path.join(self._directory, entry))
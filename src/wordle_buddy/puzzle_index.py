@@ -0,0 +1,230 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from wordle_buddy import utils
+from wordle_buddy.result import WORDLE
+
+
+INDEX_SUFFIX = '.puzzles'
+# First line of a journal built from the stored results. A journal without
+# it was started by saves alone and doesn't cover the guild's history.
+HEADER = ['wordle-buddy puzzle index', 1]
+
+
+class PuzzleEntry:
+
+    __slots__ = ('histogram', 'solvers')
+
+    def __init__(self):
+        self.histogram = [0] * utils.FAILURE_SCORE
+        self.solvers = {}
+
+    def add(self, name, score):
+        old_score = self.solvers.get(name)
+        if old_score is not None:
+            self.histogram[old_score - 1] -= 1
+        self.solvers[name] = score
+        self.histogram[score - 1] += 1
+
+    def copy(self):
+        entry = PuzzleEntry()
+        entry.histogram = list(self.histogram)
+        entry.solvers = dict(self.solvers)
+        return entry
+
+    def remove(self, name):
+        score = self.solvers.pop(name, None)
+        if score is not None:
+            self.histogram[score - 1] -= 1
+
+    @property
+    def players(self):
+        return len(self.solvers)
+
+    @property
+    def average(self):
+        if not self.solvers:
+            return 0
+        return sum(
+            score * count for score, count in enumerate(self.histogram, start=1)
+        ) / self.players
+
+    @property
+    def failures(self):
+        return self.histogram[utils.FAILURE_SCORE - 1]
+
+
+class PuzzleIndex:
+    '''
+    Secondary index of results keyed by (guild, puzzle number), kept up to
+    date from database saves and deletes. Each guild's index is an
+    append-only journal of (puzzle, name, score) lines under index_dir,
+    with a null score for a deleted result, replayed on first use. A guild
+    without a built journal is rebuilt from the database on first use.
+
+    Several processes can share index_dir: appends take a shared flock and
+    rebuilds an exclusive one, and every lookup first reads whatever other
+    processes appended since, or the whole journal again if one of them
+    rebuilt it.
+    '''
+
+    def __init__(self, db, index_dir):
+        self._db = db
+        self._index_dir = index_dir
+        self._guilds = {}
+        self._positions = {}
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+        db.add_listener(self)
+
+    def on_save(self, guild, name, result, display_name=''):
+        with self._lock:
+            if result.game != WORDLE:
+                return
+            entries = self._entries(guild)
+            self._append(guild, [(result.week_number, name, result.score)])
+            entries.setdefault(result.week_number, PuzzleEntry()).add(
+                name, result.score
+            )
+
+    def on_delete(self, guild, name, result):
+        with self._lock:
+            if result.game != WORDLE:
+                return
+            entries = self._entries(guild)
+            self._append(guild, [(result.week_number, name, None)])
+            if result.week_number in entries:
+                entries[result.week_number].remove(name)
+
+    def get(self, guild, puzzle):
+        '''
+        Copy of the puzzle's entry, or None. Saves on ingest threads keep
+        patching the indexed one. Reads the journal, and on first use may
+        rebuild it, so call it off the event loop.
+        '''
+        with self._lock:
+            entry = self._entries(guild).get(puzzle)
+            return entry.copy() if entry is not None else None
+
+    def rebuild(self, guild):
+        with self._lock, self._journal_lock(guild, fcntl.LOCK_EX):
+            entries = {}
+            lines = []
+            for name, result in self._db.iter_results(guild):
+                entries.setdefault(result.week_number, PuzzleEntry()).add(
+                    name, result.score
+                )
+                lines.append((result.week_number, name, result.score))
+            path = self._path(guild)
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=f'{os.path.basename(path)}.', suffix='.tmp',
+                dir=self._index_dir
+            )
+            try:
+                with os.fdopen(fd, 'w') as journal:
+                    journal.writelines(self._lines([HEADER] + lines))
+                    journal.flush()
+                    stat = os.fstat(journal.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._guilds[guild] = entries
+            self._positions[guild] = stat.st_ino, stat.st_size
+            return len(lines)
+
+    def _entries(self, guild):
+        '''Caller holds the lock.'''
+        if guild in self._guilds:
+            self._catch_up(guild)
+            return self._guilds[guild]
+        entries = None
+        try:
+            with open(self._path(guild), 'rb') as journal:
+                if self._built(journal):
+                    entries = {}
+                    offset = self._replay(guild, journal, entries, journal.tell())
+                    self._positions[guild] = os.fstat(journal.fileno()).st_ino, offset
+        except FileNotFoundError:
+            pass
+        if entries is None:
+            logging.info(f'Building puzzle index for guild {guild}')
+            self.rebuild(guild)
+            return self._guilds[guild]
+        self._guilds[guild] = entries
+        return entries
+
+    def _catch_up(self, guild):
+        '''Apply lines other processes appended since the last read.'''
+        inode, offset = self._positions[guild]
+        try:
+            with open(self._path(guild), 'rb') as journal:
+                stat = os.fstat(journal.fileno())
+                if stat.st_ino == inode and stat.st_size >= offset:
+                    if stat.st_size > offset:
+                        journal.seek(offset)
+                        offset = self._replay(
+                            guild, journal, self._guilds[guild], offset
+                        )
+                        self._positions[guild] = inode, offset
+                    return
+        except FileNotFoundError:
+            return
+        # Rebuilt by another process.
+        del self._guilds[guild]
+        self._entries(guild)
+
+    def _built(self, journal):
+        try:
+            return json.loads(journal.readline()) == HEADER
+        except ValueError:
+            return False
+
+    def _replay(self, guild, journal, entries, offset):
+        '''
+        Apply the complete lines from offset on to entries. Returns the
+        offset after the last one, leaving a line still being written for
+        the next read.
+        '''
+        for line in iter(journal.readline, b''):
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            try:
+                puzzle, name, score = json.loads(line)
+            except ValueError:
+                logging.warning(
+                    f'Skipping bad puzzle index line for guild {guild}'
+                )
+                continue
+            entry = entries.setdefault(puzzle, PuzzleEntry())
+            if score is None:
+                entry.remove(name)
+            else:
+                entry.add(name, score)
+        return offset
+
+    def _append(self, guild, lines):
+        with self._journal_lock(guild, fcntl.LOCK_SH), \
+                open(self._path(guild), 'a') as journal:
+            journal.write(''.join(self._lines(lines)))
+
+    @contextmanager
+    def _journal_lock(self, guild, operation):
+        with open(f'{self._path(guild)}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lines(self, lines):
+        return (json.dumps(line) + '\n' for line in lines)
+
+    def _path(self, guild):
+        return os.path.join(self._index_dir, f'{guild}{INDEX_SUFFIX}')
@@ -0,0 +1,141 @@
+import bisect
+import json
+import logging
+import os
+
+from wordle_buddy import utils
+
+
+HISTORY_SUFFIX = '.ranks'
+
+
+def week_start(day):
+    '''
+    First day of the 'week' leaderboard window as it stands on day, the
+    window being the days before day back to the previous Sunday.
+    '''
+    return day - utils.day_date(day).isoweekday()
+
+
+def _ranked(ranking):
+    '''
+    [name, position, total] rows from a sorted (total, name) ranking, with
+    tied totals sharing a position.
+    '''
+    rows = []
+    for num, (total, name) in enumerate(ranking, start=1):
+        position = rows[-1][1] if rows and rows[-1][2] == total else num
+        rows.append([name, position, total])
+    return rows
+
+
+class Snapshot:
+
+    __slots__ = ('day', 'start', 'players', 'positions')
+
+    def __init__(self, day, start, rows):
+        self.day = day
+        self.start = start
+        self.players = len(rows)
+        self.positions = {name: (position, total) for name, position, total in rows}
+
+
+class RankHistory:
+    '''
+    Per-guild time series of week leaderboard standings. One line is
+    appended to <guild>.ranks under index_dir for each day, so a trend
+    is a slice of the days asked for.
+    '''
+
+    def __init__(self, index_dir):
+        self._index_dir = index_dir
+        self._guilds = {}
+        os.makedirs(index_dir, exist_ok=True)
+
+    def record(self, guild, day, ranking):
+        '''
+        Append the standing on day from a sorted (total, name) ranking of
+        the week window. Days already recorded are skipped.
+        '''
+        days, snapshots = self._snapshots(guild)
+        if days and days[-1] >= day:
+            return False
+        line = [day, week_start(day), _ranked(ranking)]
+        with open(self._path(guild), 'a') as history:
+            history.write(json.dumps(line) + '\n')
+        days.append(day)
+        snapshots.append(Snapshot(*line))
+        return True
+
+    def between(self, guild, start, end):
+        '''Snapshots for days in [start, end).'''
+        days, snapshots = self._snapshots(guild)
+        return snapshots[bisect.bisect_left(days, start):bisect.bisect_left(days, end)]
+
+    def weekly(self, guild, player, weeks):
+        '''
+        (week start, position, players, total) for the last weeks weeks the
+        player appears in, each from the latest snapshot of that week.
+        '''
+        today = utils.current_day()
+        first = week_start(today) - 7 * (weeks - 1)
+        latest = {}
+        for snapshot in self.between(guild, first + 1, today + 1):
+            latest[snapshot.start] = snapshot
+        trend = []
+        for start, snapshot in sorted(latest.items()):
+            if player in snapshot.positions:
+                position, total = snapshot.positions[player]
+                trend.append((start, position, snapshot.players, total))
+        return trend
+
+    def rebuild(self, guild, aggregates, first_day=None):
+        '''
+        Rewrite the history from stored results, replaying the week ranking
+        for every day since the first result. Returns the number of days.
+        '''
+        scores = aggregates.scores(guild)
+        if first_day is None:
+            first_day = min(
+                (min(days) for days in scores.values() if days), default=None
+            )
+        lines = []
+        if first_day is not None:
+            for day in range(first_day + 1, utils.current_day() + 1):
+                ranking = aggregates.ranking(guild, week_start(day), day)
+                lines.append([day, week_start(day), _ranked(ranking)])
+        path = self._path(guild)
+        with open(f'{path}.tmp', 'w') as history:
+            history.writelines(json.dumps(line) + '\n' for line in lines)
+        os.replace(f'{path}.tmp', path)
+        self._guilds[guild] = (
+            [line[0] for line in lines], [Snapshot(*line) for line in lines]
+        )
+        return len(lines)
+
+    def _snapshots(self, guild):
+        try:
+            return self._guilds[guild]
+        except KeyError:
+            pass
+        days = []
+        snapshots = []
+        try:
+            with open(self._path(guild), 'r') as history:
+                for line in history:
+                    try:
+                        snapshot = Snapshot(*json.loads(line))
+                    except (ValueError, TypeError):
+                        logging.warning(
+                            f'Skipping bad rank history line for guild {guild}'
+                        )
+                        continue
+                    days.append(snapshot.day)
+                    snapshots.append(snapshot)
+        except FileNotFoundError:
+            pass
+        self._guilds[guild] = days, snapshots
+        return days, snapshots
+
+    def _path(self, guild):
+        return os.path.join(self._index_dir, f'{guild}{HISTORY_SUFFIX}')
@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+
+ROW_BASE = 3
+ROW_WIDTH = 5
+
+WORDLE = 'wordle'
+NERDLE = 'nerdle'
+WORLDLE = 'worldle'
+QUORDLE = 'quordle'
+
+# Squares per grid row for each game. Games without a square grid, like
+# Quordle, map to None and keep their matrix as a single row of raw bytes.
+ROW_WIDTHS = {
+    WORDLE: ROW_WIDTH,
+    NERDLE: 8,
+    WORLDLE: ROW_WIDTH,
+    QUORDLE: None,
+}
+
+
+def pack_row(row):
+    packed = 0
+    for square in reversed(row):
+        packed = packed * ROW_BASE + square
+    return packed
+
+
+def unpack_row(packed, width=ROW_WIDTH):
+    row = []
+    for _ in range(width):
+        packed, square = divmod(packed, ROW_BASE)
+        row.append(square)
+    return tuple(row)
+
+
+def row_bytes(width):
+    return ((ROW_BASE ** width - 1).bit_length() + 7) // 8
+
+
+class WordleResult(namedtuple(
+    'WordleResult', ['week_number', 'score', 'packed', 'game'],
+    defaults=(WORDLE,)
+)):
+    '''
+    Immutable result record. Each row of the matrix is packed into base-3
+    squares, a single byte for Wordle's five, so a whole Wordle result is
+    a tuple holding two small ints, a bytes object of at most six bytes
+    and the shared game name.
+    '''
+
+    __slots__ = ()
+
+    @classmethod
+    def from_matrix(cls, week_number, score, matrix, game=WORDLE):
+        width = ROW_WIDTHS[game]
+        if width is None:
+            return cls(week_number, score, bytes(matrix[0]) if matrix else b'', game)
+        size = row_bytes(width)
+        return cls(
+            week_number, score,
+            b''.join(pack_row(row).to_bytes(size, 'little') for row in matrix),
+            game
+        )
+
+    @classmethod
+    def from_dict(cls, result):
+        return cls.from_matrix(
+            result['week_number'], result['score'], result['matrix'],
+            result.get('game', WORDLE)
+        )
+
+    @property
+    def matrix(self):
+        width = ROW_WIDTHS[self.game]
+        if width is None:
+            return (tuple(self.packed),) if self.packed else ()
+        size = row_bytes(width)
+        if size == 1:
+            return tuple(unpack_row(row, width) for row in self.packed)
+        return tuple(
+            unpack_row(int.from_bytes(self.packed[i:i + size], 'little'), width)
+            for i in range(0, len(self.packed), size)
+        )
+
+    @property
+    def guesses(self):
+        width = ROW_WIDTHS[self.game]
+        if width is None:
+            return len(self.matrix)
+        return len(self.packed) // row_bytes(width)
+
+    def last_row(self):
+        matrix = self.matrix
+        return matrix[-1] if matrix else ()
+
+    def to_dict(self):
+        result = {
+            'week_number': self.week_number,
+            'score': self.score,
+            'matrix': [list(row) for row in self.matrix],
+        }
+        if self.game != WORDLE:
+            result['game'] = self.game
+        return result
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import time
+from enum import Enum
+
+
+class Route(Enum):
+    ALL = 'all'
+    RESULTS = 'results'
+    COMMANDS = 'commands'
+
+    @property
+    def accepts_commands(self):
+        return self is not Route.RESULTS
+
+    @property
+    def accepts_results(self):
+        return self is not Route.COMMANDS
+
+
+class ChannelRouter:
+    '''
+    Maps channel IDs to routes so that on_message can drop traffic from
+    unwatched channels with a single dict lookup.
+
+    The routing file is JSON of the form
+        {"<guild id>": {"<channel id>": "all" | "results" | "commands"}}
+    and is re-read when its modification time changes. Guilds without an
+    entry fall back to matching the channel name against watch_channel, the
+    result of which is cached per channel ID.
+    '''
+
+    RELOAD_INTERVAL = 5.0
+
+    def __init__(self, config_file=None, watch_channel=None):
+        self._config_file = config_file
+        self._watch_channel = watch_channel
+        self._routes = {}
+        self._guilds = frozenset()
+        self._fallback = {}
+        self._mtime = None
+        self._next_check = 0.0
+        self.reload()
+
+    def route(self, channel):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.RELOAD_INTERVAL
+            self._reload_if_changed()
+        try:
+            return self._routes[channel.id]
+        except KeyError:
+            pass
+        try:
+            return self._fallback[channel.id]
+        except KeyError:
+            route = self._resolve_fallback(channel)
+            self._fallback[channel.id] = route
+            return route
+
+    def reload(self):
+        if not self._config_file:
+            self._set_routes({})
+            return
+        try:
+            mtime = os.stat(self._config_file).st_mtime_ns
+            with open(self._config_file, 'r') as config:
+                raw = json.load(config)
+            routes = {
+                int(guild): {
+                    int(channel): Route(route)
+                    for channel, route in channels.items()
+                }
+                for guild, channels in raw.items()
+            }
+        except FileNotFoundError:
+            logging.warning(f'No routing file found at {self._config_file}')
+            self._mtime = None
+            self._set_routes({})
+            return
+        except (ValueError, AttributeError) as e:
+            logging.error(
+                f'Bad routing file {self._config_file}, keeping old routes: {e}'
+            )
+            return
+        self._mtime = mtime
+        self._set_routes(routes)
+        logging.info(f'Loaded routes for {len(routes)} guilds')
+
+    def _reload_if_changed(self):
+        if not self._config_file:
+            return
+        try:
+            mtime = os.stat(self._config_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+
+    def _set_routes(self, routes):
+        self._routes = {
+            channel: route
+            for channels in routes.values()
+            for channel, route in channels.items()
+        }
+        self._guilds = frozenset(routes)
+        self._fallback = {}
+
+    def _resolve_fallback(self, channel):
+        guild = getattr(channel, 'guild', None)
+        if guild is not None and guild.id in self._guilds:
+            return None
+        name = getattr(channel, 'name', None)
+        if self._watch_channel and name and self._watch_channel in name:
+            return Route.ALL
+        return None
@@ -1,31 +1,188 @@
 #!/usr/bin/env python
 
 
+import argparse
+import json
 import logging
 import os
+import time
+from contextlib import contextmanager
 
-from dotenv import load_dotenv
-from wordle_buddy.json_db import JsonWordleDB
-from wordle_buddy.connect import WordleClient
-from wordle_buddy.message import WordleMessageManager
-from wordle_buddy.commands import WordleCommandHandler
-from emoji import emojize
 
+WATCH_CHANNEL_CACHE = os.path.join(
+    os.getenv('XDG_CACHE_HOME', os.path.expanduser(os.path.join('~', '.cache'))),
+    'wordle-buddy',
+    'watch_channel.json'
+)
 
-def run_buddy():
-    load_dotenv()
-    token = os.getenv('DISCORD_TOKEN')
-    watch_channel = emojize(os.getenv('WATCH_CHANNEL'))
-    print(watch_channel)
-    results_directory = os.getenv('RESULTS_DIRECTORY')
-    log_file = os.getenv('LOG_FILE')
-    logging.basicConfig(filename=log_file, level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 
-    db = JsonWordleDB(results_directory)
-    manager = WordleMessageManager(db)
-    commands = WordleCommandHandler(db)
-    client = WordleClient(watch_channel, manager, commands)
+class StartupProfile:
 
+    def __init__(self):
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append((name, time.perf_counter() - start))
+
+    def report(self):
+        total = sum(elapsed for _, elapsed in self._phases)
+        lines = [
+            'Startup profile',
+            '===============================',
+            'PHASE                  TIME (ms)',
+            '-------------------------------',
+        ]
+        for name, elapsed in self._phases:
+            lines.append(f'{name:<23}{elapsed * 1000:>9.1f}')
+        lines.append('-------------------------------')
+        lines.append(f'{"total":<23}{total * 1000:>9.1f}')
+        return '\n'.join(lines)
+
+
+def resolve_watch_channel(raw_name, cache_file=WATCH_CHANNEL_CACHE):
+    if ':' not in raw_name:
+        return raw_name
+    try:
+        with open(cache_file, 'r') as cache:
+            cached = json.load(cache)
+        if cached.get('raw') == raw_name:
+            return cached['resolved']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    from emoji import emojize
+    resolved = emojize(raw_name)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w') as cache:
+            json.dump({'raw': raw_name, 'resolved': resolved}, cache)
+    except OSError as e:
+        logging.warning(f'Couldn\'t cache watch channel name: {e}')
+    return resolved
+
+
+def env_flag(name):
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+
+def open_database(engine, results_directory, background=True):
+    if engine == 'log':
+        from wordle_buddy.log_db import LogWordleDB
+        return LogWordleDB(results_directory, background)
+    from wordle_buddy.json_db import JsonWordleDB
+    return JsonWordleDB(results_directory, background)
+
+
+def index_directory(results_directory):
+    return os.getenv(
+        'INDEX_DIRECTORY', os.path.join(results_directory, 'index')
+    )
+
+
+def run_buddy(argv=None):
+    parser = argparse.ArgumentParser(prog='wordle-buddy')
+    parser.add_argument(
+        '--profile-startup', action='store_true',
+        help='report import and initialisation time per phase, then exit'
+    )
+    args = parser.parse_args(argv)
+    profile = StartupProfile()
+
+    with profile.phase('dotenv'):
+        from dotenv import load_dotenv
+        load_dotenv()
+    with profile.phase('config'):
+        token = os.getenv('DISCORD_TOKEN')
+        routing_file = os.getenv('ROUTING_FILE')
+        results_directory = os.getenv('RESULTS_DIRECTORY')
+        storage_engine = os.getenv('STORAGE_ENGINE', 'json')
+        log_file = os.getenv('LOG_FILE')
+        daily_digest = env_flag('DAILY_DIGEST')
+        profile_dir = os.getenv('PROFILE_DIR')
+        profile_sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+        profile_enabled = env_flag('PROFILE_ENABLED')
+        ingest_workers = int(os.getenv('INGEST_WORKERS', '4'))
+        ingest_queue_size = int(os.getenv('INGEST_QUEUE_SIZE', '1000'))
+        ingest_policy = os.getenv('INGEST_POLICY', 'block')
+        throttle_user_rate = float(os.getenv('THROTTLE_USER_RATE', '0.2'))
+        throttle_user_burst = float(os.getenv('THROTTLE_USER_BURST', '6'))
+        throttle_guild_rate = float(os.getenv('THROTTLE_GUILD_RATE', '1'))
+        throttle_guild_burst = float(os.getenv('THROTTLE_GUILD_BURST', '20'))
+        shared_aggregates = env_flag('SHARED_AGGREGATES')
+        watchdog_threshold = float(os.getenv('WATCHDOG_THRESHOLD', '0.5'))
+        health_host = os.getenv('HEALTH_HOST', '127.0.0.1')
+        health_port = os.getenv('HEALTH_PORT')
+        health_stall_limit = float(os.getenv('HEALTH_STALL_LIMIT', '30'))
+        logging.basicConfig(filename=log_file, level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+    with profile.phase('watch channel'):
+        watch_channel = resolve_watch_channel(os.getenv('WATCH_CHANNEL', ''))
+        print(watch_channel)
+    with profile.phase('storage'):
+        db = open_database(storage_engine, results_directory)
+    with profile.phase('message manager'):
+        from wordle_buddy.message import WordleMessageManager
+        from wordle_buddy.message_index import MessageIndex
+        manager = WordleMessageManager(
+            db, MessageIndex(index_directory(results_directory))
+        )
+    with profile.phase('profiler'):
+        from wordle_buddy.profiling import SamplingProfiler
+        profiler = SamplingProfiler(profile_dir, profile_sample_rate)
+        if profile_enabled:
+            profiler.enable()
+    with profile.phase('aggregates'):
+        from wordle_buddy.aggregates import ScoreAggregates
+        shared = None
+        if shared_aggregates:
+            from wordle_buddy.shared_aggregates import SharedAggregates
+            shared = SharedAggregates(results_directory)
+        aggregates = ScoreAggregates(db, shared)
+    with profile.phase('puzzle index'):
+        from wordle_buddy.puzzle_index import PuzzleIndex
+        puzzle_index = PuzzleIndex(db, index_directory(results_directory))
+    with profile.phase('rank history'):
+        from wordle_buddy.rank_history import RankHistory
+        rank_history = RankHistory(index_directory(results_directory))
+    with profile.phase('command handler'):
+        from wordle_buddy.commands import WordleCommandHandler
+        from wordle_buddy.throttle import CommandThrottle
+        throttle = CommandThrottle(
+            throttle_user_rate, throttle_user_burst,
+            throttle_guild_rate, throttle_guild_burst
+        )
+        commands = WordleCommandHandler(
+            db, aggregates, profiler, puzzle_index, throttle, rank_history
+        )
+    with profile.phase('routing'):
+        from wordle_buddy.routing import ChannelRouter
+        router = ChannelRouter(routing_file, watch_channel)
+    with profile.phase('discord client'):
+        from wordle_buddy.connect import WordleClient
+        from wordle_buddy.health import LoopWatchdog
+        watchdog = LoopWatchdog(watchdog_threshold)
+        client = WordleClient(
+            router, manager, commands, daily_digest, profiler,
+            ingest_workers, ingest_queue_size, ingest_policy, watchdog
+        )
+    with profile.phase('health'):
+        health = None
+        if health_port:
+            from wordle_buddy.health import HealthServer
+            health = HealthServer(
+                client, watchdog, db, health_host, int(health_port),
+                health_stall_limit
+            )
+
+    if args.profile_startup:
+        print(profile.report())
+        return
+
+    if health is not None:
+        health.start()
     client.run(token)
 
 
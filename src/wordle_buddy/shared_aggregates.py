@@ -0,0 +1,483 @@
+import fcntl
+import hashlib
+import inspect
+import logging
+import os
+import re
+import struct
+import tempfile
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+from wordle_buddy import utils
+
+
+HEADER = struct.Struct('<QIIIIIIQQ')
+VERSION = struct.Struct('<Q')
+COUNT = struct.Struct('<I')
+USERS_OFFSET = 8
+STATE_OFFSET = 20
+GENERATION_OFFSET = 24
+CHANGES_OFFSET = 32
+WATERMARK_OFFSET = 40
+ID = struct.Struct('<Q')
+HISTOGRAM = struct.Struct(f'<{utils.FAILURE_SCORE}I')
+CHANGE = struct.Struct('<III')
+CHANGE_LOG_SIZE = 4096
+# Part of every segment name, so a new layout never attaches to a segment
+# left behind in an old one.
+LAYOUT = 3
+
+EMPTY = 0
+POPULATED = 1
+OVERFLOWED = 2
+
+PLAYED = re.compile(rb'[^\0]')
+
+
+UNTRACKED = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+def _attach(name, size=0):
+    create = size > 0
+    if UNTRACKED:
+        return shared_memory.SharedMemory(name, create, size, track=False)
+    segment = shared_memory.SharedMemory(name, create, size)
+    # Before 3.13 every process that opens a segment also registers it for
+    # removal at exit, which would pull it out from under the others.
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _unlink(name):
+    segment = _attach(name)
+    if not UNTRACKED:
+        # unlink() unregisters the segment again.
+        resource_tracker.register(segment._name, 'shared_memory')
+    segment.close()
+    segment.unlink()
+
+
+class _GuildSegment:
+    '''
+    Shared memory layout for one guild:
+
+        header      version, users, max users, max days, state,
+                    generation, changes, watermark
+        change log  CHANGE_LOG_SIZE (slot, day, score) entries, written
+                    round robin
+        ids         one u64 per user slot
+        histograms  FAILURE_SCORE u32 counts per user slot
+        scores      one byte per user slot and day, 0 when not played
+
+    The version is a seqlock: writers make it odd while they change the
+    segment and even again when they are done, so readers retry when it
+    is odd or moved under them. Every score written is also appended to
+    the change log and counted in changes, so a reader that knows the
+    count it last saw can catch up on just what changed. The generation
+    goes up each time the segment is rebuilt, which no change log covers.
+    The watermark is the database's watermark the segment matches.
+    '''
+
+    def __init__(self, segment):
+        self.segment = segment
+        self.buf = segment.buf
+        _, _, self.max_users, self.max_days, *_ = HEADER.unpack_from(self.buf)
+        self.changes_offset = HEADER.size
+        self.ids_offset = self.changes_offset + CHANGE.size * CHANGE_LOG_SIZE
+        self.histograms_offset = self.ids_offset + ID.size * self.max_users
+        self.scores_offset = (
+            self.histograms_offset + HISTOGRAM.size * self.max_users
+        )
+        self.slots = {}
+        self.slots_key = None
+
+    @staticmethod
+    def size(max_users, max_days):
+        return (
+            HEADER.size + CHANGE.size * CHANGE_LOG_SIZE
+            + (ID.size + HISTOGRAM.size + max_days) * max_users
+        )
+
+    @property
+    def version(self):
+        return VERSION.unpack_from(self.buf)[0]
+
+    @property
+    def state(self):
+        return COUNT.unpack_from(self.buf, STATE_OFFSET)[0]
+
+    @state.setter
+    def state(self, state):
+        COUNT.pack_into(self.buf, STATE_OFFSET, state)
+
+    @property
+    def position(self):
+        '''(generation, changes), which moves on every write.'''
+        _, _, _, _, _, generation, _, changes, _ = HEADER.unpack_from(self.buf)
+        return generation, changes
+
+    @property
+    def watermark(self):
+        return VERSION.unpack_from(self.buf, WATERMARK_OFFSET)[0]
+
+    @watermark.setter
+    def watermark(self, watermark):
+        VERSION.pack_into(self.buf, WATERMARK_OFFSET, watermark)
+
+    def filled_at(self):
+        '''
+        Watermark the segment was filled at, or None if it never was.
+        Waits out a rebuild in progress.
+        '''
+        while True:
+            before, _, _, _, state, _, _, _, watermark = \
+                HEADER.unpack_from(self.buf)
+            if before % 2:
+                time.sleep(0)
+                continue
+            if self.version == before:
+                return None if state == EMPTY else watermark
+
+    def changes_since(self, position):
+        '''
+        (position, [(id, day, score)]) written since position, or None
+        when the segment was rebuilt or the change log has wrapped past it.
+        '''
+        generation, seen = position
+        while True:
+            before, _, _, _, state, current, _, changes, _ = \
+                HEADER.unpack_from(self.buf)
+            if before % 2:
+                time.sleep(0)
+                continue
+            if current != generation or state != POPULATED or \
+                    changes - seen > CHANGE_LOG_SIZE:
+                return None
+            entries = []
+            for count in range(seen, changes):
+                slot, day, score = CHANGE.unpack_from(
+                    self.buf,
+                    self.changes_offset
+                    + CHANGE.size * (count % CHANGE_LOG_SIZE)
+                )
+                name = ID.unpack_from(
+                    self.buf, self.ids_offset + ID.size * slot
+                )[0]
+                entries.append((name, day, score))
+            if self.version == before:
+                return (current, changes), entries
+
+    def clear(self):
+        '''Empty the segment for a rebuild. Caller holds the write lock.'''
+        end = self.scores_offset + self.max_days * self.max_users
+        self.buf[self.ids_offset:end] = bytes(end - self.ids_offset)
+        COUNT.pack_into(self.buf, USERS_OFFSET, 0)
+        generation = COUNT.unpack_from(self.buf, GENERATION_OFFSET)[0]
+        COUNT.pack_into(self.buf, GENERATION_OFFSET, generation + 1)
+        self.slots = {}
+        self.slots_key = None
+
+    def users(self):
+        '''{id: slot} for every user, read again once the segment has moved.'''
+        _, users, _, _, _, generation, *_ = HEADER.unpack_from(self.buf)
+        if self.slots_key != (generation, users):
+            self.slots = {
+                ID.unpack_from(self.buf, self.ids_offset + ID.size * i)[0]: i
+                for i in range(users)
+            }
+            self.slots_key = generation, users
+        return self.slots
+
+    def slot(self, name, add=True):
+        '''
+        Slot for name, adding it if needed and add is set. Only adding needs
+        the write lock.
+        '''
+        users = len(self.users())
+        try:
+            return self.slots[name]
+        except KeyError:
+            pass
+        if not add or users == self.max_users:
+            return None
+        ID.pack_into(self.buf, self.ids_offset + ID.size * users, name)
+        COUNT.pack_into(self.buf, USERS_OFFSET, users + 1)
+        self.slots[name] = users
+        self.slots_key = self.slots_key[0], users + 1
+        return users
+
+    def row(self, slot):
+        '''Offset of slot's scores, one byte per day.'''
+        return self.scores_offset + slot * self.max_days
+
+    def histogram(self, slot):
+        return list(HISTOGRAM.unpack_from(
+            self.buf, self.histograms_offset + HISTOGRAM.size * slot
+        ))
+
+    def set_score(self, slot, day, score):
+        offset = self.row(slot) + day
+        old = self.buf[offset]
+        self.buf[offset] = score
+        histogram = self.histograms_offset + HISTOGRAM.size * slot
+        counts = list(HISTOGRAM.unpack_from(self.buf, histogram))
+        if old:
+            counts[old - 1] -= 1
+        if score:
+            counts[score - 1] += 1
+        HISTOGRAM.pack_into(self.buf, histogram, *counts)
+        changes = VERSION.unpack_from(self.buf, CHANGES_OFFSET)[0]
+        CHANGE.pack_into(
+            self.buf,
+            self.changes_offset + CHANGE.size * (changes % CHANGE_LOG_SIZE),
+            slot, day, score
+        )
+        VERSION.pack_into(self.buf, CHANGES_OFFSET, changes + 1)
+
+
+class _Days(Mapping):
+    '''One user's {day: score}, read from the segment on every access.'''
+
+    def __init__(self, segment, slot):
+        self._segment = segment
+        self._offset = segment.row(slot)
+
+    def _row(self):
+        return bytes(
+            self._segment.buf[self._offset:self._offset + self._segment.max_days]
+        )
+
+    def __getitem__(self, day):
+        if 0 <= day < self._segment.max_days:
+            score = self._segment.buf[self._offset + day]
+            if score:
+                return score
+        raise KeyError(day)
+
+    def __iter__(self):
+        return (match.start() for match in PLAYED.finditer(self._row()))
+
+    def __len__(self):
+        row = self._row()
+        return len(row) - row.count(0)
+
+    def items(self):
+        row = self._row()
+        return [(match.start(), row[match.start()]) for match in PLAYED.finditer(row)]
+
+
+def _played(segment, slot):
+    return list(_Days(segment, slot))
+
+
+class _Users(Mapping):
+    '''{name: value} over the users in a segment.'''
+
+    def __init__(self, segment, value):
+        self._segment = segment
+        self._value = value
+
+    def __getitem__(self, name):
+        slot = self._segment.slot(name, add=False)
+        if slot is None:
+            raise KeyError(name)
+        return self._value(self._segment, slot)
+
+    def __iter__(self):
+        return iter(list(self._segment.users()))
+
+    def __len__(self):
+        return len(self._segment.users())
+
+    def items(self):
+        return [
+            (name, self._value(self._segment, slot))
+            for name, slot in list(self._segment.users().items())
+        ]
+
+
+class SharedAggregates:
+    '''
+    Per-guild score tables in shared memory, so several bot processes
+    serving the same results directory read one copy instead of each
+    loading it from disk. The process that saves a result writes it into
+    the segment, and every other process catches up by applying the
+    segment's change log to what it derived from the segment.
+
+    Segments outlive the processes that use them, and results can be
+    written by processes that don't use them, so each segment records the
+    database watermark it matches. A process attaches to a segment that
+    still matches as is, and rebuilds it from disk otherwise. unlink() and
+    drop() remove segments.
+    '''
+
+    def __init__(self, results_directory, max_users=1024, max_days=4096):
+        self._namespace = hashlib.sha1(
+            os.path.abspath(results_directory).encode()
+        ).hexdigest()[:10]
+        self._max_users = max_users
+        self._max_days = max_days
+        self._segments = {}
+
+    def position(self, guild):
+        return self._segment(guild).position
+
+    def populate(self, guild, db):
+        '''
+        Make the segment hold guild's results in db, rebuilding it only when
+        db's watermark has moved past the segment's. The watermark is read
+        before the results and both under the lock, so no save is lost
+        between them, but readers only wait for the fill. Returns whether
+        the segment is usable.
+        '''
+        segment = self._segment(guild)
+        if segment.filled_at() != db.watermark(guild):
+            with self._lock(guild):
+                watermark = db.watermark(guild)
+                if segment.filled_at() != watermark:
+                    results = list(db.iter_results(guild))
+                    with self._changing(segment):
+                        segment.clear()
+                        segment.state = POPULATED
+                        for name, result in results:
+                            if not self._store(segment, name, result):
+                                segment.state = OVERFLOWED
+                                break
+                        segment.watermark = watermark
+        return segment.state == POPULATED
+
+    def record(self, guild, name, result):
+        '''
+        Write a result just saved to the database into the segment. The save
+        moved the database's watermark by one, so the segment's follows.
+        '''
+        segment = self._segment(guild)
+        with self._writing(guild, segment):
+            if segment.state == POPULATED and not self._store(segment, name, result):
+                segment.state = OVERFLOWED
+            if segment.state != EMPTY:
+                segment.watermark += 1
+
+    def retract(self, guild, name, day):
+        '''Clear a result just deleted from the database from the segment.'''
+        segment = self._segment(guild)
+        with self._writing(guild, segment):
+            slot = segment.slot(name, add=False)
+            if segment.state == POPULATED and slot is not None and \
+                    0 <= day < segment.max_days:
+                segment.set_score(slot, day, 0)
+            if segment.state != EMPTY:
+                segment.watermark += 1
+
+    def view(self, guild):
+        '''
+        (position, {name: {day: score}}, {name: histogram},
+        {name: sorted days played}) where the mappings read the segment on
+        every access rather than copying it.
+        '''
+        segment = self._segment(guild)
+        return (
+            segment.position, _Users(segment, _Days),
+            _Users(segment, _GuildSegment.histogram), _Users(segment, _played)
+        )
+
+    def changes(self, guild, position):
+        '''
+        (position, [(name, day, score)]) written since position, with a
+        score of 0 for a retracted result, or None when position is too old
+        to catch up from and the guild has to be read again.
+        '''
+        return self._segment(guild).changes_since(position)
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.buf = None
+            segment.segment.close()
+        self._segments.clear()
+
+    def unlink(self):
+        names = [segment.segment.name for segment in self._segments.values()]
+        self.close()
+        for name in names:
+            try:
+                _unlink(name)
+            except FileNotFoundError:
+                pass
+
+    def drop(self, guild):
+        '''Remove guild's segment, whether or not this process attached it.'''
+        segment = self._segments.pop(guild, None)
+        if segment is not None:
+            segment.buf = None
+            segment.segment.close()
+        try:
+            _unlink(self._name(guild))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _store(self, segment, name, result):
+        day = result.week_number
+        if not 0 <= day < segment.max_days:
+            logging.error(f'Day {day} does not fit the shared aggregates segment')
+            return False
+        slot = segment.slot(name)
+        if slot is None:
+            logging.error(
+                f'Shared aggregates segment is full at {segment.max_users} users'
+            )
+            return False
+        segment.set_score(slot, day, result.score)
+        return True
+
+    @contextmanager
+    def _writing(self, guild, segment):
+        with self._lock(guild), self._changing(segment):
+            yield
+
+    @contextmanager
+    def _changing(self, segment):
+        version = segment.version + 1
+        VERSION.pack_into(segment.buf, 0, version)
+        try:
+            yield
+        finally:
+            VERSION.pack_into(segment.buf, 0, version + 1)
+
+    @contextmanager
+    def _lock(self, guild):
+        path = os.path.join(
+            tempfile.gettempdir(), f'wordle-buddy-{self._namespace}-{guild}.lock'
+        )
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _segment(self, guild):
+        try:
+            return self._segments[guild]
+        except KeyError:
+            pass
+        name = self._name(guild)
+        with self._lock(guild):
+            try:
+                segment = _GuildSegment(_attach(name))
+            except FileNotFoundError:
+                size = _GuildSegment.size(self._max_users, self._max_days)
+                shm = _attach(name, size)
+                HEADER.pack_into(
+                    shm.buf, 0, 0, 0, self._max_users, self._max_days, EMPTY,
+                    0, 0, 0, 0
+                )
+                segment = _GuildSegment(shm)
+        self._segments[guild] = segment
+        return segment
+
+    def _name(self, guild):
+        return f'wb{LAYOUT}-{self._namespace}-{guild}'
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def wait_for(self, weight):
+        if self.tokens >= weight:
+            return 0.0
+        return (weight - self.tokens) / self.rate
+
+
+class CommandThrottle:
+    '''
+    Token buckets per user and per guild. A command is let through only if
+    both buckets hold enough tokens for its weight, and then both are
+    charged; otherwise nothing is charged and the caller is told how long
+    to wait. Weights above a bucket's burst are charged as the full burst,
+    so every command can get through eventually.
+    '''
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, user_rate=0.2, user_burst=6, guild_rate=1.0,
+                 guild_burst=20, clock=time.monotonic):
+        self._user_rate = user_rate
+        self._user_burst = user_burst
+        self._guild_rate = guild_rate
+        self._guild_burst = guild_burst
+        self._clock = clock
+        self._users = {}
+        self._guilds = {}
+
+    def check(self, guild_id, user_id, weight):
+        weight = min(weight, self._user_burst, self._guild_burst)
+        now = self._clock()
+        buckets = (
+            self._bucket(self._users, (guild_id, user_id), self._user_rate,
+                         self._user_burst, now),
+            self._bucket(self._guilds, guild_id, self._guild_rate,
+                         self._guild_burst, now),
+        )
+        wait = max(bucket.wait_for(weight) for bucket in buckets)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.tokens -= weight
+        return wait
+
+    def _bucket(self, buckets, key, rate, capacity, now):
+        try:
+            bucket = buckets[key]
+        except KeyError:
+            if len(buckets) >= self.MAX_BUCKETS:
+                self._prune(buckets, now)
+            bucket = buckets[key] = TokenBucket(rate, capacity, now)
+            return bucket
+        bucket.refill(now)
+        return bucket
+
+    def _prune(self, buckets, now):
+        for key, bucket in list(buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del buckets[key]
+
+
+class SingleFlight:
+    '''
+    Shares one in-flight computation between concurrent callers asking
+    for the same key.
+    '''
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, factory):
+        try:
+            flight = self._flights[key]
+        except KeyError:
+            flight = self._flights[key] = asyncio.ensure_future(factory())
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+    def __len__(self):
+        return len(self._flights)
@@ -1,4 +1,5 @@
-from datetime import date
+import os
+from datetime import date, datetime, time, timedelta
 from enum import Enum
 
 
@@ -34,3 +35,31 @@ def that_day(that_date):
         return (that_date - DAY_ONE).days
     except TypeError:
         return (that_date.date() - DAY_ONE).days
+
+
+def day_date(day):
+    return DAY_ONE + timedelta(days=day)
+
+
+def seconds_until_next_day():
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), time())
+    return (tomorrow - datetime.now()).total_seconds()
+
+
+def count_change(path):
+    '''
+    Append a byte to path, so its size counts writes from every process.
+    O_APPEND writes don't interleave, so no lock is needed.
+    '''
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b'.')
+    finally:
+        os.close(fd)
+
+
+def change_count(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,173 @@
+import pytest
+
+from wordle_buddy import aggregates as wa
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.result import WordleResult
+
+
+def make_result(day, score):
+    return WordleResult(day, score, b'')
+
+
+@pytest.fixture
+def db(tmp_path):
+    test_db = JsonWordleDB(str(tmp_path))
+    test_db.save(1, 10, make_result(100, 3), 'Mike')
+    test_db.save(1, 11, make_result(100, 5), 'Melissa')
+    test_db.save(1, 11, make_result(101, 2))
+    test_db.save(2, 10, make_result(100, 4))
+    test_db.save(2, 12, make_result(101, 1), 'Bob')
+    return test_db
+
+
+@pytest.mark.parametrize(
+    'days,start,end,expected',
+    [
+        pytest.param({100: 3, 101: 4}, 100, 102, 7, id='Played days are summed'),
+        pytest.param({100: 3}, 100, 102, 10, id='Missed days score as failures'),
+        pytest.param({90: 3}, 100, 102, None, id='Nothing played in window'),
+    ]
+)
+def test_window_total(days, start, end, expected):
+    assert wa._window_total(days, start, end) == expected
+
+
+def test_ranking(db):
+    aggregates = wa.ScoreAggregates(db)
+    assert aggregates.ranking(1, 100, 102) == [(7, 11), (10, 10)]
+
+
+def test_ranking_is_a_snapshot(db):
+    aggregates = wa.ScoreAggregates(db)
+    ranking = aggregates.ranking(1, 100, 102)
+    db.save(1, 10, make_result(101, 1))
+    assert ranking == [(7, 11), (10, 10)]
+    assert aggregates.ranking(1, 100, 102) == [(4, 10), (7, 11)]
+
+
+def test_global_ranking_dedups_users(db):
+    aggregates = wa.ScoreAggregates(db)
+    assert aggregates.global_ranking(100, 102) == [(11, 7), (12, 8), (10, 10)]
+
+
+def test_ranking_updated_on_save(db):
+    aggregates = wa.ScoreAggregates(db)
+    assert aggregates.ranking(1, 100, 102) == [(7, 11), (10, 10)]
+    db.save(1, 10, make_result(101, 1))
+    db.save(1, 13, make_result(101, 6))
+    assert aggregates.ranking(1, 100, 102) == [(4, 10), (7, 11), (13, 13)]
+    assert aggregates.ranking(1, 100, 102) == wa.ScoreAggregates(db).ranking(1, 100, 102)
+
+
+@pytest.mark.parametrize(
+    'name,expected',
+    [
+        pytest.param(10, 'Mike', id='Stored display name'),
+        pytest.param(12, 'Bob', id='Display name from another guild'),
+        pytest.param(99, '99', id='Unknown user falls back to ID'),
+    ]
+)
+def test_display_name(db, name, expected):
+    assert wa.ScoreAggregates(db).display_name(name) == expected
+
+
+@pytest.mark.parametrize(
+    'histogram,percentile,expected',
+    [
+        pytest.param([0, 0, 1, 1, 1, 0, 0], 50, 4, id='Odd count median'),
+        pytest.param([0, 0, 1, 1, 0, 0, 0], 50, 3.5, id='Even count median interpolates'),
+        pytest.param([1, 0, 0, 0, 0, 0, 3], 50, 7, id='Median ignores one outlier'),
+        pytest.param([0, 2, 3, 0, 0, 0, 1], 0, 2, id='Zeroth percentile is the best score'),
+        pytest.param([0, 2, 3, 0, 0, 0, 1], 100, 7, id='Hundredth percentile is the worst score'),
+        pytest.param([0, 0, 0, 0, 0, 0, 0], 50, None, id='No games'),
+    ]
+)
+def test_histogram_percentile(histogram, percentile, expected):
+    assert wa.histogram_percentile(histogram, percentile) == expected
+
+
+@pytest.mark.parametrize(
+    'histogram,trim,expected',
+    [
+        pytest.param([0, 0, 10, 0, 0, 0, 0], 0.1, 3, id='Constant scores'),
+        pytest.param([1, 0, 8, 0, 0, 0, 1], 0.1, 3, id='Outliers are trimmed'),
+        pytest.param([1, 0, 8, 0, 0, 0, 1], 0.0, 3.2, id='No trim is the plain mean'),
+        pytest.param([0, 0, 1, 1, 0, 0, 0], 0.5, None, id='Everything trimmed'),
+    ]
+)
+def test_histogram_trimmed_mean(histogram, trim, expected):
+    assert wa.histogram_trimmed_mean(histogram, trim) == expected
+
+
+def test_histograms_updated_on_save(db):
+    aggregates = wa.ScoreAggregates(db)
+    assert aggregates.histograms(1, 0, 102)[11] == [0, 1, 0, 0, 1, 0, 0]
+    db.save(1, 11, make_result(101, 4))
+    db.save(1, 11, make_result(102, 6))
+    assert aggregates.histograms(1, 0, 102)[11] == [0, 0, 0, 1, 1, 0, 0]
+    assert aggregates.histograms(1, 0, 103)[11] == [0, 0, 0, 1, 1, 1, 0]
+    assert aggregates.histograms(1, 101, 103)[11] == [0, 0, 0, 1, 0, 1, 0]
+    assert 10 not in aggregates.histograms(1, 101, 103)
+
+
+@pytest.mark.parametrize(
+    'first,second,expected',
+    [
+        pytest.param([1, 3, 5, 7], [3, 4, 7, 9], [3, 7], id='Overlapping days'),
+        pytest.param([2], [1, 2, 3, 4, 5, 6], [2], id='Short list bisects long list'),
+        pytest.param([1, 2], [5, 6], [], id='No shared days'),
+        pytest.param([], [1], [], id='Empty list'),
+    ]
+)
+def test_intersect_sorted(first, second, expected):
+    assert wa.intersect_sorted(first, second) == expected
+    assert wa.intersect_sorted(second, first) == expected
+
+
+def test_head_to_head(db):
+    db.save(1, 10, make_result(101, 2))
+    db.save(1, 10, make_result(102, 4))
+    db.save(1, 11, make_result(103, 4))
+    aggregates = wa.ScoreAggregates(db)
+    record = aggregates.head_to_head(1, 10, 11)
+    assert (record.wins, record.draws, record.losses) == (1, 1, 0)
+    assert record.average_margin == 1
+    opponent = aggregates.head_to_head(1, 11, 10)
+    assert (opponent.wins, opponent.draws, opponent.losses) == (0, 1, 1)
+    assert opponent.average_margin == -1
+
+
+def test_head_to_head_updated_on_save(db):
+    aggregates = wa.ScoreAggregates(db)
+    record = aggregates.head_to_head(1, 10, 11)
+    assert (record.wins, record.draws, record.losses) == (1, 0, 0)
+    db.save(1, 10, make_result(101, 3))
+    db.save(1, 11, make_result(102, 3))
+    db.save(1, 10, make_result(102, 3))
+    assert (record.wins, record.draws, record.losses) == (1, 1, 1)
+    db.save(1, 10, make_result(101, 1))
+    assert (record.wins, record.draws, record.losses) == (2, 1, 0)
+    assert record.average_margin == pytest.approx(3 / 3)
+    fresh = wa.ScoreAggregates(db).head_to_head(1, 10, 11)
+    assert (fresh.wins, fresh.draws, fresh.losses, fresh.margin) == \
+        (record.wins, record.draws, record.losses, record.margin)
+
+
+def test_delete_patches_aggregates(db):
+    db.save(1, 10, make_result(101, 4))
+    aggregates = wa.ScoreAggregates(db)
+    ranking = aggregates.ranking(1, 100, 102)
+    record = aggregates.head_to_head(1, 10, 11)
+    assert ranking == [(7, 10), (7, 11)]
+    assert (record.wins, record.draws, record.losses) == (1, 0, 1)
+    db.delete(1, 10, 101)
+    db.delete(1, 11, 100)
+    db.delete(1, 11, 99)
+    assert ranking == [(7, 10), (7, 11)]
+    ranking = aggregates.ranking(1, 100, 102)
+    assert ranking == [(9, 11), (10, 10)]
+    assert (record.wins, record.draws, record.losses) == (0, 0, 0)
+    assert aggregates.histograms(1, 0, 102) == {10: [0, 0, 1, 0, 0, 0, 0], 11: [0, 1, 0, 0, 0, 0, 0]}
+    fresh = wa.ScoreAggregates(db)
+    assert aggregates.scores(1) == fresh.scores(1)
+    assert ranking == fresh.ranking(1, 100, 102)
@@ -2,7 +2,8 @@ import datetime
 import discord
 import pytest
 
-from wordle_buddy import commands as wc
+from wordle_buddy import aggregates as wa, commands as wc
+from wordle_buddy.result import WordleResult
 from unittest.mock import patch
 from unittest.mock import call
 
@@ -66,7 +67,7 @@ def test_ave_ldb_message(test_input, test_output):
         assert wc._ave_ldb_message(*test_input) == test_output
 
 
-normal_results = [{'score': 3}, {'score': 5}]
+normal_results = [WordleResult(TEST_DAY_NUM, 3, b''), WordleResult(TEST_DAY_NUM, 5, b'')]
 normal_output = 8
 none_results = [None, None]
 none_output = 14
@@ -87,7 +88,7 @@ def test_total_score(test_input, test_output):
 
 
 normal_ave_output = 4.0, 2
-none_mixed_results = [{'score': 3}, None, {'score': 5}]
+none_mixed_results = [WordleResult(TEST_DAY_NUM, 3, b''), None, WordleResult(TEST_DAY_NUM, 5, b'')]
 zero_output = 0, 0
 
 
@@ -218,13 +219,13 @@ class DummyMem:
 
 
 normal_raw_results = {1029: [
-        {
+        WordleResult.from_dict({
             'week_number': TEST_DAY_NUM,
             'score': 3,
             'matrix': [[0, 0, 0, 0, 0],
                        [0, 1, 0, 2, 0],
                        [2, 2, 2, 2, 2]]
-        }
+        })
     ]
 }
 normal_test_output = (wc.WordleCommandHandler.Response.MSG_CHANNEL,
@@ -280,7 +281,7 @@ async def test_leaderboard(additional, calls_db, days, raw_results, test_output)
         handler = wc.WordleCommandHandler(mock_db)
         assert await handler._leaderboard(guild_inst, additional) == test_output
         if calls_db:
-            mock_db.load.assert_called_once_with(99, weeks=range(TEST_DAY_NUM - days, TEST_DAY_NUM))
+            mock_db.load.assert_called_once_with(99, weeks=range(TEST_DAY_NUM - days, TEST_DAY_NUM), game='wordle')
             calls = [call(k) for k in raw_results.keys()]
             mock_fetch_member.assert_has_awaits(calls)
 
@@ -345,12 +346,12 @@ async def test_average_ldb(additional, calls_db, days, raw_results, test_output)
         handler = wc.WordleCommandHandler(mock_db)
         assert await handler._average_ldb(guild_inst, additional) == test_output
         if calls_db:
-            mock_db.load.assert_called_once_with(99, weeks=range(TEST_DAY_NUM - days, TEST_DAY_NUM))
+            mock_db.load.assert_called_once_with(99, weeks=range(TEST_DAY_NUM - days, TEST_DAY_NUM), game='wordle')
             calls = [call(k) for k in raw_results.keys()]
             mock_fetch_member.assert_has_awaits(calls)
 
 
-normal_ldb_results = {1029: [{'score': 7}, {'score': 3}], 1028: [{'score': 4}, {'score': 1}], 1027: [{'score': 5}, {'score': 3}]}
+normal_ldb_results = {1029: [WordleResult(TEST_DAY_NUM, 7, b''), WordleResult(TEST_DAY_NUM, 3, b'')], 1028: [WordleResult(TEST_DAY_NUM, 4, b''), WordleResult(TEST_DAY_NUM, 1, b'')], 1027: [WordleResult(TEST_DAY_NUM, 5, b''), WordleResult(TEST_DAY_NUM, 3, b'')]}
 normal_expected_output = {'1028': 5, '1027': 8, '1029': 10}
 none_ldb_results = {1029: [None]}
 none_expected_output = {'1029': 7}
@@ -377,7 +378,7 @@ async def test_ldb_from_results(test_results, expected_output):
 
 
 normal_ave_expected = {'1028': (2.5, 2), '1027': (4, 2), '1029': (5, 2)}
-none_ave_results = {1029: [{'score': 7}, None], 1028: [{'score': 4}, {'score': 1}], 1027: [{'score': 5}, {'score': 3}]}
+none_ave_results = {1029: [WordleResult(TEST_DAY_NUM, 7, b''), None], 1028: [WordleResult(TEST_DAY_NUM, 4, b''), WordleResult(TEST_DAY_NUM, 1, b'')], 1027: [WordleResult(TEST_DAY_NUM, 5, b''), WordleResult(TEST_DAY_NUM, 3, b'')]}
 none_ave_expected = {'1028': (2.5, 2), '1027': (4, 2), '1029': (7, 1)}
 
 
@@ -404,3 +405,343 @@ async def test_ave_ldb_from_results(test_results, expected_output):
 def test_help():
     handler = wc.WordleCommandHandler(None)
     assert handler._help() == (handler.Response.MSG_PRIVATE, wc.HELP_TEXT)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'additional,global_ranking,test_output',
+    [
+        pytest.param(['global'], [(1029, 3)], (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                     '''```Wordle Global Leaderboard: 24/01/2021 - 26/01/2021
+===========================================
+POS NAME           SCORE
+-------------------------------------------
+1   Mike           3```'''), id='Global week leaderboard request'),
+        pytest.param(['global', 'invalid'], None, invalid_test_output, id='Invalid global leaderboard request')
+    ]
+)
+async def test_global_leaderboard(additional, global_ranking, test_output):
+    with patch('wordle_buddy.aggregates.ScoreAggregates') as MockAggregates, \
+            patch('wordle_buddy.utils.current_day') as mock_current_day, \
+            patch(f'{wc.__name__}.datetime', wraps=datetime) as mock_dt:
+        mock_aggregates = MockAggregates.return_value
+        mock_aggregates.global_ranking.return_value = global_ranking
+        mock_aggregates.display_name.return_value = 'Mike'
+        mock_current_day.return_value = TEST_DAY_NUM
+        mock_dt.datetime.today.return_value = TEST_DATE
+        handler = wc.WordleCommandHandler(None, mock_aggregates)
+        assert await handler._leaderboard(None, additional) == test_output
+        if global_ranking:
+            mock_aggregates.global_ranking.assert_called_once_with(
+                TEST_DAY_NUM - TEST_DATE.isoweekday(), TEST_DAY_NUM)
+
+
+digest_output = '''```Wordle 321 Daily Digest
+===========================================
+Players: 3
+Average: 4.000
+Best:    3/6 - Mike, Bob
+-------------------------------------------
+1   0
+2   0
+3   2
+4   0
+5   0
+6   1
+X   0```'''
+
+
+def test_digest_message():
+    assert wc._digest_message(321, {'Mike': 3, 'Bob': 3, 'Melissa': 6}) == digest_output
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content,administrator,configured,expected_call,test_output',
+    [
+        pytest.param('+w profile on', True, True, 'enable',
+                     (wc.WordleCommandHandler.Response.MSG_PRIVATE, 'Profiling enabled.'), id='Admin enables profiling'),
+        pytest.param('+w profile off', True, True, 'disable',
+                     (wc.WordleCommandHandler.Response.MSG_PRIVATE, 'Profiling disabled, profiles written.'),
+                     id='Admin disables profiling'),
+        pytest.param('+w profile on', False, True, None,
+                     (wc.WordleCommandHandler.Response.NONE, None), id='Non-admin is ignored'),
+        pytest.param('+w profile on', True, False, None,
+                     (wc.WordleCommandHandler.Response.MSG_PRIVATE,
+                      'Profiling is not configured, set PROFILE_DIR to use it.'), id='Unconfigured profiler'),
+    ]
+)
+async def test_handle_profile(content, administrator, configured, expected_call, test_output):
+    with patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.profiling.SamplingProfiler') as MockProfiler:
+        message = MockMessage.return_value
+        message.content = content
+        message.author.guild_permissions.administrator = administrator
+        profiler = MockProfiler.return_value
+        profiler.configured = configured
+        handler = wc.WordleCommandHandler(None, profiler=profiler)
+        assert await handler.handle_command(None, message) == test_output
+        for method in ('enable', 'disable'):
+            assert getattr(profiler, method).called == (method == expected_call)
+
+
+class DummyEntry:
+    histogram = [0, 1, 1, 0, 0, 0, 0]
+    solvers = {1029: 2, 1030: 3}
+    players = 2
+    average = 2.5
+    failures = 0
+
+
+puzzle_test_output = (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                      '''```Wordle 850
+===========================================
+Players: 2
+Average: 2.500
+Failed:  0 (0.0%)
+-------------------------------------------
+1   0
+2   1   1029
+3   1   1030
+4   0
+5   0
+6   0
+X   0```''')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content,puzzle,entry,test_output',
+    [
+        pytest.param('+w puzzle 850', 850, DummyEntry(), puzzle_test_output, id='Puzzle breakdown'),
+        pytest.param('+w puzzle #850', 850, DummyEntry(), puzzle_test_output, id='Puzzle breakdown with hash'),
+        pytest.param('+w today', TEST_DAY_NUM, None,
+                     (wc.WordleCommandHandler.Response.MSG_CHANNEL, f'Nobody has played Wordle {TEST_DAY_NUM} yet.'),
+                     id='Nobody played today'),
+        pytest.param('+w puzzle abc', None, None, invalid_test_output, id='Invalid puzzle number'),
+    ]
+)
+async def test_handle_puzzle(content, puzzle, entry, test_output):
+    with patch.object(discord.Guild, 'fetch_member') as mock_fetch_member, \
+            patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.puzzle_index.PuzzleIndex') as MockIndex, \
+            patch('wordle_buddy.utils.current_day') as mock_current_day:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = content
+        mock_fetch_member.side_effect = lambda k: DummyMem(str(k))
+        mock_current_day.return_value = TEST_DAY_NUM
+        mock_index = MockIndex.return_value
+        mock_index.get.return_value = entry
+        handler = wc.WordleCommandHandler(None, puzzle_index=mock_index)
+        assert await handler.handle_command(guild_inst, message) == test_output
+        if puzzle is not None:
+            mock_index.get.assert_called_once_with(99, puzzle)
+
+
+median_test_output = (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                      f'''```Wordle Median Leaderboard: {TEST_DATE - datetime.timedelta(days=TEST_DAY_NUM):%d/%m/%Y} - {TEST_DATE_BEFORE:%d/%m/%Y}
+===========================================
+POS NAME           SCORE  TOTAL GAMES
+-------------------------------------------
+1   1028           3.000  3
+2   1029           3.500  2```''')
+percentile_test_output = (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                          '''```Wordle 90th Percentile Leaderboard: 22/01/2021 - 26/01/2021
+===========================================
+POS NAME           SCORE  TOTAL GAMES
+-------------------------------------------
+1   1029           3.900  2
+2   1028           5.400  3```''')
+
+
+@pytest.mark.parametrize(
+    'number,expected',
+    [
+        pytest.param(1, '1st', id='First'),
+        pytest.param(2, '2nd', id='Second'),
+        pytest.param(3, '3rd', id='Third'),
+        pytest.param(11, '11th', id='Eleventh'),
+        pytest.param(22, '22nd', id='Twenty second'),
+        pytest.param(90, '90th', id='Ninetieth'),
+        pytest.param(100, '100th', id='Hundredth'),
+        pytest.param(92.5, '92.5th', id='Fractional'),
+    ]
+)
+def test_ordinal(number, expected):
+    assert wc._ordinal(number) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content,window,test_output',
+    [
+        pytest.param('+w median', (0, TEST_DAY_NUM), median_test_output, id='Median leaderboard'),
+        pytest.param('+w percentile 90 5', (TEST_DAY_NUM - 5, TEST_DAY_NUM), percentile_test_output,
+                     id='Percentile leaderboard'),
+        pytest.param('+w percentile 101', None, invalid_test_output, id='Percentile out of range'),
+        pytest.param('+w percentile', None, invalid_test_output, id='Percentile missing'),
+    ]
+)
+async def test_handle_order_ldb(content, window, test_output):
+    with patch.object(discord.Guild, 'fetch_member') as mock_fetch_member, \
+            patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.aggregates.ScoreAggregates') as MockAggregates, \
+            patch('wordle_buddy.utils.current_day') as mock_current_day, \
+            patch(f'{wc.__name__}.datetime', wraps=datetime) as mock_dt:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = content
+        mock_fetch_member.side_effect = lambda k: DummyMem(str(k))
+        mock_current_day.return_value = TEST_DAY_NUM
+        mock_dt.datetime.today.return_value = TEST_DATE
+        mock_aggregates = MockAggregates.return_value
+        mock_aggregates.histograms.return_value = {
+            1029: [0, 0, 1, 1, 0, 0, 0],
+            1028: [0, 1, 1, 0, 0, 1, 0],
+        }
+        handler = wc.WordleCommandHandler(None, mock_aggregates)
+        assert await handler.handle_command(guild_inst, message) == test_output
+        if window:
+            mock_aggregates.histograms.assert_called_once_with(99, *window)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content,wait,weight,test_output',
+    [
+        pytest.param('+w help', 0, 1, (wc.WordleCommandHandler.Response.MSG_PRIVATE, wc.HELP_TEXT),
+                     id='Command allowed'),
+        pytest.param('+w average all', 2.2, 3,
+                     (wc.WordleCommandHandler.Response.MSG_PRIVATE, 'Slow down! Try again in 3 s.'),
+                     id='Command throttled'),
+    ]
+)
+async def test_handle_throttled(content, wait, weight, test_output):
+    with patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.throttle.CommandThrottle') as MockThrottle:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = content
+        message.author.id = 1028
+        throttle = MockThrottle.return_value
+        throttle.check.return_value = wait
+        handler = wc.WordleCommandHandler(None, throttle=throttle)
+        assert await handler.handle_command(guild_inst, message) == test_output
+        throttle.check.assert_called_once_with(99, 1028, weight)
+
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content',
+    [
+        pytest.param('+w frobnicate', id='Unknown command'),
+        pytest.param('+wow nice score', id='Word starting with the prefix'),
+        pytest.param('+w', id='Prefix alone'),
+    ]
+)
+async def test_non_commands_not_throttled(content):
+    with patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.throttle.CommandThrottle') as MockThrottle:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = content
+        throttle = MockThrottle.return_value
+        throttle.check.return_value = 5
+        handler = wc.WordleCommandHandler(None, throttle=throttle)
+        assert await handler.handle_command(guild_inst, message) == invalid_test_output
+        throttle.check.assert_not_called()
+
+class DummyRecord:
+    played = 5
+    wins = 3
+    draws = 1
+    losses = 1
+    average_margin = 0.6
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'mentions,record,test_output',
+    [
+        pytest.param([1029], DummyRecord(), (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                     '''```Wordle Head to Head: 1028 vs 1029
+===========================================
+Shared games: 5
+-------------------------------------------
+Wins:   3
+Draws:  1
+Losses: 1
+Average margin: +0.600```'''), id='Head to head'),
+        pytest.param([1029], wa.HeadToHead(), (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                     'You have not played on any of the same days yet.'), id='No shared games'),
+        pytest.param([], None, invalid_test_output, id='Nobody mentioned'),
+        pytest.param([1028], None, invalid_test_output, id='Mentioned self'),
+    ]
+)
+async def test_handle_vs(mentions, record, test_output):
+    with patch.object(discord.Guild, 'fetch_member') as mock_fetch_member, \
+            patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.aggregates.ScoreAggregates') as MockAggregates:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = '+w vs @someone'
+        message.author.id = 1028
+        message.mentions = [DummyMem(None) for _ in mentions]
+        for mention, user_id in zip(message.mentions, mentions):
+            mention.id = user_id
+        mock_fetch_member.side_effect = lambda k: DummyMem(str(k))
+        mock_aggregates = MockAggregates.return_value
+        mock_aggregates.head_to_head.return_value = record
+        handler = wc.WordleCommandHandler(None, mock_aggregates)
+        assert await handler.handle_command(guild_inst, message) == test_output
+        if record is not None:
+            mock_aggregates.head_to_head.assert_called_once_with(99, 1028, 1029)
+
+
+trend_test_output = (wc.WordleCommandHandler.Response.MSG_CHANNEL,
+                     '''```Wordle Trend: 1029, last 2 weeks
+===========================================
+WEEK OF     POS    SCORE  CHANGE
+-------------------------------------------
+27/12/2022  3/5    30
+03/01/2023  1/6    21     +2```''')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'content,mentions,weekly_call,trend,test_output',
+    [
+        pytest.param('+w trend <@1029> 2', [1029], (99, 1029, 2), [(556, 3, 5, 30), (563, 1, 6, 21)],
+                     trend_test_output, id='Trend for mentioned user'),
+        pytest.param('+w trend', [], (99, 1028, 4), [],
+                     (wc.WordleCommandHandler.Response.MSG_CHANNEL, 'No leaderboard history for 1028 yet.'),
+                     id='Own trend defaults to four weeks'),
+        pytest.param('+w trend many', [], None, None, invalid_test_output, id='Invalid weeks'),
+    ]
+)
+async def test_handle_trend(content, mentions, weekly_call, trend, test_output):
+    with patch.object(discord.Guild, 'fetch_member') as mock_fetch_member, \
+            patch('discord.Message') as MockMessage, \
+            patch('wordle_buddy.rank_history.RankHistory') as MockHistory:
+        guild_inst = discord.Guild
+        guild_inst.id = 99
+        message = MockMessage.return_value
+        message.content = content
+        message.author.id = 1028
+        message.mentions = [DummyMem(None) for _ in mentions]
+        for mention, user_id in zip(message.mentions, mentions):
+            mention.id = user_id
+        mock_fetch_member.side_effect = lambda k: DummyMem(str(k))
+        mock_history = MockHistory.return_value
+        mock_history.weekly.return_value = trend
+        handler = wc.WordleCommandHandler(None, rank_history=mock_history)
+        assert await handler.handle_command(guild_inst, message) == test_output
+        if weekly_call:
+            mock_history.weekly.assert_called_once_with(*weekly_call)
@@ -0,0 +1,366 @@
+import asyncio
+import time
+
+import pytest
+
+from wordle_buddy import fake_gateway as fg, loadtest, utils
+from wordle_buddy.aggregates import ScoreAggregates
+from wordle_buddy.commands import WordleCommandHandler
+from wordle_buddy.connect import WordleClient, check
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.message import WordleMessageManager
+from wordle_buddy.message_index import MessageIndex
+from wordle_buddy.puzzle_index import PuzzleIndex
+from wordle_buddy.rank_history import RankHistory
+from wordle_buddy.result import WordleResult
+from wordle_buddy.routing import ChannelRouter
+from unittest.mock import PropertyMock, patch
+
+
+@pytest.fixture
+def client(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    return WordleClient(
+        ChannelRouter(None, 'wordle'),
+        WordleMessageManager(db),
+        WordleCommandHandler(db),
+    )
+
+
+@pytest.mark.asyncio
+async def test_feed_saves_and_reacts(client):
+    gateway = fg.FakeGateway(client, guilds=2, users=10)
+    await gateway.feed(200, 5000, result_share=1.0, command_share=0.0)
+    messages = [m for c in gateway.channels for m in c.messages]
+    assert len(gateway.latencies) == 200
+    assert gateway.errors == 0
+    assert all(m.reactions == [check] for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_unwatched_channel_dropped(client):
+    gateway = fg.FakeGateway(client, channel_name='general', users=5)
+    await gateway.feed(20, 5000, result_share=1.0, command_share=0.0)
+    messages = gateway.channels[0].messages
+    assert all(m.reactions == [] for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_fetches_members(client):
+    gateway = fg.FakeGateway(client, users=3, fetch_latency=0.001)
+    channel = gateway.channels[0]
+    await gateway.dispatch(gateway.make_message('+w leaderboard', channel))
+    assert len(channel.sent) == 1
+
+
+@pytest.mark.asyncio
+async def test_reaction_rate_limit():
+    limiter = fg.RateLimiter(0.01)
+    start = asyncio.get_running_loop().time()
+    await asyncio.gather(*(limiter.acquire() for _ in range(5)))
+    assert asyncio.get_running_loop().time() - start >= 0.035
+
+
+@pytest.mark.asyncio
+async def test_scrape_pages_history(client):
+    gateway = fg.FakeGateway(client, users=5, page_size=3, page_latency=0.001)
+    channel = gateway.channels[0]
+    for user in gateway.users:
+        gateway.make_message(
+            fg.result_content(utils.current_day(), 4), channel, user
+        )
+    await client.scrape(channel)
+    assert all(m.reactions == [check] for m in channel.messages)
+
+
+@pytest.mark.asyncio
+async def test_run_load_report():
+    config = {
+        'engine': 'log',
+        'guilds': 1,
+        'users': 10,
+        'fetch_latency': 0.0,
+        'reaction_interval': 0.0,
+    }
+    report = await loadtest.run_load(config, 50, 2000)
+    assert report['errors'] == 0
+    assert report['p50'] <= report['p99']
+
+
+@pytest.mark.asyncio
+async def test_rollover_warms_and_posts_digest(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    handler = WordleCommandHandler(db)
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler, True
+    )
+    gateway = fg.FakeGateway(client, users=3, fetch_latency=0.001)
+    channel = gateway.channels[0]
+    today = utils.current_day()
+    for score, user in enumerate(gateway.users, start=2):
+        await gateway.dispatch(gateway.make_message(
+            fg.result_content(today, score), channel, user
+        ))
+    with patch.object(WordleClient, 'guilds', new_callable=PropertyMock) as mock_guilds, \
+            patch('wordle_buddy.utils.current_day') as mock_current_day:
+        mock_guilds.return_value = [channel.guild]
+        mock_current_day.return_value = today + 1
+        await client.rollover()
+        fetches = channel.guild.fetches
+        await gateway.dispatch(gateway.make_message('+w leaderboard', channel))
+        await gateway.dispatch(gateway.make_message('+w average', channel))
+    assert channel.guild.fetches == fetches
+    assert channel.sent[0].startswith('```Wordle ')
+    assert 'Players: 3' in channel.sent[0]
+    assert len(channel.sent) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'aggregated',
+    [
+        pytest.param(False, id='Boards from the database'),
+        pytest.param(True, id='Boards from the aggregates'),
+    ]
+)
+async def test_late_result_refreshes_warm_boards(tmp_path, aggregated):
+    db = JsonWordleDB(str(tmp_path))
+    handler = WordleCommandHandler(db, ScoreAggregates(db) if aggregated else None)
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler
+    )
+    gateway = fg.FakeGateway(client, users=1, fetch_latency=0.001)
+    channel = gateway.channels[0]
+    user = gateway.users[0]
+    await handler.warm(channel.guild)
+    db.save(channel.guild.id, user.id, WordleResult(utils.current_day() - 1, 3, b''))
+    await gateway.dispatch(gateway.make_message('+w leaderboard 1', channel))
+    await gateway.dispatch(gateway.make_message('+w average 1', channel))
+    assert len(channel.sent) == 2
+    assert all(user.display_name in sent for sent in channel.sent)
+
+
+@pytest.mark.asyncio
+async def test_warm_reads_all_time_from_aggregates(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    handler = WordleCommandHandler(db, ScoreAggregates(db))
+    gateway = fg.FakeGateway(
+        WordleClient(ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler),
+        users=1,
+    )
+    with patch.object(db, 'load', wraps=db.load) as load:
+        await handler.warm(gateway.channels[0].guild)
+    load.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_board_computed_across_save_not_cached(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    handler = WordleCommandHandler(db)
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler
+    )
+    gateway = fg.FakeGateway(client, users=2)
+    channel = gateway.channels[0]
+    guild = channel.guild
+    first, second = gateway.users
+    yesterday = utils.current_day() - 1
+    db.save(guild.id, first.id, WordleResult(yesterday, 3, b''))
+    fetch_member = guild.fetch_member
+
+    async def fetch_while_saving(member_id):
+        # The late result is saved after the board read its results.
+        guild.fetch_member = fetch_member
+        db.save(guild.id, second.id, WordleResult(yesterday, 4, b''))
+        return await fetch_member(member_id)
+    guild.fetch_member = fetch_while_saving
+    await gateway.dispatch(gateway.make_message('+w leaderboard 1', channel))
+    await gateway.dispatch(gateway.make_message('+w leaderboard 1', channel))
+    assert second.display_name not in channel.sent[0]
+    assert second.display_name in channel.sent[1]
+
+
+@pytest.mark.asyncio
+async def test_rollover_records_ranks(tmp_path):
+    db = JsonWordleDB(str(tmp_path / 'results'))
+    history = RankHistory(str(tmp_path / 'index'))
+    handler = WordleCommandHandler(
+        db, ScoreAggregates(db), rank_history=history
+    )
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler
+    )
+    gateway = fg.FakeGateway(client, users=3, fetch_latency=0.001)
+    channel = gateway.channels[0]
+    today = utils.current_day()
+    for score, user in enumerate(gateway.users, start=2):
+        await gateway.dispatch(gateway.make_message(
+            fg.result_content(today, score), channel, user
+        ))
+    with patch.object(WordleClient, 'guilds', new_callable=PropertyMock) as mock_guilds, \
+            patch('wordle_buddy.utils.current_day') as mock_current_day:
+        mock_guilds.return_value = [channel.guild]
+        mock_current_day.return_value = today + 1
+        await client.rollover()
+        await client.rollover()
+    snapshots = history.between(channel.guild.id, 0, today + 2)
+    assert [snapshot.day for snapshot in snapshots] == [today + 1]
+    assert [snapshots[0].positions[user.id][0] for user in gateway.users] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_ingest_queue_processes_results(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db),
+        WordleCommandHandler(db), ingest_workers=2,
+    )
+    client.ingest_queue.start()
+    gateway = fg.FakeGateway(client, guilds=3, users=10)
+    await gateway.feed(100, 5000, result_share=0.5, command_share=0.0)
+    await client.ingest_queue.join()
+    await client.ingest_queue.stop()
+    messages = [m for c in gateway.channels for m in c.messages]
+    results = [m for m in messages if m.content.startswith('Wordle')]
+    assert all(m.reactions == [check] for m in results)
+    assert client.ingest_queue.metrics()['processed'] == len(results)
+
+
+class SlowMessageManager(WordleMessageManager):
+    def handle(self, *args, **kwargs):
+        time.sleep(0.2)
+        return super().handle(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_slow_save_does_not_stall_loop(tmp_path):
+    db = JsonWordleDB(str(tmp_path))
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), SlowMessageManager(db),
+        WordleCommandHandler(db), ingest_workers=1,
+    )
+    client.ingest_queue.start()
+    gateway = fg.FakeGateway(client, users=1)
+    channel = gateway.channels[0]
+    message = gateway.make_message(
+        fg.game_content('wordle', utils.current_day(), 3), channel
+    )
+    loop = asyncio.get_running_loop()
+    gaps = []
+
+    async def tick():
+        while True:
+            start = loop.time()
+            await asyncio.sleep(0.01)
+            gaps.append(loop.time() - start)
+    ticker = asyncio.create_task(tick())
+    await gateway.dispatch(message)
+    await client.ingest_queue.join()
+    ticker.cancel()
+    await client.ingest_queue.stop()
+    assert message.reactions == [check]
+    assert len(gaps) > 5 and max(gaps) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_boards_unaffected_by_saves_during_fetches(tmp_path):
+    db = JsonWordleDB(str(tmp_path / 'results'))
+    handler = WordleCommandHandler(
+        db, ScoreAggregates(db),
+        puzzle_index=PuzzleIndex(db, str(tmp_path / 'index')),
+    )
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'), WordleMessageManager(db), handler
+    )
+    gateway = fg.FakeGateway(client, users=2)
+    channel = gateway.channels[0]
+    guild = channel.guild
+    yesterday = utils.current_day() - 1
+    for score, user in enumerate(gateway.users, start=3):
+        db.save(guild.id, user.id, WordleResult(yesterday, score, b''))
+    fetch_member = guild.fetch_member
+    strangers = iter(range(1, 100))
+
+    async def fetch_while_saving(member_id):
+        # Another result lands for a non-member while names are fetched.
+        db.save(guild.id, next(strangers), WordleResult(yesterday, 2, b''))
+        return await fetch_member(member_id)
+    guild.fetch_member = fetch_while_saving
+    await gateway.dispatch(gateway.make_message('+w leaderboard 1', channel))
+    await gateway.dispatch(gateway.make_message(f'+w puzzle {yesterday}', channel))
+    assert len(channel.sent) == 2
+    for user in gateway.users:
+        assert all(user.display_name in sent for sent in channel.sent)
+
+
+@pytest.fixture
+def indexed_client(tmp_path):
+    db = JsonWordleDB(str(tmp_path / 'results'))
+    aggregates = ScoreAggregates(db)
+    client = WordleClient(
+        ChannelRouter(None, 'wordle'),
+        WordleMessageManager(db, MessageIndex(str(tmp_path / 'index'))),
+        WordleCommandHandler(db, aggregates),
+    )
+    return client, db, aggregates
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'cached',
+    [
+        pytest.param(True, id='Cached message'),
+        pytest.param(False, id='Uncached message'),
+    ]
+)
+async def test_edit_reparses_result(indexed_client, cached):
+    client, db, aggregates = indexed_client
+    gateway = fg.FakeGateway(client, users=2)
+    channel = gateway.channels[0]
+    guild = channel.guild.id
+    user = gateway.users[0]
+    today = utils.current_day()
+    message = gateway.make_message(fg.result_content(today, 5), channel, user)
+    await gateway.dispatch(message)
+    aggregates.scores(guild)
+    with patch.object(client, 'get_channel', gateway.get_channel):
+        await gateway.edit(message, fg.result_content(today, 3), cached)
+        assert db.load(guild, names=[user.id])[user.id][0].score == 3
+        assert aggregates.scores(guild)[user.id] == {today: 3}
+        await gateway.edit(message, 'never mind', cached)
+    assert db.load(guild, names=[user.id]) == {}
+    assert aggregates.scores(guild)[user.id] == {}
+    assert aggregates.histograms(guild, 0, today + 1) == {}
+    assert message.reactions == ([] if cached else [check])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'cached',
+    [
+        pytest.param(True, id='Cached message'),
+        pytest.param(False, id='Uncached message'),
+    ]
+)
+async def test_delete_retracts_result(indexed_client, cached):
+    client, db, aggregates = indexed_client
+    gateway = fg.FakeGateway(client, users=2)
+    channel = gateway.channels[0]
+    guild = channel.guild.id
+    first, second = gateway.users
+    today = utils.current_day()
+    messages = [
+        gateway.make_message(fg.result_content(today, score), channel, user)
+        for score, user in [(4, first), (2, first), (3, second)]
+    ]
+    for message in messages:
+        await gateway.dispatch(message)
+    assert aggregates.ranking(guild, today, today + 1) == [(2, first.id), (3, second.id)]
+    # The first post was saved over by the second, so deleting it keeps the result.
+    await gateway.delete(messages[0], cached)
+    assert db.load(guild, names=[first.id])[first.id][0].score == 2
+    await gateway.delete(messages[2], cached)
+    assert db.load(guild, names=[second.id]) == {}
+    assert aggregates.ranking(guild, today, today + 1) == [(2, first.id)]
+    await client.on_raw_message_delete(fg.FakeRawEvent(messages[2]))
+    assert aggregates.ranking(guild, today, today + 1) == [(2, first.id)]
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from wordle_buddy import health as wh
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.result import WordleResult
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+class FakeClient:
+    latency = 0.042
+    ingest_queue = None
+
+    def __init__(self, ready=True):
+        self._ready = ready
+
+    def is_ready(self):
+        return self._ready
+
+
+def get(server, path):
+    host, port = server.address
+    try:
+        with urllib.request.urlopen(f'http://{host}:{port}{path}') as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_logs_blocked_stack(caplog):
+    watchdog = wh.LoopWatchdog(threshold=0.1, interval=0.02)
+    watchdog.start()
+    await asyncio.sleep(0.05)
+    with caplog.at_level(logging.WARNING):
+        block_the_loop(0.4)
+        await asyncio.sleep(0.05)
+    await watchdog.stop()
+    assert watchdog.stalls == 1
+    assert watchdog.max_lag >= 0.3
+    assert 'block_the_loop' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_watchdog_quiet_when_idle(caplog):
+    watchdog = wh.LoopWatchdog(threshold=0.2, interval=0.02)
+    watchdog.start()
+    with caplog.at_level(logging.WARNING):
+        await asyncio.sleep(0.2)
+    await watchdog.stop()
+    assert watchdog.stalls == 0
+    assert 'blocked' not in caplog.text
+
+
+@pytest.mark.parametrize(
+    'path,ready,expected_status',
+    [
+        pytest.param('/health', True, 200, id='Healthy'),
+        pytest.param('/ready', True, 200, id='Ready'),
+        pytest.param('/ready', False, 503, id='Not connected yet'),
+    ]
+)
+def test_health_endpoint(tmp_path, path, ready, expected_status):
+    db = JsonWordleDB(str(tmp_path))
+    server = wh.HealthServer(FakeClient(ready), wh.LoopWatchdog(), db, port=0)
+    server.start()
+    try:
+        db.save(1, 10, WordleResult(100, 3, b''))
+        status, body = get(server, path)
+    finally:
+        server.stop()
+    assert status == expected_status
+    assert body['latency'] == 0.042
+    assert body['ingest'] is None
+    assert body['since_last_save'] < 5
+
+
+@pytest.mark.asyncio
+async def test_health_fails_when_wedged(tmp_path):
+    watchdog = wh.LoopWatchdog(interval=0.01)
+    watchdog.start()
+    server = wh.HealthServer(FakeClient(), watchdog, JsonWordleDB(str(tmp_path)),
+                             port=0, stall_limit=0.05)
+    server.start()
+    try:
+        block_the_loop(0.1)
+        status, body = get(server, '/health')
+    finally:
+        server.stop()
+        await watchdog.stop()
+    assert status == 503
+    assert body['stalled'] >= 0.05
+    assert not body['starting']
+    assert body['last_save'] is None
+
+
+def test_health_passes_while_starting(tmp_path):
+    server = wh.HealthServer(FakeClient(False), wh.LoopWatchdog(interval=0.01),
+                             JsonWordleDB(str(tmp_path)), port=0, stall_limit=0.05)
+    server.start()
+    try:
+        time.sleep(0.1)
+        health = get(server, '/health')
+        ready = get(server, '/ready')
+    finally:
+        server.stop()
+    assert health[0] == 200
+    assert health[1]['starting']
+    assert health[1]['stalled'] == 0
+    assert ready[0] == 503
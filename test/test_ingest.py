@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from wordle_buddy import ingest as wi
+
+
+@pytest.mark.asyncio
+async def test_per_guild_order():
+    processed = []
+
+    async def process(item):
+        await asyncio.sleep(0)
+        processed.append(item)
+
+    queue = wi.IngestQueue(process, workers=3, maxsize=300)
+    queue.start()
+    for i in range(50):
+        for guild in range(5):
+            await queue.submit(guild, (guild, i))
+    await queue.join()
+    await queue.stop()
+    for guild in range(5):
+        assert [i for g, i in processed if g == guild] == list(range(50))
+    assert queue.metrics()['processed'] == 250
+
+
+@pytest.mark.asyncio
+async def test_shed_when_full():
+    release = asyncio.Event()
+
+    async def process(item):
+        await release.wait()
+
+    queue = wi.IngestQueue(process, workers=1, maxsize=2, policy='shed')
+    queue.start()
+    accepted = [await queue.submit(1, i) for i in range(5)]
+    await asyncio.sleep(0)
+    accepted += [await queue.submit(1, i) for i in range(5)]
+    release.set()
+    await queue.join()
+    await queue.stop()
+    metrics = queue.metrics()
+    assert metrics['processed'] == accepted.count(True)
+    assert metrics['dropped'] == accepted.count(False) > 0
+
+
+@pytest.mark.asyncio
+async def test_block_applies_backpressure():
+    release = asyncio.Event()
+
+    async def process(item):
+        await release.wait()
+
+    queue = wi.IngestQueue(process, workers=1, maxsize=1)
+    queue.start()
+    await queue.submit(1, 'first')
+    await asyncio.sleep(0)
+    await queue.submit(1, 'second')
+    blocked = asyncio.create_task(queue.submit(1, 'third'))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert queue.metrics()['depth'] == 1
+    release.set()
+    assert await blocked
+    await queue.join()
+    await queue.stop()
+    assert queue.metrics()['dropped'] == 0
+
+
+@pytest.mark.asyncio
+async def test_failures_counted():
+    async def process(item):
+        raise RuntimeError(item)
+
+    queue = wi.IngestQueue(process, workers=1)
+    queue.start()
+    await queue.submit(1, 'bad')
+    await queue.join()
+    await queue.stop()
+    assert queue.metrics()['failed'] == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        wi.IngestQueue(None, policy='drop-everything')
@@ -1,25 +1,23 @@
 import json
+import multiprocessing
 
 import pytest
 import os
 
-from wordle_buddy import json_db as jdb
-from unittest.mock import patch
-from unittest.mock import mock_open
-
-TEST_ROOT_PATH = 'root'
+from wordle_buddy import admin, json_db as jdb, utils
+from wordle_buddy.result import WordleResult
 
 
 normal_inputs = (
     1029,
     10512,
-    {
+    WordleResult.from_dict({
         'week_number': 321,
         'score': 3,
         'matrix': [[0, 0, 0, 0, 0],
                    [0, 1, 0, 2, 0],
                    [2, 2, 2, 2, 2]]
-    }
+    })
 )
 
 
@@ -29,13 +27,209 @@ normal_inputs = (
         pytest.param(*normal_inputs, id='Test normal save')
     ]
 )
-def test_save(guild, name, result):
-    m = mock_open()
-    with patch('wordle_buddy.json_db.open', m),\
-            patch(f'platform.system') as mock_system:
-        mock_system.return_value = 'linux'
-        test_db = jdb.JsonWordleDB(TEST_ROOT_PATH)
-        test_db.save(guild, name, result)
-    m.assert_called_once_with(os.path.join(TEST_ROOT_PATH, str(guild), str(name), f'{result["week_number"]}.json'), 'w')
-    handle = m()
-    handle.write.assert_called_once_with(json.dumps(result))
+def test_save(tmp_path, guild, name, result):
+    test_db = jdb.JsonWordleDB(str(tmp_path))
+    test_db.save(guild, name, result, 'Mike')
+    test_db.save(guild, name, result, 'Michael')
+    user_dir = os.path.join(tmp_path, str(guild), str(name))
+    assert sorted(os.listdir(user_dir)) == [f'{result.week_number}.json', 'name.txt']
+    with open(os.path.join(user_dir, f'{result.week_number}.json')) as result_file:
+        assert result_file.read() == json.dumps(result.to_dict())
+    assert test_db.display_name(guild, name) == 'Mike'
+    assert test_db.guilds() == [guild]
+
+
+def make_result(day, score):
+    return WordleResult(day, score, b'')
+
+
+@pytest.fixture
+def tiered_db(tmp_path):
+    test_db = jdb.JsonWordleDB(str(tmp_path))
+    test_db.save(1, 10, make_result(5, 3), 'Mike')
+    test_db.save(1, 10, make_result(40, 4))
+    test_db.save(1, 11, make_result(6, 2))
+    test_db.save(1, 11, make_result(utils.current_day(), 5))
+    yield test_db
+    test_db.close()
+
+
+def test_tier_seals_closed_months(tmp_path, tiered_db):
+    assert tiered_db.tier() == 3
+    assert sorted(os.listdir(os.path.join(tmp_path, '1', jdb.ARCHIVE_DIR))) == ['2021-06.zip', '2021-07.zip']
+    assert sorted(os.listdir(os.path.join(tmp_path, '1', '10'))) == ['name.txt']
+    assert os.listdir(os.path.join(tmp_path, '1', '11')) == [f'{utils.current_day()}.json']
+    assert tiered_db.tier() == 0
+
+
+def test_tier_locks_one_month_at_a_time(tiered_db, monkeypatch):
+    guild_lock = tiered_db._guild_lock
+    sealed_under = []
+
+    def locked_months(guild, operation):
+        sealed_under.append([])
+        return guild_lock(guild, operation)
+
+    seal = tiered_db._seal
+
+    def record_seal(guild, month, files):
+        sealed_under[-1].append(month)
+        return seal(guild, month, files)
+
+    monkeypatch.setattr(tiered_db, '_guild_lock', locked_months)
+    monkeypatch.setattr(tiered_db, '_seal', record_seal)
+    assert tiered_db.tier() == 3
+    assert sealed_under == [['2021-06'], ['2021-07']]
+
+
+def test_reads_across_tiers(tiered_db):
+    before = sorted(tiered_db.iter_results(1))
+    tiered_db.tier()
+    assert sorted(tiered_db.iter_results(1)) == before
+    assert tiered_db.load(1, weeks=[5, 6, utils.current_day()]) == {
+        10: [make_result(5, 3), None, None],
+        11: [None, make_result(6, 2), make_result(utils.current_day(), 5)],
+    }
+    assert tiered_db.display_name(1, 10) == 'Mike'
+    assert tiered_db.guilds() == [1]
+
+
+def test_late_save_to_sealed_month(tiered_db):
+    tiered_db.tier()
+    tiered_db.save(1, 10, make_result(5, 6))
+    tiered_db.save(1, 12, make_result(7, 1))
+    assert tiered_db.load(1, names=[10, 12], weeks=[5, 7]) == {
+        10: [make_result(5, 6), None],
+        12: [None, make_result(7, 1)],
+    }
+    assert tiered_db.tier() == 2
+    assert tiered_db.load(1, names=[10, 12], weeks=[5, 7]) == {
+        10: [make_result(5, 6), None],
+        12: [None, make_result(7, 1)],
+    }
+    assert len(list(tiered_db.iter_results(1))) == 5
+
+
+def test_storage_report(tiered_db):
+    report = tiered_db.storage_report()
+    assert (report['hot_files'], report['archives'], report['inodes_saved']) == (4, 0, 0)
+    tiered_db.tier()
+    report = tiered_db.storage_report()
+    assert (report['hot_files'], report['archives'], report['archived_results']) == (1, 2, 3)
+    assert report['inodes_saved'] == 1
+    assert report['bytes_saved'] == report['archived_loose_bytes'] - report['archive_bytes']
+
+
+def test_admin_tier(tmp_path, tiered_db, capsys):
+    admin.run_admin(['--results-directory', str(tmp_path), 'tier'])
+    output = capsys.readouterr().out
+    assert 'Sealed 3 results from closed months' in output
+    assert 'Inodes saved:     1' in output
+
+
+def test_other_games_stored_separately(tmp_path, tiered_db):
+    nerdle = WordleResult(5, 2, b'', 'nerdle')
+    tiered_db.save(1, 10, nerdle)
+    assert os.path.exists(os.path.join(tmp_path, '1', '10', 'nerdle', '5.json'))
+    assert tiered_db.load(1, names=[10], weeks=[5]) == {10: [make_result(5, 3)]}
+    assert tiered_db.load(1, names=[10], weeks=[5], game='nerdle') == {10: [nerdle]}
+    tiered_db.tier()
+    assert list(tiered_db.iter_results(1, game='nerdle')) == [(10, nerdle)]
+    assert tiered_db.load(1, names=[10], weeks=[5]) == {10: [make_result(5, 3)]}
+
+
+STRESS_WRITERS = 4
+STRESS_DAYS = range(5, 65)
+SHARED_NAME = 99
+
+
+def _stress_writer(root_dir, writer):
+    db = jdb.JsonWordleDB(root_dir)
+    for day in STRESS_DAYS:
+        db.save(1, 100 + writer, make_result(day, day % 6 + 1), f'Writer {writer}')
+        db.save(1, SHARED_NAME, make_result(day, writer + 1), f'Writer {writer}')
+    db.close()
+
+
+def _stress_tierer(root_dir, stop):
+    db = jdb.JsonWordleDB(root_dir)
+    while not stop.is_set():
+        db.tier()
+    db.close()
+
+
+def test_concurrent_writers(tmp_path):
+    root_dir = str(tmp_path)
+    stop = multiprocessing.Event()
+    tierer = multiprocessing.Process(target=_stress_tierer, args=(root_dir, stop))
+    writers = [
+        multiprocessing.Process(target=_stress_writer, args=(root_dir, writer))
+        for writer in range(STRESS_WRITERS)
+    ]
+    tierer.start()
+    for writer in writers:
+        writer.start()
+    reader = jdb.JsonWordleDB(root_dir)
+    try:
+        while any(writer.is_alive() for writer in writers):
+            # A torn file would fail to parse here.
+            list(reader.iter_results(1))
+    finally:
+        stop.set()
+        for process in writers + [tierer]:
+            process.join(timeout=30)
+    assert [process.exitcode for process in writers + [tierer]] == [0] * (STRESS_WRITERS + 1)
+
+    names = [100 + writer for writer in range(STRESS_WRITERS)]
+    loaded = reader.load(1, names=names + [SHARED_NAME], weeks=list(STRESS_DAYS))
+    for writer, name in enumerate(names):
+        assert loaded[name] == [make_result(day, day % 6 + 1) for day in STRESS_DAYS]
+        assert reader.display_name(1, name) == f'Writer {writer}'
+    assert all(result.score in range(1, STRESS_WRITERS + 1) for result in loaded[SHARED_NAME])
+    assert reader.display_name(1, SHARED_NAME).startswith('Writer ')
+    assert not [
+        entry for _, _, entries in os.walk(root_dir)
+        for entry in entries if entry.endswith('.tmp')
+    ]
+    reader.close()
+
+
+class DeleteListener:
+
+    def __init__(self):
+        self.deleted = []
+
+    def on_save(self, guild, name, result, display_name=''):
+        pass
+
+    def on_delete(self, guild, name, result):
+        self.deleted.append((guild, name, result))
+
+
+def test_delete(tiered_db):
+    listener = DeleteListener()
+    tiered_db.add_listener(listener)
+    tiered_db.tier()
+    tiered_db.save(1, 10, make_result(5, 6))
+    assert tiered_db.delete(1, 10, 5) == make_result(5, 6)
+    assert tiered_db.delete(1, 11, utils.current_day()) == make_result(utils.current_day(), 5)
+    assert tiered_db.delete(1, 11, 6) == make_result(6, 2)
+    assert tiered_db.delete(1, 11, 6) is None
+    assert listener.deleted == [
+        (1, 10, make_result(5, 6)),
+        (1, 11, make_result(utils.current_day(), 5)),
+        (1, 11, make_result(6, 2)),
+    ]
+    assert sorted(tiered_db.iter_results(1)) == [(10, make_result(40, 4))]
+    assert tiered_db.storage_report()['archives'] == 1
+
+
+def test_watermark(tmp_path, tiered_db):
+    watermark = tiered_db.watermark(1)
+    tiered_db.save(1, 10, WordleResult(5, 2, b'', 'nerdle'))
+    assert tiered_db.delete(1, 11, 5) is None
+    assert tiered_db.watermark(1) == watermark
+    tiered_db.save(1, 10, make_result(41, 2))
+    tiered_db.delete(1, 10, 41)
+    assert jdb.JsonWordleDB(str(tmp_path)).watermark(1) == watermark + 2
+    assert tiered_db.watermark(2) == 0
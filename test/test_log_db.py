@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import pytest
+
+from wordle_buddy import log_db as ldb
+from wordle_buddy.result import WordleResult
+from unittest.mock import patch
+
+
+GUILD = 1029
+
+
+def make_result(day, score=3):
+    return WordleResult.from_dict({
+        'week_number': day,
+        'score': score,
+        'matrix': [[0, 0, 0, 0, 0],
+                   [0, 1, 0, 2, 0],
+                   [2, 2, 2, 2, 2]]
+    })
+
+
+@pytest.fixture
+def db(tmp_path):
+    test_db = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    yield test_db
+    test_db.close()
+
+
+def test_save_load(db):
+    db.save(GUILD, 10512, make_result(321), 'Mike')
+    db.save(GUILD, 10513, make_result(322, 4))
+    assert db.load(GUILD, weeks=[321, 322]) == {
+        10512: [make_result(321), None],
+        10513: [None, make_result(322, 4)],
+    }
+
+
+def test_recover_from_log(tmp_path, db):
+    db.save(GUILD, 10512, make_result(321))
+    db.save(GUILD, 10512, make_result(321, 4))
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321]) == {10512: [make_result(321, 4)]}
+    reopened.close()
+
+
+def test_recover_torn_tail(tmp_path, db):
+    db.save(GUILD, 10512, make_result(321))
+    db.close()
+    log_path = os.path.join(tmp_path, f'{GUILD}{ldb.LOG_SUFFIX}')
+    good_size = os.path.getsize(log_path)
+    with open(log_path, 'ab') as log:
+        log.write(b'{"name": 10512, "result": {"week_')
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321]) == {10512: [make_result(321)]}
+    assert os.path.getsize(log_path) == good_size
+    reopened.close()
+
+
+def test_compact(tmp_path, db):
+    db.save(GUILD, 10512, make_result(321))
+    db.compact(GUILD)
+    db.save(GUILD, 10513, make_result(321, 5))
+    db.compact(GUILD)
+    db.save(GUILD, 10512, make_result(322, 2))
+    assert os.path.exists(os.path.join(tmp_path, f'{GUILD}{ldb.SEGMENT_SUFFIX}'))
+    expected = {
+        10512: [make_result(321), make_result(322, 2)],
+        10513: [make_result(321, 5), None],
+    }
+    assert db.load(GUILD, weeks=[321, 322]) == expected
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321, 322]) == expected
+    reopened.close()
+
+
+def test_group_commit(db):
+    real_fsync = os.fsync
+    fsyncs = []
+
+    def slow_fsync(fd):
+        fsyncs.append(fd)
+        time.sleep(0.01)
+        real_fsync(fd)
+
+    with patch('wordle_buddy.log_db.os.fsync', side_effect=slow_fsync):
+        threads = [
+            threading.Thread(target=db.save, args=(GUILD, name, make_result(321)))
+            for name in range(32)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(db.load(GUILD, weeks=[321])) == 32
+    assert len(fsyncs) < 32
+
+
+def test_other_games_stored_separately(tmp_path, db):
+    quordle = WordleResult.from_dict(
+        {'week_number': 321, 'score': 26, 'matrix': [[4, 6, 9, 7]], 'game': 'quordle'}
+    )
+    db.save(GUILD, 10512, make_result(321))
+    db.save(GUILD, 10512, quordle)
+    assert db.load(GUILD, weeks=[321]) == {10512: [make_result(321)]}
+    assert db.load(GUILD, weeks=[321], game='quordle') == {10512: [quordle]}
+    db.compact(GUILD, 'quordle')
+    assert db.guilds() == [GUILD]
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321], game='quordle') == {10512: [quordle]}
+    assert reopened.load(GUILD, weeks=[321]) == {10512: [make_result(321)]}
+    reopened.close()
+
+
+def test_delete(tmp_path, db):
+    db.save(GUILD, 10512, make_result(321))
+    db.compact(GUILD)
+    db.save(GUILD, 10512, make_result(322))
+    db.save(GUILD, 10513, make_result(322))
+    assert db.delete(GUILD, 10512, 321) == make_result(321)
+    assert db.delete(GUILD, 10512, 322) == make_result(322)
+    assert db.delete(GUILD, 10512, 322) is None
+    expected = {10513: [None, make_result(322)]}
+    assert db.load(GUILD, weeks=[321, 322]) == expected
+    assert list(db.iter_results(GUILD)) == [(10513, make_result(322))]
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321, 322]) == expected
+    reopened.compact(GUILD)
+    assert reopened.load(GUILD, weeks=[321, 322]) == expected
+    reopened.close()
+
+
+def test_watermark(tmp_path, db):
+    assert db.watermark(GUILD) == 0
+    db.save(GUILD, 10512, make_result(321))
+    db.save(GUILD, 10512, WordleResult(321, 26, b'', 'quordle'))
+    assert db.delete(GUILD, 10512, 322) is None
+    db.delete(GUILD, 10512, 321)
+    assert db.watermark(GUILD) == 2
+    assert db.guilds() == [GUILD]
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.watermark(GUILD) == 2
+    assert reopened.guilds() == [GUILD]
+    reopened.close()
+
+
+def crash_mid_compaction(root_dir, name, day):
+    crashed = ldb.LogWordleDB(root_dir, background_compaction=False)
+    crashed.save(GUILD, name, make_result(day))
+    with patch.object(ldb, '_write_segment', side_effect=OSError('disk full')):
+        with pytest.raises(OSError):
+            crashed.compact(GUILD)
+    return crashed
+
+
+def test_unfinished_compaction_survives_another_crash(tmp_path):
+    crash_mid_compaction(str(tmp_path), 10512, 321)
+    crash_mid_compaction(str(tmp_path), 10513, 322)
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321, 322]) == {
+        10512: [make_result(321), None],
+        10513: [None, make_result(322)],
+    }
+    assert not os.path.exists(os.path.join(tmp_path, f'{GUILD}{ldb.COMPACTING_SUFFIX}'))
+    reopened.close()
+
+
+def test_failed_compaction_retried(tmp_path):
+    db = crash_mid_compaction(str(tmp_path), 10512, 321)
+    db.save(GUILD, 10513, make_result(322))
+    db.compact(GUILD)
+    expected = {10512: [make_result(321), None], 10513: [None, make_result(322)]}
+    assert db.load(GUILD, weeks=[321, 322]) == expected
+    db.compact(GUILD)
+    db.close()
+    reopened = ldb.LogWordleDB(str(tmp_path), background_compaction=False)
+    assert reopened.load(GUILD, weeks=[321, 322]) == expected
+    reopened.close()
@@ -3,6 +3,8 @@ import datetime
 import pytest
 
 from wordle_buddy import message as wm, utils
+from wordle_buddy.result import WordleResult
+from wordle_buddy.fake_gateway import game_content
 
 from contextlib import nullcontext as does_not_raise
 from unittest.mock import patch
@@ -64,14 +66,14 @@ def test_process_header(test_input, test_output, expectation):
         assert wm.process_header(test_input) == test_output
 
 
-result_ok = {
+result_ok = WordleResult.from_dict({
     'week_number': 321,
     'score': 3,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 2, 2, 2, 2]]
-}
-result_fail_ok = {
+})
+result_fail_ok = WordleResult.from_dict({
     'week_number': 321,
     'score': 7,
     'matrix': [[0, 0, 0, 0, 0],
@@ -80,35 +82,35 @@ result_fail_ok = {
                [0, 1, 0, 2, 0],
                [0, 1, 0, 2, 0],
                [0, 1, 0, 2, 0]]
-}
-result_bad_date = {
+})
+result_bad_date = WordleResult.from_dict({
     'week_number': 318,
     'score': 3,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 2, 2, 2, 2]]
-}
-result_bad_score = {
+})
+result_bad_score = WordleResult.from_dict({
     'week_number': 321,
     'score': 4,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 2, 2, 2, 2]]
-}
-result_bad_matrix = {
+})
+result_bad_matrix = WordleResult.from_dict({
     'week_number': 321,
     'score': 3,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 0, 2, 2, 2]]
-}
-result_bad_fail = {
+})
+result_bad_fail = WordleResult.from_dict({
     'week_number': 321,
     'score': 7,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 2, 2, 2, 2]]
-}
+})
 
 
 @pytest.mark.parametrize(
@@ -135,13 +137,13 @@ def test_validate(test_input, expectation):
             wm.validate(test_input, date)
 
 
-result_ok_bst = {
+result_ok_bst = WordleResult.from_dict({
     'week_number': 285,
     'score': 3,
     'matrix': [[0, 0, 0, 0, 0],
                [0, 1, 0, 2, 0],
                [2, 2, 2, 2, 2]]
-}
+})
 
 
 def test_validate_bst():
@@ -164,13 +166,13 @@ good_inputs = (
 good_result = (
     1337,
     10101,
-    {
+    WordleResult.from_dict({
         'week_number': 321,
         'score': 3,
         'matrix': [[0, 0, 0, 0, 0],
                    [0, 1, 0, 2, 0],
                    [2, 2, 2, 2, 2]]
-    }
+    })
 )
 
 no_body_inputs = (
@@ -228,3 +230,72 @@ def test_handle(test_input, test_output, db_called_with):
             db_inst.save.assert_called_once_with(*db_called_with)
         else:
             db_inst.save.assert_not_called()
+
+
+result_date = datetime.datetime(year=2022, month=6, day=1, hour=12)
+result_day = utils.that_day(wm.datetime_from_utc(result_date))
+
+
+@pytest.mark.parametrize(
+    'game,score,expected_score,guesses',
+    [
+        pytest.param('nerdle', 3, 3, 3, id='Nerdle'),
+        pytest.param('nerdle', utils.FAILURE_SCORE, utils.FAILURE_SCORE, 6, id='Nerdle failure'),
+        pytest.param('worldle', 2, 2, 2, id='Worldle'),
+        pytest.param('worldle', utils.FAILURE_SCORE, utils.FAILURE_SCORE, 6, id='Worldle failure'),
+        pytest.param('quordle', [4, 6, 9, 7], 26, 1, id='Quordle'),
+        pytest.param('quordle', [4, 10, 9, 10], 33, 1, id='Quordle missed words'),
+    ]
+)
+def test_parse_other_games(game, score, expected_score, guesses):
+    content = game_content(game, 212, score)
+    assert wm.is_candidate(content)
+    parser = wm.parser_for(content)
+    assert parser is wm.GAMES[game]
+    result = parser.parse(content.split('\n'), result_date)
+    assert result.game == game
+    assert result.week_number == result_day
+    assert result.score == expected_score
+    assert result.guesses == guesses
+    assert WordleResult.from_dict(result.to_dict()) == result
+
+
+@pytest.mark.parametrize(
+    'content,expectation',
+    [
+        pytest.param('nerdlegame 212 3/6\n\n\U0001f7e9\U0001f7e9', pytest.raises(wm.MessageException),
+                     id='Short Nerdle row'),
+        pytest.param('nerdlegame 212 2/6\n\n' + '\U0001f7e9' * 8, pytest.raises(wm.MessageException),
+                     id='Nerdle score does not match grid'),
+        pytest.param('Daily Quordle 212\n4️⃣6️⃣\n9️⃣',
+                     pytest.raises(wm.MessageException), id='Three Quordle scores'),
+    ]
+)
+def test_parse_other_games_bad_input(content, expectation):
+    with expectation:
+        wm.parser_for(content).parse(content.split('\n'), result_date)
+
+
+@pytest.mark.parametrize(
+    'content,candidate',
+    [
+        pytest.param('Wordle 321 3/6', True, id='Wordle'),
+        pytest.param('  nerdlegame 12 X/6', True, id='Leading whitespace'),
+        pytest.param('Daily Quordle 12', True, id='Quordle'),
+        pytest.param('Daily standup in five minutes', False, id='Token without header'),
+        pytest.param('morning all', False, id='Chatter'),
+        pytest.param('', False, id='Empty'),
+    ]
+)
+def test_is_candidate(content, candidate):
+    assert wm.is_candidate(content) == candidate
+
+
+def test_handle_other_game():
+    with patch('wordle_buddy.json_db.JsonWordleDB') as MockDB:
+        db_inst = MockDB.return_value
+        man = wm.WordleMessageManager(db_inst)
+        assert man.handle(1337, 10101, game_content('worldle', 212, 4), result_date)
+        result = db_inst.save.call_args[0][2]
+        assert result.game == 'worldle'
+        assert result.score == 4
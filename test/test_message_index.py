@@ -0,0 +1,47 @@
+import pytest
+
+from wordle_buddy.message_index import MessageIndex
+from wordle_buddy.result import WordleResult
+
+
+def make_result(day, score, game='wordle'):
+    return WordleResult(day, score, b'', game)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MessageIndex(str(tmp_path))
+    index.record(1, 500, 10, make_result(850, 3))
+    index.record(1, 501, 10, make_result(850, 4))
+    index.record(1, 502, 11, make_result(850, 2, 'nerdle'))
+    return index
+
+
+def test_get(index):
+    assert index.get(1, 500) == (10, 850, 'wordle')
+    assert index.get(1, 502) == (11, 850, 'nerdle')
+    assert index.get(1, 503) is None
+    assert index.get(2, 500) is None
+
+
+@pytest.mark.parametrize(
+    'message_id,expected',
+    [
+        pytest.param(501, ((10, 850, 'wordle'), True), id='Last message to save owns the result'),
+        pytest.param(500, ((10, 850, 'wordle'), False), id='Message saved over does not'),
+        pytest.param(503, (None, False), id='Unknown message'),
+    ]
+)
+def test_forget(index, message_id, expected):
+    assert index.forget(1, message_id) == expected
+    assert index.get(1, message_id) is None
+
+
+def test_journal_replayed(tmp_path, index):
+    index.forget(1, 501)
+    index.record(1, 503, 11, make_result(851, 5))
+    reopened = MessageIndex(str(tmp_path))
+    assert reopened.get(1, 501) is None
+    assert reopened.get(1, 503) == (11, 851, 'wordle')
+    assert reopened.forget(1, 500) == ((10, 850, 'wordle'), False)
+    assert reopened.forget(1, 502) == ((11, 850, 'nerdle'), True)
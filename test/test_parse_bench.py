@@ -0,0 +1,16 @@
+from wordle_buddy import message as wm, parse_bench
+
+
+def test_corpus_mixes_games_and_chatter():
+    messages = parse_bench.corpus(200, chatter=0.5)
+    games = {wm.parser_for(content).game for content, _ in messages if wm.is_candidate(content)}
+    assert games == set(wm.GAMES)
+    assert any(not wm.is_candidate(content) for content, _ in messages)
+
+
+def test_run_parse_bench(capsys):
+    rows = parse_bench.run_parse_bench(count=200)
+    assert [row[0] for row in rows] == list(range(1, len(wm.GAMES) + 1))
+    assert [row[3] for row in rows] == sorted(row[3] for row in rows)
+    parse_bench.run_parse_benchmark(['--count', '100'])
+    assert 'REGISTRY' in capsys.readouterr().out
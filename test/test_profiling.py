@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+import pytest
+
+from wordle_buddy import profiling as wp
+
+
+async def handler(value):
+    await asyncio.sleep(0)
+    return [value] * 100
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    test_profiler = wp.SamplingProfiler(str(tmp_path), sample_rate=1.0, keep=2)
+    yield test_profiler
+    test_profiler.disable()
+
+
+@pytest.mark.asyncio
+async def test_disabled_passes_through(tmp_path):
+    test_profiler = wp.SamplingProfiler(str(tmp_path), sample_rate=1.0)
+    assert await test_profiler.profile('handler', handler(1)) == [1] * 100
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_sampled_calls_are_dumped(tmp_path, profiler):
+    profiler.enable()
+    assert await profiler.profile('handler', handler(1)) == [1] * 100
+    written = profiler.dump()
+    assert sorted(os.path.basename(path).split('-')[0] for path in written) == ['alloc', 'handler']
+    assert all(os.path.exists(path) for path in written)
+
+
+@pytest.mark.asyncio
+async def test_dumps_rotate(tmp_path, profiler):
+    profiler.enable()
+    for i in range(4):
+        await profiler.profile('handler', handler(i))
+        profiler.dump()
+    dumps = os.listdir(tmp_path)
+    assert len([d for d in dumps if d.startswith('handler-')]) == 2
+    assert len([d for d in dumps if d.startswith('alloc-')]) == 2
+
+
+@pytest.mark.asyncio
+async def test_nested_calls_not_profiled(profiler):
+    profiler.enable()
+
+    async def outer():
+        return await profiler.profile('inner', handler(2))
+
+    await profiler.profile('outer', outer())
+    assert list(profiler._stats) == ['outer']
+
+
+def test_unconfigured_does_not_enable():
+    test_profiler = wp.SamplingProfiler(None)
+    test_profiler.enable()
+    assert not test_profiler.enabled
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+from wordle_buddy import admin, puzzle_index as wpi
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.result import WordleResult
+
+
+def make_result(day, score):
+    return WordleResult(day, score, b'')
+
+
+@pytest.fixture
+def db(tmp_path):
+    return JsonWordleDB(os.path.join(tmp_path, 'results'))
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return os.path.join(tmp_path, 'index')
+
+
+def test_save_updates_index(db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 11, make_result(850, 7))
+    db.save(1, 12, make_result(851, 2))
+    entry = index.get(1, 850)
+    assert entry.histogram == [0, 0, 1, 0, 0, 0, 1]
+    assert entry.solvers == {10: 3, 11: 7}
+    assert entry.players == 2
+    assert entry.average == 5
+    assert entry.failures == 1
+    assert index.get(2, 850) is None
+
+
+def test_resave_replaces_score(db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    index.get(1, 850)
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 10, make_result(850, 4))
+    assert index.get(1, 850).histogram == [0, 0, 0, 1, 0, 0, 0]
+
+
+def test_journal_replayed(db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 10, make_result(850, 5))
+    assert wpi.PuzzleIndex(db, index_dir).get(1, 850).solvers == {10: 5}
+
+
+def test_rebuild(db, index_dir):
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 11, make_result(850, 4))
+    index = wpi.PuzzleIndex(db, index_dir)
+    assert index.rebuild(1) == 2
+    assert index.get(1, 850).solvers == {10: 3, 11: 4}
+    assert wpi.PuzzleIndex(db, index_dir).get(1, 850).solvers == {10: 3, 11: 4}
+
+
+def test_admin_reindex(tmp_path, db, index_dir):
+    db.save(1, 10, make_result(850, 3))
+    db.save(2, 10, make_result(850, 4))
+    admin.run_admin([
+        '--results-directory', os.path.join(tmp_path, 'results'),
+        'reindex', '--index-directory', index_dir,
+    ])
+    index = wpi.PuzzleIndex(db, index_dir)
+    assert index.get(1, 850).solvers == {10: 3}
+    assert index.get(2, 850).solvers == {10: 4}
+
+
+def test_delete_updates_index(db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 11, make_result(850, 4))
+    db.delete(1, 10, 850)
+    assert index.get(1, 850).solvers == {11: 4}
+    assert index.get(1, 850).histogram == [0, 0, 0, 1, 0, 0, 0]
+    assert wpi.PuzzleIndex(db, index_dir).get(1, 850).solvers == {11: 4}
+
+
+def test_unbuilt_journal_rebuilt_on_first_use(db, index_dir):
+    db.save(1, 10, make_result(850, 3))
+    db.save(1, 11, make_result(850, 4))
+    os.makedirs(index_dir)
+    with open(os.path.join(index_dir, f'1{wpi.INDEX_SUFFIX}'), 'w') as journal:
+        journal.write('[850, 11, 4]\n')
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 12, make_result(851, 2))
+    assert index.get(1, 850).solvers == {10: 3, 11: 4}
+    assert index.get(1, 851).solvers == {12: 2}
+    assert wpi.PuzzleIndex(db, index_dir).get(1, 850).solvers == {10: 3, 11: 4}
+    assert wpi.PuzzleIndex(db, index_dir).get(2, 850) is None
+
+
+def test_appends_from_other_process_seen(tmp_path, db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    other_db = JsonWordleDB(os.path.join(tmp_path, 'results'))
+    other = wpi.PuzzleIndex(other_db, index_dir)
+    other_db.save(1, 11, make_result(850, 4))
+    assert index.get(1, 850).solvers == {10: 3, 11: 4}
+    db.save(1, 12, make_result(850, 5))
+    assert other.get(1, 850).solvers == {10: 3, 11: 4, 12: 5}
+
+
+def test_rebuild_by_other_process_seen(tmp_path, db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    assert index.get(1, 850).solvers == {10: 3}
+    # Saved by a process without the index, then picked up by a reindex.
+    plain_db = JsonWordleDB(os.path.join(tmp_path, 'results'))
+    plain_db.save(1, 11, make_result(850, 4))
+    assert wpi.PuzzleIndex(plain_db, index_dir).rebuild(1) == 2
+    assert index.get(1, 850).solvers == {10: 3, 11: 4}
+    assert sorted(os.listdir(index_dir)) == [
+        f'1{wpi.INDEX_SUFFIX}', f'1{wpi.INDEX_SUFFIX}.lock'
+    ]
+
+
+def test_partial_line_left_for_next_read(db, index_dir):
+    index = wpi.PuzzleIndex(db, index_dir)
+    db.save(1, 10, make_result(850, 3))
+    path = os.path.join(index_dir, f'1{wpi.INDEX_SUFFIX}')
+    with open(path, 'a') as journal:
+        journal.write('[850, 11,')
+    assert index.get(1, 850).solvers == {10: 3}
+    with open(path, 'a') as journal:
+        journal.write(' 4]\n')
+    assert index.get(1, 850).solvers == {10: 3, 11: 4}
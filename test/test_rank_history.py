@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from unittest.mock import patch
+
+from wordle_buddy import admin, rank_history as wrh, utils
+from wordle_buddy.aggregates import ScoreAggregates
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.result import WordleResult
+
+
+TODAY = 1000
+
+
+def make_result(day, score):
+    return WordleResult(day, score, b'')
+
+
+@pytest.fixture
+def db(tmp_path):
+    test_db = JsonWordleDB(os.path.join(tmp_path, 'results'))
+    for day in range(980, TODAY):
+        test_db.save(1, 10, make_result(day, 3 if day < 990 else 5))
+        test_db.save(1, 11, make_result(day, 4))
+    test_db.save(1, 12, make_result(TODAY - 1, 1))
+    return test_db
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return os.path.join(tmp_path, 'index')
+
+
+@pytest.mark.parametrize(
+    'ranking,expected',
+    [
+        pytest.param([(3, 10), (5, 11)], [[10, 1, 3], [11, 2, 5]], id='Distinct totals'),
+        pytest.param([(3, 10), (3, 11), (5, 12)], [[10, 1, 3], [11, 1, 3], [12, 3, 5]], id='Ties share a position'),
+        pytest.param([], [], id='Nobody played'),
+    ]
+)
+def test_ranked(ranking, expected):
+    assert wrh._ranked(ranking) == expected
+
+
+def test_week_start():
+    for day in range(TODAY, TODAY + 7):
+        start = wrh.week_start(day)
+        assert utils.day_date(start).isoweekday() == 7
+        assert 1 <= day - start <= 7
+
+
+def test_record_and_slice(index_dir):
+    history = wrh.RankHistory(index_dir)
+    assert history.record(1, 100, [(3, 10)])
+    assert history.record(1, 101, [(4, 11), (6, 10)])
+    assert not history.record(1, 101, [(1, 12)])
+    assert [s.day for s in history.between(1, 101, 200)] == [101]
+    reopened = wrh.RankHistory(index_dir)
+    assert [s.positions for s in reopened.between(1, 0, 200)] == [
+        {10: (1, 3)}, {11: (1, 4), 10: (2, 6)}
+    ]
+
+
+def test_rebuild_matches_daily_records(db, tmp_path, index_dir):
+    aggregates = ScoreAggregates(db)
+    live = wrh.RankHistory(os.path.join(tmp_path, 'live'))
+    with patch('wordle_buddy.utils.current_day') as mock_current_day:
+        for day in range(981, TODAY + 1):
+            mock_current_day.return_value = day
+            live.record(1, day, aggregates.ranking(1, wrh.week_start(day), day))
+        mock_current_day.return_value = TODAY
+        assert wrh.RankHistory(index_dir).rebuild(1, aggregates) == TODAY - 980
+    with open(os.path.join(tmp_path, 'live', '1.ranks')) as live_file, \
+            open(os.path.join(index_dir, '1.ranks')) as rebuilt_file:
+        assert live_file.read() == rebuilt_file.read()
+
+
+def test_weekly_trend(db, index_dir):
+    with patch('wordle_buddy.utils.current_day') as mock_current_day:
+        mock_current_day.return_value = TODAY
+        history = wrh.RankHistory(index_dir)
+        history.rebuild(1, ScoreAggregates(db))
+        trend = history.weekly(1, 10, 3)
+    starts = [wrh.week_start(TODAY) - 7 * weeks for weeks in (2, 1, 0)]
+    assert [row[0] for row in trend] == starts
+    assert [row[1] for row in trend][0] == 1
+    assert trend[-1][1:] == (2, 3, 25)
+
+
+def test_admin_backfill_ranks(tmp_path, db, index_dir, capsys):
+    with patch('wordle_buddy.utils.current_day') as mock_current_day:
+        mock_current_day.return_value = TODAY
+        admin.run_admin([
+            '--results-directory', os.path.join(tmp_path, 'results'),
+            'backfill-ranks', '--index-directory', index_dir,
+        ])
+    assert capsys.readouterr().out == f'Guild 1: recorded {TODAY - 980} days of ranks\n'
+    assert len(wrh.RankHistory(index_dir).between(1, 0, TODAY + 1)) == TODAY - 980
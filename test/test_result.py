@@ -0,0 +1,90 @@
+import json
+import tracemalloc
+
+import pytest
+
+from wordle_buddy.result import WordleResult, pack_row, unpack_row
+
+
+result_dict = {
+    'week_number': 321,
+    'score': 3,
+    'matrix': [[0, 0, 0, 0, 0],
+               [0, 1, 0, 2, 0],
+               [2, 2, 2, 2, 2]]
+}
+
+
+@pytest.mark.parametrize(
+    'row',
+    [
+        pytest.param((0, 0, 0, 0, 0), id='All grey'),
+        pytest.param((2, 2, 2, 2, 2), id='All green'),
+        pytest.param((0, 1, 0, 2, 1), id='Mixed'),
+    ]
+)
+def test_pack_row(row):
+    assert 0 <= pack_row(row) < 256
+    assert unpack_row(pack_row(row)) == row
+
+
+def test_dict_round_trip():
+    result = WordleResult.from_dict(result_dict)
+    assert result.week_number == 321
+    assert result.score == 3
+    assert result.guesses == 3
+    assert result.last_row() == (2, 2, 2, 2, 2)
+    assert result.to_dict() == result_dict
+
+
+@pytest.mark.parametrize(
+    'result',
+    [
+        pytest.param({'week_number': 321, 'score': 2, 'game': 'nerdle',
+                      'matrix': [[0, 1, 0, 0, 2, 1, 0, 0], [2] * 8]}, id='Nerdle'),
+        pytest.param({'week_number': 321, 'score': 2, 'game': 'worldle',
+                      'matrix': [[2, 1, 0, 0, 0], [2] * 5]}, id='Worldle'),
+        pytest.param({'week_number': 321, 'score': 26, 'game': 'quordle',
+                      'matrix': [[4, 6, 9, 7]]}, id='Quordle'),
+    ]
+)
+def test_other_game_round_trip(result):
+    other = WordleResult.from_dict(result)
+    assert other.game == result['game']
+    assert other.guesses == len(result['matrix'])
+    assert other.last_row() == tuple(result['matrix'][-1])
+    assert other.to_dict() == result
+    assert other != WordleResult.from_dict(dict(result, game='wordle', matrix=[]))
+
+
+def test_immutable():
+    result = WordleResult.from_dict(result_dict)
+    with pytest.raises(AttributeError):
+        result.score = 4
+    with pytest.raises(AttributeError):
+        result.extra = 1
+
+
+def _traced_size(build):
+    tracemalloc.start()
+    try:
+        data = build()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        del data
+        tracemalloc.stop()
+
+
+def test_memory_reduction():
+    days, users = 200, 100
+    raw = [json.dumps(dict(result_dict, week_number=day)) for day in range(days)]
+    dict_size = _traced_size(
+        lambda: {user: [json.loads(r) for r in raw] for user in range(users)}
+    )
+    record_size = _traced_size(
+        lambda: {
+            user: [WordleResult.from_dict(json.loads(r)) for r in raw]
+            for user in range(users)
+        }
+    )
+    assert record_size < dict_size / 4
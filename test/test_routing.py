@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from wordle_buddy import routing as wr
+from unittest.mock import MagicMock
+
+
+WATCH_CHANNEL = 'wordle'
+
+
+def make_channel(channel_id, name, guild_id=1):
+    channel = MagicMock()
+    channel.id = channel_id
+    channel.name = name
+    channel.guild.id = guild_id
+    return channel
+
+
+def write_routes(path, routes):
+    with open(path, 'w') as routes_file:
+        json.dump(routes, routes_file)
+
+
+@pytest.mark.parametrize(
+    'channel,expected',
+    [
+        pytest.param(make_channel(10, 'wordle-chat'), wr.Route.ALL, id='Watched name is routed'),
+        pytest.param(make_channel(11, 'general'), None, id='Unwatched name is dropped'),
+        pytest.param(make_channel(12, None), None, id='Nameless channel is dropped'),
+    ]
+)
+def test_fallback_route(channel, expected):
+    router = wr.ChannelRouter(None, WATCH_CHANNEL)
+    assert router.route(channel) == expected
+
+
+routes = {
+    '1': {'20': 'results', '21': 'commands'},
+    '2': {'30': 'all'},
+}
+
+
+@pytest.mark.parametrize(
+    'channel,expected',
+    [
+        pytest.param(make_channel(20, 'general', 1), wr.Route.RESULTS, id='Results channel'),
+        pytest.param(make_channel(21, 'general', 1), wr.Route.COMMANDS, id='Commands channel'),
+        pytest.param(make_channel(30, 'general', 2), wr.Route.ALL, id='Several guilds are routed'),
+        pytest.param(make_channel(22, 'wordle', 1), None, id='Configured guild ignores watch name'),
+        pytest.param(make_channel(40, 'wordle', 3), wr.Route.ALL, id='Unconfigured guild uses watch name'),
+    ]
+)
+def test_configured_route(tmp_path, channel, expected):
+    config = os.path.join(tmp_path, 'routes.json')
+    write_routes(config, routes)
+    router = wr.ChannelRouter(config, WATCH_CHANNEL)
+    assert router.route(channel) == expected
+
+
+def test_hot_reload(tmp_path):
+    config = os.path.join(tmp_path, 'routes.json')
+    write_routes(config, {'1': {'20': 'all'}})
+    router = wr.ChannelRouter(config, WATCH_CHANNEL)
+    router.RELOAD_INTERVAL = 0
+    channel = make_channel(21, 'general', 1)
+    assert router.route(channel) is None
+    write_routes(config, {'1': {'20': 'all', '21': 'results'}})
+    os.utime(config, ns=(0, 1))
+    assert router.route(channel) == wr.Route.RESULTS
+
+
+def test_bad_reload_keeps_routes(tmp_path):
+    config = os.path.join(tmp_path, 'routes.json')
+    write_routes(config, {'1': {'20': 'all'}})
+    router = wr.ChannelRouter(config, WATCH_CHANNEL)
+    with open(config, 'w') as routes_file:
+        routes_file.write('{"1": ')
+    router.reload()
+    assert router.route(make_channel(20, 'general', 1)) == wr.Route.ALL
@@ -0,0 +1,40 @@
+import json
+import os
+
+import pytest
+
+from wordle_buddy import run as wr
+from unittest.mock import patch
+
+
+@pytest.mark.parametrize(
+    'raw_name,expected',
+    [
+        pytest.param('wordle', 'wordle', id='Plain name is not emojized'),
+        pytest.param(':thumbs_up:wordle', '\U0001f44dwordle', id='Shortcode name is emojized'),
+    ]
+)
+def test_resolve_watch_channel(tmp_path, raw_name, expected):
+    cache_file = os.path.join(tmp_path, 'cache', 'watch_channel.json')
+    assert wr.resolve_watch_channel(raw_name, cache_file) == expected
+
+
+def test_resolve_watch_channel_cached(tmp_path):
+    cache_file = os.path.join(tmp_path, 'watch_channel.json')
+    with open(cache_file, 'w') as cache:
+        json.dump({'raw': ':wordle:', 'resolved': 'cached-wordle'}, cache)
+    with patch('emoji.emojize') as mock_emojize:
+        assert wr.resolve_watch_channel(':wordle:', cache_file) == 'cached-wordle'
+        mock_emojize.assert_not_called()
+
+
+def test_startup_profile_report():
+    profile = wr.StartupProfile()
+    with profile.phase('first'):
+        pass
+    with profile.phase('second'):
+        pass
+    report = profile.report().split('\n')
+    assert report[4].startswith('first')
+    assert report[5].startswith('second')
+    assert report[-1].startswith('total')
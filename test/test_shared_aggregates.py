@@ -0,0 +1,187 @@
+import multiprocessing
+
+import pytest
+
+from wordle_buddy import admin, aggregates as wa, shared_aggregates as wsa
+from wordle_buddy.json_db import JsonWordleDB
+from wordle_buddy.result import WordleResult
+
+
+def make_result(day, score):
+    return WordleResult(day, score, b'')
+
+
+@pytest.fixture
+def results_directory(tmp_path):
+    directory = str(tmp_path / 'results')
+    db = JsonWordleDB(directory)
+    db.save(1, 10, make_result(100, 3))
+    db.save(1, 11, make_result(100, 5))
+    db.save(1, 11, make_result(101, 2))
+    return directory
+
+
+@pytest.fixture
+def shared(results_directory):
+    shared = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    shared.position(1)
+    yield shared
+    shared.unlink()
+
+
+def save_in_other_process(results_directory, guild, name, day, score):
+    db = JsonWordleDB(results_directory)
+    shared = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    aggregates = wa.ScoreAggregates(db, shared)
+    db.save(guild, name, make_result(day, score))
+    shared.close()
+
+
+def cached_ranking(aggregates):
+    # The list patched in place, rather than the copy ranking() returns.
+    return aggregates._rankings[(1, 100, 102)]
+
+
+def run_other_process(*args):
+    process = multiprocessing.get_context('spawn').Process(
+        target=save_in_other_process, args=args
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def unreadable_db(results_directory, monkeypatch):
+    db = JsonWordleDB(results_directory)
+
+    def iter_results(guild):
+        raise AssertionError('Read results from disk')
+
+    monkeypatch.setattr(db, 'iter_results', iter_results)
+    return db
+
+
+def test_current_segment_attached_as_is(results_directory, shared, monkeypatch):
+    db = JsonWordleDB(results_directory)
+    assert wa.ScoreAggregates(db, shared).scores(1) == {10: {100: 3}, 11: {100: 5, 101: 2}}
+    position = shared.position(1)
+    other = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    aggregates = wa.ScoreAggregates(unreadable_db(results_directory, monkeypatch), other)
+    assert aggregates.scores(1) == {10: {100: 3}, 11: {100: 5, 101: 2}}
+    assert other.position(1) == position
+    other.close()
+
+
+def test_own_saves_keep_segment_current(results_directory, shared, monkeypatch):
+    db = JsonWordleDB(results_directory)
+    wa.ScoreAggregates(db, shared).scores(1)
+    db.save(1, 10, make_result(101, 1))
+    db.delete(1, 11, 100)
+    generation, _ = shared.position(1)
+    other = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    aggregates = wa.ScoreAggregates(unreadable_db(results_directory, monkeypatch), other)
+    assert aggregates.scores(1) == {10: {100: 3, 101: 1}, 11: {101: 2}}
+    assert other.position(1)[0] == generation
+    other.close()
+
+
+def test_stale_segment_rebuilt_from_disk(results_directory, shared):
+    db = JsonWordleDB(results_directory)
+    assert wa.ScoreAggregates(db, shared).scores(1)[10] == {100: 3}
+    # A writer without shared aggregates, e.g. a backfill.
+    JsonWordleDB(results_directory).save(1, 10, make_result(102, 4))
+    other = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    assert wa.ScoreAggregates(db, other).scores(1)[10] == {100: 3, 102: 4}
+    other.close()
+
+
+def test_saves_seen_across_processes(results_directory, shared):
+    db = JsonWordleDB(results_directory)
+    aggregates = wa.ScoreAggregates(db, shared)
+    assert aggregates.ranking(1, 100, 102) == [(7, 11), (10, 10)]
+    ranking = cached_ranking(aggregates)
+    assert aggregates.head_to_head(1, 10, 11).played == 1
+    run_other_process(results_directory, 1, 10, 101, 1)
+    run_other_process(results_directory, 1, 12, 101, 6)
+    assert aggregates.ranking(1, 100, 102) == [(4, 10), (7, 11), (13, 12)]
+    assert cached_ranking(aggregates) is ranking
+    record = aggregates.head_to_head(1, 10, 11)
+    assert (record.played, record.wins) == (2, 2)
+    assert aggregates.histograms(1, 0, 102)[10] == [1, 0, 1, 0, 0, 0, 0]
+
+
+def test_wrapped_change_log_reads_again(results_directory, shared, monkeypatch):
+    other = wsa.SharedAggregates(results_directory, max_users=4, max_days=200)
+    other.position(1)
+    monkeypatch.setattr(wsa, 'CHANGE_LOG_SIZE', 2)
+    db = JsonWordleDB(results_directory)
+    aggregates = wa.ScoreAggregates(db, shared)
+    aggregates.ranking(1, 100, 102)
+    ranking = cached_ranking(aggregates)
+    other_db = JsonWordleDB(results_directory)
+    wa.ScoreAggregates(other_db, other)
+    for score in (1, 2, 3):
+        other_db.save(1, 10, make_result(101, score))
+    assert aggregates.ranking(1, 100, 102) == [(6, 10), (7, 11)]
+    assert cached_ranking(aggregates) is not ranking
+    other.close()
+
+
+def test_own_save_keeps_view(results_directory, shared):
+    db = JsonWordleDB(results_directory)
+    aggregates = wa.ScoreAggregates(db, shared)
+    aggregates.ranking(1, 100, 102)
+    ranking = cached_ranking(aggregates)
+    db.save(1, 10, make_result(101, 1))
+    assert aggregates.ranking(1, 100, 102) == [(4, 10), (7, 11)]
+    assert cached_ranking(aggregates) is ranking
+
+
+def test_resave_moves_histogram(results_directory, shared):
+    shared.populate(1, JsonWordleDB(results_directory))
+    shared.record(1, 11, make_result(100, 4))
+    _, scores, histograms, days = shared.view(1)
+    assert scores[11] == {100: 4, 101: 2}
+    assert histograms[11] == [0, 1, 0, 1, 0, 0, 0]
+    assert days[11] == [100, 101]
+    assert shared._segment(1).version % 2 == 0
+
+
+def test_overflow_falls_back_to_database(results_directory, shared):
+    db = JsonWordleDB(results_directory)
+    for name in range(20, 24):
+        db.save(1, name, make_result(100, 4))
+    aggregates = wa.ScoreAggregates(db, shared)
+    assert len(aggregates.scores(1)) == 6
+    position = shared.position(1)
+    assert not shared.populate(1, db)
+    assert shared.position(1) == position
+
+
+def test_delete_seen_across_processes(results_directory, shared):
+    db = JsonWordleDB(results_directory)
+    aggregates = wa.ScoreAggregates(db, shared)
+    aggregates.ranking(1, 100, 102)
+    ranking = cached_ranking(aggregates)
+    db.delete(1, 11, 101)
+    assert aggregates.ranking(1, 100, 102) == [(10, 10), (12, 11)]
+    assert cached_ranking(aggregates) is ranking
+    _, scores, histograms, _ = shared.view(1)
+    assert scores[11] == {100: 5}
+    assert histograms[11] == [0, 0, 0, 0, 1, 0, 0]
+    shared.retract(1, 12, 100)
+    assert 12 not in scores
+
+
+def test_drop(results_directory, shared):
+    shared.populate(1, JsonWordleDB(results_directory))
+    assert shared.drop(1)
+    assert not shared.drop(1)
+    assert shared._segment(1).filled_at() is None
+
+
+def test_admin_drop_shared(results_directory, shared, capsys):
+    shared.populate(1, JsonWordleDB(results_directory))
+    admin.run_admin(['--results-directory', results_directory, 'drop-shared'])
+    assert capsys.readouterr().out == 'Removed 1 shared aggregates segments\n'
+    shared.close()
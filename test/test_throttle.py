@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from wordle_buddy import throttle as wt
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize(
+    'weights,elapsed,expected_wait',
+    [
+        pytest.param([1, 1, 1], 0, 0, id='Within burst'),
+        pytest.param([3, 3, 1], 0, 5, id='Burst exhausted'),
+        pytest.param([3, 3, 1], 5, 0, id='Bucket refilled'),
+        pytest.param([3, 3, 2], 0, 10, id='Heavy command waits longer'),
+    ]
+)
+def test_user_bucket(weights, elapsed, expected_wait):
+    clock = FakeClock()
+    throttle = wt.CommandThrottle(user_rate=0.2, user_burst=6, guild_rate=100,
+                                  guild_burst=100, clock=clock)
+    for weight in weights[:-1]:
+        assert throttle.check(1, 10, weight) == 0
+    clock.now += elapsed
+    assert throttle.check(1, 10, weights[-1]) == pytest.approx(expected_wait)
+
+
+def test_guild_bucket_shared_between_users():
+    clock = FakeClock()
+    throttle = wt.CommandThrottle(user_rate=1, user_burst=5, guild_rate=1,
+                                  guild_burst=8, clock=clock)
+    assert throttle.check(1, 10, 5) == 0
+    assert throttle.check(1, 11, 3) == 0
+    assert throttle.check(1, 12, 2) == pytest.approx(2)
+    assert throttle.check(2, 12, 2) == 0
+
+
+def test_rejected_command_not_charged():
+    clock = FakeClock()
+    throttle = wt.CommandThrottle(user_rate=1, user_burst=5, guild_rate=1,
+                                  guild_burst=5, clock=clock)
+    assert throttle.check(1, 10, 4) == 0
+    assert throttle.check(1, 10, 3) == pytest.approx(2)
+    assert throttle.check(1, 10, 1) == 0
+
+
+def test_weight_above_burst_clamped():
+    clock = FakeClock()
+    throttle = wt.CommandThrottle(user_rate=1, user_burst=4, guild_rate=1,
+                                  guild_burst=10, clock=clock)
+    assert throttle.check(1, 10, 5) == 0
+    assert throttle.check(1, 10, 5) == pytest.approx(4)
+    clock.now += 4
+    assert throttle.check(1, 10, 5) == 0
+
+
+def test_idle_buckets_pruned():
+    clock = FakeClock()
+    throttle = wt.CommandThrottle(user_rate=1, user_burst=1, clock=clock)
+    throttle.MAX_BUCKETS = 3
+    for user in range(3):
+        throttle.check(1, user, 1)
+    clock.now += 10
+    throttle.check(1, 3, 1)
+    assert list(throttle._users) == [(1, 3)]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_computation():
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return 'result'
+
+    flights = wt.SingleFlight()
+    waiters = [asyncio.create_task(flights.run('key', compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert len(flights) == 1
+    release.set()
+    assert await asyncio.gather(*waiters) == ['result'] * 5
+    assert calls == [1]
+    assert len(flights) == 0
+    assert await flights.run('key', compute) == 'result'
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled_waiter():
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return 'result'
+
+    flights = wt.SingleFlight()
+    first = asyncio.create_task(flights.run('key', compute))
+    second = asyncio.create_task(flights.run('key', compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == 'result'